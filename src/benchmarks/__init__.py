@@ -0,0 +1,4 @@
+"""Micro-benchmarks for performance-sensitive code paths.
+
+Run from the `src` directory, e.g. `python -m benchmarks.bench_scoring`.
+"""
@@ -0,0 +1,114 @@
+"""Benchmark the logging overhead of a meal history request.
+
+Times `_history_from_rows` on a synthetic page of rows, the request path with the most log calls,
+under several sink configurations, and compares eager, deferred and lazy formatting of a large
+debug payload when DEBUG is off.
+
+Usage: python -m benchmarks.bench_logging [--rows 50] [--runs 2000]
+"""
+
+import argparse
+import tempfile
+from datetime import date, timedelta
+from pathlib import Path
+from time import perf_counter
+
+from settings import settings
+from lib import add_sink, logger, remove_sinks
+from lib.logger import _CONSOLE_FORMAT
+from db.repositories.meal_history import _history_from_rows
+
+
+class _NullStream:
+    def write(self, message: str) -> None:
+        pass
+
+
+def _rows(n: int) -> list[dict]:
+    today = date.today()
+    return [
+        {
+            "id": i,
+            "date_eaten": today - timedelta(days=i),
+            "meal": f"meal-{i % 300}",
+            "side_dish": None if i % 3 else f"side-{i % 20}",
+        }
+        for i in range(n)
+    ]
+
+
+def _configure(console_level: str | None, log_dir: Path | None) -> None:
+    remove_sinks()
+    if console_level:
+        add_sink(
+            _NullStream(), level=console_level, format=_CONSOLE_FORMAT + " | {extra}"
+        )
+    if log_dir:
+        add_sink(
+            log_dir / "app.log",
+            level="INFO",
+            format="{level} | {file}:{line} | {message}",
+            serialize=True,
+        )
+
+
+def _timed(fn, runs: int) -> float:
+    """Mean microseconds per call; a best-of time would hide the sampled calls."""
+    fn()
+    start = perf_counter()
+    for _ in range(runs):
+        fn()
+    return (perf_counter() - start) / runs * 1_000_000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=50)
+    parser.add_argument("--runs", type=int, default=2000)
+    args = parser.parse_args()
+
+    rows = _rows(args.rows)
+    request = lambda: _history_from_rows(rows)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        log_dir = Path(tmp)
+        timings = {}
+        _configure(None, None)
+        timings["no sinks"] = _timed(request, args.runs)
+        _configure("INFO", log_dir)
+        timings["console INFO + file"] = _timed(request, args.runs)
+        _configure("DEBUG", log_dir)
+        timings["console DEBUG + file"] = _timed(request, args.runs)
+        sample_every = settings.LOG_SAMPLE_EVERY
+        settings.LOG_SAMPLE_EVERY = 1
+        timings["console DEBUG + file, unsampled"] = _timed(request, args.runs)
+        settings.LOG_SAMPLE_EVERY = sample_every
+
+        # A large payload with DEBUG off, as `create_backup` logs the whole database.
+        _configure("INFO", log_dir)
+        payload = {"meal_history": rows}
+        payload_timings = {
+            "eager f-string": _timed(
+                lambda: logger.debug(f"Backup data: {payload}"), args.runs
+            ),
+            "deferred args": _timed(
+                lambda: logger.debug("Backup data: {}", payload), args.runs
+            ),
+            "lazy callable": _timed(
+                lambda: logger.opt(lazy=True).debug("Backup data: {}", lambda: payload),
+                args.runs,
+            ),
+        }
+        remove_sinks()
+
+    baseline = timings["no sinks"]
+    print(f"{args.rows} history rows per request (mean of {args.runs} runs)")
+    for name, us in timings.items():
+        print(f"  {name:32}: {us:9.1f} us  (+{us - baseline:7.1f} us logging)")
+    print(f"Debug log of {args.rows} rows with DEBUG off")
+    for name, us in payload_timings.items():
+        print(f"  {name:32}: {us:9.1f} us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""Benchmark the per-query cost of the repositories' catalog and history queries.
+
+Runs each query on one connection as the repositories did before (text results, meal types
+converted to text in SQL, parsed by the server on every call) and as they do now (the
+`meal_type[]` adapter, server-side prepared statements, binary results), and prints the mean
+time per query. Needs a database with the schema installed.
+
+Usage: python -m benchmarks.bench_queries [--runs 2000]
+"""
+
+import argparse
+from time import perf_counter
+
+import psycopg
+from psycopg.rows import dict_row
+
+from settings import settings
+from db.core.types import configure_connection
+from db.repositories.meal import _SELECT_ALL_MEALS
+from db.repositories.meal_history import _history_query
+
+_SELECT_ALL_MEALS_AS_TEXT = """
+    SELECT id, name,
+        string_to_array(trim(both '{}' from meal_types::text), ',') as meal_types,
+        notes, frequency_factor, active_time, passive_time,
+        has_side_dish, created_at, updated_at
+    FROM meals ORDER BY name
+"""
+_SELECT_MEAL_BY_NAME = "SELECT id, name, meal_types FROM meals WHERE name = %s"
+
+
+def _timed(fn, runs: int) -> float:
+    """Mean microseconds per call, after a warm-up call."""
+    fn()
+    start = perf_counter()
+    for _ in range(runs):
+        fn()
+    return (perf_counter() - start) / runs * 1_000_000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--runs", type=int, default=2000)
+    args = parser.parse_args()
+
+    with psycopg.connect(settings.db_url, autocommit=True) as conn:
+        configure_connection(conn)
+        # Only explicit prepare=True prepares; the default would prepare after 5 executions.
+        conn.prepare_threshold = None
+        cur = conn.cursor(row_factory=dict_row)
+        cur.execute("SELECT name FROM meals ORDER BY id LIMIT 1")
+        name = cur.fetchone()["name"]
+        history_page, history_params = _history_query(None, None, None, 51)
+
+        queries = {
+            "meal catalog": [
+                ("text, string_to_array", _SELECT_ALL_MEALS_AS_TEXT, (), {}),
+                ("enum adapter, text", _SELECT_ALL_MEALS, (), {}),
+                ("enum adapter, prepared", _SELECT_ALL_MEALS, (), {"prepare": True}),
+                (
+                    "enum adapter, prepared, binary",
+                    _SELECT_ALL_MEALS,
+                    (),
+                    {"prepare": True, "binary": True},
+                ),
+            ],
+            "meal by name": [
+                ("text", _SELECT_MEAL_BY_NAME, (name,), {}),
+                ("prepared", _SELECT_MEAL_BY_NAME, (name,), {"prepare": True}),
+                (
+                    "prepared, binary",
+                    _SELECT_MEAL_BY_NAME,
+                    (name,),
+                    {"prepare": True, "binary": True},
+                ),
+            ],
+            "history page (50 rows)": [
+                ("text", history_page, history_params, {}),
+                ("prepared", history_page, history_params, {"prepare": True}),
+                (
+                    "prepared, binary",
+                    history_page,
+                    history_params,
+                    {"prepare": True, "binary": True},
+                ),
+            ],
+        }
+
+        results = {}
+        for query_name, variants in queries.items():
+            for variant, query, params, options in variants:
+
+                def run():
+                    cur.execute(query, params, **options)
+                    cur.fetchall()
+
+                results[query_name, variant] = _timed(run, args.runs)
+
+    print(f"Mean time per query ({args.runs} runs)")
+    for query_name, variants in queries.items():
+        baseline = results[query_name, variants[0][0]]
+        print(f"  {query_name}")
+        for variant, *_ in variants:
+            us = results[query_name, variant]
+            print(f"    {variant:32}: {us:8.1f} us  ({us - baseline:+7.1f} us)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+"""Benchmark meal history and catalog responses with validated and trusted models.
+
+Serves a synthetic 10k row meal history and a meal catalog through two small FastAPI apps:
+"validated" builds the models one by one and returns them through `response_model`, as the
+endpoints used to; "trusted" encodes the history rows straight to JSON and returns the catalog JSON
+encoded once per cache entry, as the repositories and `routes.meals` do now. The batch validation
+that `_history_from_rows` now uses for callers that need the models is timed on its own. The rows are generated in memory, so database time is
+left out and only the work the change affects is measured.
+
+Usage: python -m benchmarks.bench_responses [--rows 10000] [--meals 300] [--requests 200]
+"""
+
+import argparse
+from datetime import date, timedelta
+from time import perf_counter
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from lib import remove_sinks
+from models.meals import Meal, MealHistory, MealHistoryItem, MealType
+from db.core.cache import CatalogEntry
+from db.repositories.meal_history import _history_from_rows, _page_json
+from routes.meals import _json_response
+
+
+def _history_rows(n: int) -> list[dict]:
+    today = date.today()
+    return [
+        {
+            "id": i,
+            "date_eaten": today - timedelta(days=i // 2),
+            "meal": f"meal-{i % 300}",
+            "side_dish": None if i % 3 else f"side-{i % 20}",
+        }
+        for i in range(n)
+    ]
+
+
+def _meal_rows(n: int) -> list[dict]:
+    types = list(MealType)
+    return [
+        {
+            "id": i,
+            "name": f"meal-{i}",
+            "meal_types": [types[i % 4], types[(i + 1) % 4]],
+            "notes": None,
+            "frequency_factor": 1.0,
+            "active_time": 20,
+            "passive_time": None,
+            "has_side_dish": bool(i % 2),
+        }
+        for i in range(n)
+    ]
+
+
+def _validated_app(history_rows: list[dict], meal_rows: list[dict]) -> FastAPI:
+    app = FastAPI()
+    meals = [Meal(**row) for row in meal_rows]
+
+    @app.get("/history", response_model=MealHistory)
+    def history():
+        return MealHistory(
+            history=[
+                MealHistoryItem(
+                    date_eaten=row["date_eaten"],
+                    meal=row["meal"],
+                    side_dish=row["side_dish"],
+                )
+                for row in history_rows
+            ]
+        )
+
+    @app.get("/meals", response_model=list[Meal])
+    def catalog():
+        return meals
+
+    return app
+
+
+def _trusted_app(history_rows: list[dict], meal_rows: list[dict]) -> FastAPI:
+    app = FastAPI()
+    entry = CatalogEntry([Meal.model_construct(**row) for row in meal_rows])
+
+    @app.get("/history", response_model=MealHistory)
+    def history():
+        return _json_response(_page_json(history_rows, None))
+
+    @app.get("/meals", response_model=list[Meal])
+    def catalog():
+        return _json_response(entry.json())
+
+    return app
+
+
+def _per_call_ms(fn, runs: int) -> float:
+    fn()
+    start = perf_counter()
+    for _ in range(runs):
+        fn()
+    return (perf_counter() - start) / runs * 1000
+
+
+def _requests_per_second(client: TestClient, path: str, requests: int) -> float:
+    client.get(path)
+    start = perf_counter()
+    for _ in range(requests):
+        client.get(path).raise_for_status()
+    return requests / (perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=10_000)
+    parser.add_argument("--meals", type=int, default=300)
+    parser.add_argument("--requests", type=int, default=200)
+    args = parser.parse_args()
+
+    remove_sinks()
+    history_rows = _history_rows(args.rows)
+    meal_rows = _meal_rows(args.meals)
+    apps = {
+        "validated": _validated_app(history_rows, meal_rows),
+        "trusted": _trusted_app(history_rows, meal_rows),
+    }
+
+    with TestClient(apps["validated"]) as a, TestClient(apps["trusted"]) as b:
+        if a.get("/history").json() != b.get("/history").json():
+            raise SystemExit("The two apps returned different history responses")
+        if a.get("/meals").json() != b.get("/meals").json():
+            raise SystemExit("The two apps returned different catalog responses")
+        for path, label in (
+            ("/history", f"history, {args.rows} rows"),
+            ("/meals", f"catalog, {args.meals} meals"),
+        ):
+            before = _requests_per_second(a, path, args.requests)
+            after = _requests_per_second(b, path, args.requests)
+            print(f"{label} ({args.requests} requests)")
+            print(f"  validated: {before:8.1f} req/s")
+            print(f"  trusted  : {after:8.1f} req/s  ({after / before:.1f}x)")
+
+    construct = MealHistoryItem.model_construct
+    builders = {
+        "MealHistoryItem(...) per row": lambda: MealHistory(
+            history=[
+                MealHistoryItem(
+                    date_eaten=r["date_eaten"], meal=r["meal"], side_dish=r["side_dish"]
+                )
+                for r in history_rows
+            ]
+        ),
+        "model_construct per row": lambda: MealHistory.model_construct(
+            history=[
+                construct(
+                    date_eaten=r["date_eaten"], meal=r["meal"], side_dish=r["side_dish"]
+                )
+                for r in history_rows
+            ]
+        ),
+        "batch model_validate": lambda: _history_from_rows(history_rows),
+        "rows to JSON": lambda: _page_json(history_rows, None),
+    }
+    print(f"Building the history, {args.rows} rows")
+    for label, fn in builders.items():
+        print(f"  {label:30}: {_per_call_ms(fn, 20):8.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
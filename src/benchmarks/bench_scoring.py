@@ -0,0 +1,73 @@
+"""Benchmark the vectorized meal scorer on a large synthetic catalog and history.
+
+Usage: python -m benchmarks.bench_scoring [--meals 5000] [--years 10] [--runs 200]
+"""
+
+import argparse
+import random
+from datetime import date, timedelta
+from time import perf_counter
+
+from models.meals import Meal, MealHistoryItem, MealType
+from lib.scoring import MealScorer
+
+
+def _catalog(n: int) -> list[Meal]:
+    types = list(MealType)
+    return [
+        Meal(
+            id=i,
+            name=f"meal-{i}",
+            meal_types=random.sample(types, random.randint(1, 2)),
+            frequency_factor=random.choice([0.5, 1.0, 1.0, 1.5]),
+        )
+        for i in range(n)
+    ]
+
+
+def _history(meals: list[Meal], years: int) -> list[MealHistoryItem]:
+    today = date.today()
+    return [
+        MealHistoryItem(
+            date_eaten=today - timedelta(days=d), meal=random.choice(meals).name
+        )
+        for d in range(years * 365)
+    ]
+
+
+def _timed(fn, runs: int) -> float:
+    best = float("inf")
+    for _ in range(runs):
+        start = perf_counter()
+        fn()
+        best = min(best, perf_counter() - start)
+    return best * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--meals", type=int, default=5000)
+    parser.add_argument("--years", type=int, default=10)
+    parser.add_argument("--runs", type=int, default=200)
+    args = parser.parse_args()
+
+    random.seed(0)
+    meals = _catalog(args.meals)
+    history = _history(meals, args.years)
+
+    build_ms = _timed(lambda: MealScorer(meals), 10)
+    scorer = MealScorer(meals)
+    arrays_ms = _timed(lambda: scorer.history_arrays(history), 20)
+    idx, eaten = scorer.history_arrays(history)
+    score_ms = _timed(lambda: scorer.score(idx, eaten), args.runs)
+    shortlist_ms = _timed(lambda: scorer.shortlist(history), 20)
+
+    print(f"{len(meals)} meals, {len(history)} history entries (best of N runs)")
+    print(f"  build catalog arrays : {build_ms:8.3f} ms")
+    print(f"  load history arrays  : {arrays_ms:8.3f} ms")
+    print(f"  vectorized scoring   : {score_ms:8.3f} ms")
+    print(f"  full shortlist       : {shortlist_ms:8.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
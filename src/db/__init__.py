@@ -5,20 +5,56 @@ for interacting with the application's database.
 
 For database initialization and setup, see the `db.setup` module.
 """
-from .core.connection import get_connection, test_connection
+from .core.connection import (
+    get_connection,
+    get_async_connection,
+    test_connection,
+    open_pool,
+    close_pool,
+    open_async_pool,
+    close_async_pool,
+    get_pool_stats,
+    unit_of_work,
+    async_unit_of_work,
+    Session,
+    AsyncSession,
+)
+from .core.cache import catalog_cache, start_catalog_listener, stop_catalog_listener
 from .repositories import (
     MealRepository,
     SideDishRepository,
     MealHistoryRepository,
+    AsyncMealRepository,
+    AsyncSideDishRepository,
+    AsyncMealHistoryRepository,
+    AsyncPlanCacheRepository,
 )
-from .setup import initialize_database, seed_database
+from .setup import initialize_database, schema_status, seed_database
 
 __all__ = [
     'get_connection',
+    'get_async_connection',
     'test_connection',
+    'open_pool',
+    'close_pool',
+    'open_async_pool',
+    'close_async_pool',
+    'get_pool_stats',
+    'unit_of_work',
+    'async_unit_of_work',
+    'Session',
+    'AsyncSession',
+    'catalog_cache',
+    'start_catalog_listener',
+    'stop_catalog_listener',
     'MealRepository',
     'SideDishRepository',
     'MealHistoryRepository',
+    'AsyncMealRepository',
+    'AsyncSideDishRepository',
+    'AsyncMealHistoryRepository',
+    'AsyncPlanCacheRepository',
     'initialize_database',
     'seed_database',
+    'schema_status',
 ]
@@ -0,0 +1,163 @@
+"""In-process cache for the meal and side dish catalog.
+
+The catalog changes rarely, so the repositories read it through `catalog_cache` and only hit the
+database after an invalidation. Local writes invalidate the cache directly; writes made by other
+workers arrive through Postgres `LISTEN/NOTIFY` (see `06_catalog_notify.sql`) and are applied by the
+listener started with `start_catalog_listener()`.
+"""
+
+import asyncio
+from threading import Lock
+
+import psycopg
+from pydantic_core import to_json
+
+from settings import settings
+from lib import logger
+
+MEALS = "meals"
+SIDE_DISHES = "side_dishes"
+CATALOG_CHANNEL = "catalog_changed"
+
+
+class CatalogEntry:
+    """A cached catalog table together with its name and ID lookups."""
+
+    __slots__ = ("items", "by_name", "by_id", "_json")
+
+    def __init__(self, items: list):
+        self.items = tuple(items)
+        self.by_name = {item.name: item for item in items}
+        self.by_id = {item.id: item for item in items if item.id is not None}
+        self._json: bytes | None = None
+
+    def json(self) -> bytes:
+        """The items as a JSON array, encoded once per cached entry."""
+        if self._json is None:
+            self._json = to_json(self.items)
+        return self._json
+
+
+class CatalogCache:
+    """Thread-safe read-through cache keyed by catalog table name."""
+
+    def __init__(self):
+        self._lock = Lock()
+        self._entries: dict[str, CatalogEntry] = {}
+        self._generations: dict[str, int] = {MEALS: 0, SIDE_DISHES: 0}
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def get(self, table: str) -> CatalogEntry | None:
+        """Return the cached entry for a table, counting the hit or miss."""
+        with self._lock:
+            entry = self._entries.get(table)
+            if entry is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return entry
+
+    def generation(self, table: str) -> int:
+        """Return the invalidation counter for a table.
+
+        Read it before loading from the database and pass it to `put()`, so a load that raced
+        with an invalidation is not cached.
+        """
+        with self._lock:
+            return self._generations[table]
+
+    def generations(self) -> dict[str, int]:
+        """Return the invalidation counters of all catalog tables."""
+        with self._lock:
+            return dict(self._generations)
+
+    def put(self, table: str, items: list, generation: int) -> CatalogEntry:
+        """Cache freshly loaded rows for a table.
+
+        Args:
+            table: Catalog table name.
+            items: Model objects loaded from the table.
+            generation: Value of `generation(table)` taken before the rows were loaded.
+
+        Returns:
+            CatalogEntry: The entry built from `items`, cached or not.
+        """
+        entry = CatalogEntry(items)
+        with self._lock:
+            if self._generations[table] == generation:
+                self._entries[table] = entry
+        return entry
+
+    def invalidate(self, table: str | None = None) -> None:
+        """Drop one catalog table from the cache, or all of them if no table is given."""
+        with self._lock:
+            tables = [table] if table in self._generations else list(self._generations)
+            for name in tables:
+                self._entries.pop(name, None)
+                self._generations[name] += 1
+            self.invalidations += 1
+        logger.debug("Catalog cache invalidated: {}", ", ".join(tables))
+
+    def stats(self) -> dict:
+        """Return hit/miss counters and which tables are currently cached."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+                "invalidations": self.invalidations,
+                "cached": sorted(self._entries),
+            }
+
+
+catalog_cache = CatalogCache()
+
+_listener_task: asyncio.Task | None = None
+
+
+async def _listen_for_catalog_changes() -> None:
+    retry_delay = 1.0
+    while True:
+        try:
+            async with await psycopg.AsyncConnection.connect(
+                settings.db_url, autocommit=True
+            ) as conn:
+                await conn.execute(f"LISTEN {CATALOG_CHANNEL}")
+                # Anything could have changed while we were not listening.
+                catalog_cache.invalidate()
+                retry_delay = 1.0
+                logger.info("Listening for catalog changes")
+                async for notify in conn.notifies():
+                    catalog_cache.invalidate(notify.payload or None)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(
+                "Catalog listener disconnected: {}; retrying in {:.0f}s", e, retry_delay
+            )
+            catalog_cache.invalidate()
+            await asyncio.sleep(retry_delay)
+            retry_delay = min(retry_delay * 2, 60.0)
+
+
+def start_catalog_listener() -> None:
+    """Start the background task that applies catalog invalidations from other workers."""
+    global _listener_task
+    if _listener_task is None or _listener_task.done():
+        _listener_task = asyncio.create_task(_listen_for_catalog_changes())
+
+
+async def stop_catalog_listener() -> None:
+    """Stop the catalog listener task if it is running."""
+    global _listener_task
+    if _listener_task is None:
+        return
+    _listener_task.cancel()
+    try:
+        await _listener_task
+    except asyncio.CancelledError:
+        pass
+    _listener_task = None
@@ -1,15 +1,203 @@
 """Database connection management module.
 
 This module provides a context manager for managing database connections and a function to test the connection.
+
+Connections are served from a shared `psycopg_pool.ConnectionPool` once `open_pool()` has been called,
+and async connections from an `AsyncConnectionPool` once `open_async_pool()` has been called
+(the FastAPI lifespan opens both). Scripts such as `install.py` that never open the pool fall back to a
+dedicated connection per call.
+
+Every connection gets the type adapters of `types.py`, e.g. for the `meal_type[]` column.
+
+`unit_of_work()` and `async_unit_of_work()` hold one connection and transaction for several
+repository calls; pass the yielded session to the repositories' constructors.
 """
 
-from contextlib import contextmanager
+from contextlib import asynccontextmanager, contextmanager
+from typing import AsyncIterator, Iterator
+from threading import Lock
+from time import perf_counter
 
 import psycopg
 from psycopg.rows import dict_row
+from psycopg_pool import AsyncConnectionPool, ConnectionPool, PoolTimeout
 
 from settings import settings
 from lib import logger
+from .cache import catalog_cache
+from .types import configure_async_connection, configure_connection
+
+_pool: ConnectionPool | None = None
+_async_pool: AsyncConnectionPool | None = None
+
+
+class _CheckoutStats:
+    """Thread-safe counters for pool checkout latency."""
+
+    def __init__(self):
+        self._lock = Lock()
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def record(self, elapsed_ms: float) -> None:
+        with self._lock:
+            self.count += 1
+            self.total_ms += elapsed_ms
+            self.max_ms = max(self.max_ms, elapsed_ms)
+
+    def snapshot(self) -> tuple[int, float, float]:
+        with self._lock:
+            return self.count, self.total_ms, self.max_ms
+
+
+_checkout_stats = _CheckoutStats()
+_async_checkout_stats = _CheckoutStats()
+
+
+def _pool_kwargs() -> dict:
+    return {
+        "min_size": settings.DB_POOL_MIN_SIZE,
+        "max_size": settings.DB_POOL_MAX_SIZE,
+        "max_idle": settings.DB_POOL_MAX_IDLE,
+        "timeout": settings.DB_POOL_TIMEOUT,
+        "open": False,
+    }
+
+
+def open_pool() -> ConnectionPool:
+    """Open the shared connection pool.
+
+    Connections are health checked when they are handed out, so a broken connection is
+    discarded and replaced instead of surfacing as a query error.
+
+    Returns:
+        ConnectionPool: The opened pool. Calling this again returns the existing pool.
+    """
+    global _pool
+    if _pool is not None:
+        return _pool
+
+    _pool = ConnectionPool(
+        settings.db_url,
+        check=ConnectionPool.check_connection,
+        configure=configure_connection,
+        name="meal_planner",
+        **_pool_kwargs(),
+    )
+    _pool.open()
+    logger.info(
+        "Database pool opened (min={}, max={})",
+        settings.DB_POOL_MIN_SIZE,
+        settings.DB_POOL_MAX_SIZE,
+    )
+    return _pool
+
+
+def close_pool() -> None:
+    """Close the shared connection pool if it is open."""
+    global _pool
+    if _pool is None:
+        return
+    _pool.close()
+    _pool = None
+    logger.info("Database pool closed")
+
+
+async def open_async_pool() -> AsyncConnectionPool:
+    """Open the shared async connection pool used by the request handlers.
+
+    Returns:
+        AsyncConnectionPool: The opened pool. Calling this again returns the existing pool.
+    """
+    global _async_pool
+    if _async_pool is not None:
+        return _async_pool
+
+    _async_pool = AsyncConnectionPool(
+        settings.db_url,
+        check=AsyncConnectionPool.check_connection,
+        configure=configure_async_connection,
+        name="meal_planner_async",
+        **_pool_kwargs(),
+    )
+    await _async_pool.open()
+    logger.info(
+        "Async database pool opened (min={}, max={})",
+        settings.DB_POOL_MIN_SIZE,
+        settings.DB_POOL_MAX_SIZE,
+    )
+    return _async_pool
+
+
+async def close_async_pool() -> None:
+    """Close the shared async connection pool if it is open."""
+    global _async_pool
+    if _async_pool is None:
+        return
+    await _async_pool.close()
+    _async_pool = None
+    logger.info("Async database pool closed")
+
+
+def _pool_stats(
+    pool: ConnectionPool | AsyncConnectionPool, checkouts: _CheckoutStats
+) -> dict:
+    stats = pool.get_stats()
+    count, total_ms, max_ms = checkouts.snapshot()
+    pool_size = stats.get("pool_size", 0)
+    return {
+        "min_size": pool.min_size,
+        "max_size": pool.max_size,
+        "pool_size": pool_size,
+        "available": stats.get("pool_available", 0),
+        "in_use": pool_size - stats.get("pool_available", 0),
+        "waiting": stats.get("requests_waiting", 0),
+        "checkouts": count,
+        "checkout_avg_ms": round(total_ms / count, 3) if count else 0.0,
+        "checkout_max_ms": round(max_ms, 3),
+        "errors": stats.get("requests_errors", 0) + stats.get("connections_errors", 0),
+    }
+
+
+def get_pool_stats() -> dict:
+    """Return statistics about the shared connection pools.
+
+    Returns:
+        dict: Pool size, connections in use, waiting requests and checkout latency for the
+            sync and async pools. A pool that is not open is reported as None.
+    """
+    return {
+        "sync": _pool_stats(_pool, _checkout_stats) if _pool else None,
+        "async": (
+            _pool_stats(_async_pool, _async_checkout_stats) if _async_pool else None
+        ),
+    }
+
+
+@contextmanager
+def _checkout():
+    """Yield a raw connection from the pool, or a dedicated one if the pool is not open."""
+    if _pool is None:
+        conn = psycopg.connect(settings.db_url)
+        try:
+            configure_connection(conn)
+            yield conn
+        finally:
+            conn.close()
+        return
+
+    start = perf_counter()
+    try:
+        conn = _pool.getconn()
+    except PoolTimeout as e:
+        logger.error("Timed out waiting for a database connection: {}", e)
+        raise
+    _checkout_stats.record((perf_counter() - start) * 1000)
+    try:
+        yield conn
+    finally:
+        _pool.putconn(conn)
 
 
 @contextmanager
@@ -19,30 +207,157 @@ def get_connection():
     Yields:
         psycopg.Cursor: A database cursor with dict_row factory.
 
-    The connection is automatically committed on successful execution and rolled back on error.
-    The cursor and connection are automatically closed when the context exits.
+    The connection is committed if the block succeeds and rolled back if it raises.
+    The cursor is closed and the connection returned to the pool when the context exits.
     """
-    conn = None
-    cur = None
-    try:
-        conn = psycopg.connect(settings.db_url)
+    with _checkout() as conn:
         cur = conn.cursor(row_factory=dict_row)
-        cur.execute("SELECT 1")  # Test the connection
-        yield cur
-    except psycopg.Error as e:
-        if conn:
+        try:
+            yield cur
+        except BaseException as e:
+            conn.rollback()
+            if isinstance(e, psycopg.Error):
+                logger.error("Database error: {}", e)
+            raise
+        else:
+            conn.commit()
+        finally:
+            cur.close()
+
+
+def _forget_rolled_back_catalog(generations: dict[str, int]) -> None:
+    """Invalidate catalog tables written in a rolled back unit of work.
+
+    A catalog write invalidates the cache before it commits, so a reload inside the same unit
+    of work may have cached rows that were then rolled back.
+    """
+    for table, generation in catalog_cache.generations().items():
+        if generation != generations[table]:
+            catalog_cache.invalidate(table)
+
+
+class Session:
+    """One connection and transaction shared by several repository calls."""
+
+    def __init__(self, conn: psycopg.Connection):
+        self.conn = conn
+
+    @contextmanager
+    def connection(self) -> Iterator[psycopg.Cursor]:
+        """Drop-in for `get_connection` that leaves committing to the unit of work."""
+        with self.conn.cursor(row_factory=dict_row) as cur:
+            yield cur
+
+
+@contextmanager
+def unit_of_work() -> Iterator[Session]:
+    """Run several repository calls on one connection in one transaction.
+
+    Example:
+        with unit_of_work() as session:
+            meal = MealRepository(session).get_meal_by_name(name)
+            MealHistoryRepository(session).add_meal_history(item)
+
+    Yields:
+        Session: Pass it to the repositories taking part in the transaction.
+
+    The transaction is committed if the block succeeds and rolled back if it raises.
+    """
+    with _checkout() as conn:
+        generations = catalog_cache.generations()
+        try:
+            yield Session(conn)
+        except BaseException as e:
             conn.rollback()
-        logger.error(f"Database error: {e}")
+            _forget_rolled_back_catalog(generations)
+            if isinstance(e, psycopg.Error):
+                logger.error("Database error: {}", e)
+            raise
+        else:
+            conn.commit()
+
+
+@asynccontextmanager
+async def _async_checkout():
+    """Yield a raw async connection from the pool, or a dedicated one if the pool is not open."""
+    if _async_pool is None:
+        conn = await psycopg.AsyncConnection.connect(settings.db_url)
+        try:
+            await configure_async_connection(conn)
+            yield conn
+        finally:
+            await conn.close()
+        return
+
+    start = perf_counter()
+    try:
+        conn = await _async_pool.getconn()
+    except PoolTimeout as e:
+        logger.error("Timed out waiting for a database connection: {}", e)
         raise
+    _async_checkout_stats.record((perf_counter() - start) * 1000)
+    try:
+        yield conn
     finally:
-        if conn:
-            try:
-                conn.commit()
-            except psycopg.Error as e:
-                logger.error(f"Error committing transaction: {e}")
-            if cur:
-                cur.close()
-            conn.close()
+        await _async_pool.putconn(conn)
+
+
+@asynccontextmanager
+async def get_async_connection():
+    """Async context manager for database connections.
+
+    Yields:
+        psycopg.AsyncCursor: A database cursor with dict_row factory.
+
+    Same transaction semantics as `get_connection`, without blocking the event loop.
+    """
+    async with _async_checkout() as conn:
+        cur = conn.cursor(row_factory=dict_row)
+        try:
+            yield cur
+        except BaseException as e:
+            await conn.rollback()
+            if isinstance(e, psycopg.Error):
+                logger.error("Database error: {}", e)
+            raise
+        else:
+            await conn.commit()
+        finally:
+            await cur.close()
+
+
+class AsyncSession:
+    """Async counterpart of `Session`."""
+
+    def __init__(self, conn: psycopg.AsyncConnection):
+        self.conn = conn
+
+    @asynccontextmanager
+    async def connection(self) -> AsyncIterator[psycopg.AsyncCursor]:
+        """Drop-in for `get_async_connection` that leaves committing to the unit of work."""
+        async with self.conn.cursor(row_factory=dict_row) as cur:
+            yield cur
+
+
+@asynccontextmanager
+async def async_unit_of_work() -> AsyncIterator[AsyncSession]:
+    """Async counterpart of `unit_of_work`, for request handlers.
+
+    Yields:
+        AsyncSession: Pass it to the async repositories taking part in the transaction.
+    """
+    async with _async_checkout() as conn:
+        generations = catalog_cache.generations()
+        try:
+            yield AsyncSession(conn)
+        except BaseException as e:
+            await conn.rollback()
+            _forget_rolled_back_catalog(generations)
+            if isinstance(e, psycopg.Error):
+                logger.error("Database error: {}", e)
+            raise
+        else:
+            await conn.commit()
 
 
 def test_connection() -> bool:
@@ -56,6 +371,6 @@ def test_connection() -> bool:
             conn.execute("SELECT 1")
         logger.debug("Database connection test successful")
         return True
-    except psycopg.Error as e:
-        logger.error(f"Database connection test failed: {e}")
+    except (psycopg.Error, PoolTimeout) as e:
+        logger.error("Database connection test failed: {}", e)
         return False
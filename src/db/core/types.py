@@ -0,0 +1,34 @@
+"""Type adapters registered on every database connection.
+
+`meal_type` values, and `meal_type[]` arrays, are loaded as `MealType` members and `MealType`
+members are dumped as `meal_type`, in both text and binary format, so queries select and insert
+the enum array column as is instead of converting it to and from text in SQL.
+"""
+
+import psycopg
+from psycopg.types.enum import EnumInfo, register_enum
+
+from models.meals import MealType
+
+MEAL_TYPE = "meal_type"
+_MEAL_TYPE_LABELS = {meal_type: meal_type.value for meal_type in MealType}
+
+
+def configure_connection(conn: psycopg.Connection) -> None:
+    """Register the application's type adapters on a new connection.
+
+    Used as the pool's `configure` callback. The connection is left idle, as the pool requires.
+    Nothing is registered before the migrations have created the types.
+    """
+    info = EnumInfo.fetch(conn, MEAL_TYPE)
+    if info is not None:
+        register_enum(info, conn, MealType, mapping=_MEAL_TYPE_LABELS)
+    conn.commit()
+
+
+async def configure_async_connection(conn: psycopg.AsyncConnection) -> None:
+    """Async counterpart of `configure_connection`."""
+    info = await EnumInfo.fetch(conn, MEAL_TYPE)
+    if info is not None:
+        register_enum(info, conn, MealType, mapping=_MEAL_TYPE_LABELS)
+    await conn.commit()
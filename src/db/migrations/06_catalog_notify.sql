@@ -0,0 +1,24 @@
+-- Drop in reverse order of dependencies
+DROP TRIGGER IF EXISTS notify_meals_change ON meals;
+DROP TRIGGER IF EXISTS notify_side_dishes_change ON side_dishes;
+DROP FUNCTION IF EXISTS notify_catalog_change() CASCADE;
+
+-- Broadcast catalog writes so every application worker can drop its cached copy.
+-- The payload is the name of the table that changed.
+CREATE FUNCTION notify_catalog_change()
+RETURNS TRIGGER AS $$
+BEGIN
+    PERFORM pg_notify('catalog_changed', TG_TABLE_NAME);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER notify_meals_change
+AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON meals
+FOR EACH STATEMENT
+EXECUTE FUNCTION notify_catalog_change();
+
+CREATE TRIGGER notify_side_dishes_change
+AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON side_dishes
+FOR EACH STATEMENT
+EXECUTE FUNCTION notify_catalog_change();
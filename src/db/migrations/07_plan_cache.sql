@@ -0,0 +1,41 @@
+-- Drop in reverse order of dependencies
+DROP VIEW IF EXISTS current_plan_cache_view;
+DROP FUNCTION IF EXISTS clean_expired_plan_cache() CASCADE;
+DROP TABLE IF EXISTS plan_cache CASCADE;
+
+-- AI generated plans keyed by a hash of the prompt and the model that was asked.
+CREATE TABLE plan_cache (
+    cache_key TEXT PRIMARY KEY,
+    model TEXT NOT NULL,
+    plan JSONB NOT NULL,
+    ttl INTERVAL NOT NULL DEFAULT INTERVAL '1 day',
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+
+    -- Same expiry semantics as temp_meal_plan, with a per-entry lifetime
+    expires_at TIMESTAMP GENERATED ALWAYS AS (created_at + ttl) STORED
+);
+
+-- Create index for efficient cleanup
+CREATE INDEX idx_plan_cache_expires ON plan_cache(expires_at);
+
+-- View that automatically filters expired plans
+CREATE VIEW current_plan_cache_view AS
+SELECT
+    cache_key,
+    model,
+    plan,
+    created_at,
+    expires_at
+FROM
+    plan_cache
+WHERE
+    expires_at > CURRENT_TIMESTAMP;
+
+-- Automatic cleanup procedure
+CREATE FUNCTION clean_expired_plan_cache()
+RETURNS VOID AS $$
+BEGIN
+    DELETE FROM plan_cache
+    WHERE expires_at <= CURRENT_TIMESTAMP;
+END;
+$$ LANGUAGE plpgsql;
@@ -0,0 +1,9 @@
+-- Indexes for date-ranged, keyset-paginated meal history reads
+DROP INDEX IF EXISTS idx_meal_history_date_id;
+DROP INDEX IF EXISTS idx_meal_history_meal;
+
+-- Matches ORDER BY date_eaten DESC, id used by the history endpoints
+CREATE INDEX idx_meal_history_date_id ON meal_history(date_eaten DESC, id);
+
+-- Foreign key lookups and per-meal history
+CREATE INDEX idx_meal_history_meal ON meal_history(meal_id);
@@ -0,0 +1,9 @@
+-- Incremental backups pick up catalog rows by updated_at.
+-- 02_sidedishes.sql recreates update_timestamp() with CASCADE, which drops the
+-- meals trigger created in 01_meals.sql; restore it.
+DROP TRIGGER IF EXISTS update_meal_timestamp ON meals;
+
+CREATE TRIGGER update_meal_timestamp
+BEFORE UPDATE ON meals
+FOR EACH ROW
+EXECUTE FUNCTION update_timestamp();
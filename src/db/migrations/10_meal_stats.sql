@@ -0,0 +1,154 @@
+-- Drop in reverse order of dependencies
+DROP VIEW IF EXISTS meal_stats_view;
+DROP TRIGGER IF EXISTS meal_stats_insert ON meal_history;
+DROP TRIGGER IF EXISTS meal_stats_update ON meal_history;
+DROP TRIGGER IF EXISTS meal_stats_delete ON meal_history;
+DROP TRIGGER IF EXISTS meal_stats_truncate ON meal_history;
+DROP FUNCTION IF EXISTS meal_stats_after_insert() CASCADE;
+DROP FUNCTION IF EXISTS meal_stats_after_change() CASCADE;
+DROP FUNCTION IF EXISTS meal_stats_after_truncate() CASCADE;
+DROP FUNCTION IF EXISTS refresh_meal_stats(INTEGER[]) CASCADE;
+DROP FUNCTION IF EXISTS meal_stats_horizon() CASCADE;
+DROP TABLE IF EXISTS meal_stats CASCADE;
+
+-- Per-meal aggregates of meal_history, kept current by the triggers below, so recency and
+-- popularity lookups read one row per meal instead of the whole history.
+CREATE TABLE meal_stats (
+    meal_id INTEGER PRIMARY KEY REFERENCES meals(id) ON DELETE CASCADE,
+    eat_count INTEGER NOT NULL,
+    first_eaten DATE NOT NULL,
+    last_eaten DATE NOT NULL,
+    -- Dates eaten since meal_stats_horizon(); the rolling window counts are taken from these
+    recent_dates DATE[] NOT NULL DEFAULT '{}'
+);
+
+-- Oldest date kept in recent_dates: the longest rolling window (52 weeks) plus a week of slack
+CREATE FUNCTION meal_stats_horizon()
+RETURNS DATE AS $$
+    SELECT CURRENT_DATE - 371;
+$$ LANGUAGE sql STABLE;
+
+-- Recompute the stats of the given meals from meal_history, or of every meal when NULL.
+-- Used by the update and delete triggers, and to backfill after loading history with
+-- triggers disabled (e.g. a backup restore).
+CREATE FUNCTION refresh_meal_stats(meal_ids INTEGER[] DEFAULT NULL)
+RETURNS VOID AS $$
+    DELETE FROM meal_stats WHERE meal_ids IS NULL OR meal_id = ANY(meal_ids);
+    INSERT INTO meal_stats (meal_id, eat_count, first_eaten, last_eaten, recent_dates)
+    SELECT
+        meal_id,
+        count(*),
+        min(date_eaten),
+        max(date_eaten),
+        coalesce(
+            array_agg(date_eaten ORDER BY date_eaten)
+                FILTER (WHERE date_eaten >= meal_stats_horizon()),
+            '{}'
+        )
+    FROM meal_history
+    WHERE meal_ids IS NULL OR meal_id = ANY(meal_ids)
+    GROUP BY meal_id;
+$$ LANGUAGE sql;
+
+-- Inserts are folded in incrementally, one upsert per meal and statement, so a COPY of a
+-- large import costs as much as the number of distinct meals in it.
+CREATE FUNCTION meal_stats_after_insert()
+RETURNS TRIGGER AS $$
+BEGIN
+    INSERT INTO meal_stats AS s (meal_id, eat_count, first_eaten, last_eaten, recent_dates)
+    SELECT
+        meal_id,
+        count(*),
+        min(date_eaten),
+        max(date_eaten),
+        coalesce(
+            array_agg(date_eaten ORDER BY date_eaten)
+                FILTER (WHERE date_eaten >= meal_stats_horizon()),
+            '{}'
+        )
+    FROM new_rows
+    GROUP BY meal_id
+    ON CONFLICT (meal_id) DO UPDATE SET
+        eat_count = s.eat_count + EXCLUDED.eat_count,
+        first_eaten = LEAST(s.first_eaten, EXCLUDED.first_eaten),
+        last_eaten = GREATEST(s.last_eaten, EXCLUDED.last_eaten),
+        recent_dates = ARRAY(
+            SELECT d FROM unnest(s.recent_dates || EXCLUDED.recent_dates) d
+            WHERE d >= meal_stats_horizon()
+            ORDER BY d
+        );
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Updates and deletes are rare; the affected meals are recomputed from their history.
+CREATE FUNCTION meal_stats_after_change()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'UPDATE' THEN
+        PERFORM refresh_meal_stats(ARRAY(
+            SELECT meal_id FROM old_rows UNION SELECT meal_id FROM new_rows
+        ));
+    ELSE
+        PERFORM refresh_meal_stats(ARRAY(SELECT DISTINCT meal_id FROM old_rows));
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE FUNCTION meal_stats_after_truncate()
+RETURNS TRIGGER AS $$
+BEGIN
+    DELETE FROM meal_stats;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER meal_stats_insert
+AFTER INSERT ON meal_history
+REFERENCING NEW TABLE AS new_rows
+FOR EACH STATEMENT
+EXECUTE FUNCTION meal_stats_after_insert();
+
+CREATE TRIGGER meal_stats_update
+AFTER UPDATE ON meal_history
+REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+FOR EACH STATEMENT
+EXECUTE FUNCTION meal_stats_after_change();
+
+CREATE TRIGGER meal_stats_delete
+AFTER DELETE ON meal_history
+REFERENCING OLD TABLE AS old_rows
+FOR EACH STATEMENT
+EXECUTE FUNCTION meal_stats_after_change();
+
+CREATE TRIGGER meal_stats_truncate
+AFTER TRUNCATE ON meal_history
+FOR EACH STATEMENT
+EXECUTE FUNCTION meal_stats_after_truncate();
+
+-- One row per meal, including meals never eaten, with the rolling windows ending today
+CREATE VIEW meal_stats_view AS
+SELECT
+    m.id AS meal_id,
+    m.name AS meal,
+    coalesce(s.eat_count, 0) AS eat_count,
+    s.first_eaten,
+    s.last_eaten,
+    CURRENT_DATE - s.last_eaten AS days_since_eaten,
+    CASE WHEN s.eat_count > 1
+        THEN (s.last_eaten - s.first_eaten)::FLOAT / (s.eat_count - 1)
+    END AS mean_interval_days,
+    (SELECT count(*) FROM unnest(s.recent_dates) d
+        WHERE d > CURRENT_DATE - 28 AND d <= CURRENT_DATE)::INTEGER AS eaten_last_4_weeks,
+    (SELECT count(*) FROM unnest(s.recent_dates) d
+        WHERE d > CURRENT_DATE - 84 AND d <= CURRENT_DATE)::INTEGER AS eaten_last_12_weeks,
+    (SELECT count(*) FROM unnest(s.recent_dates) d
+        WHERE d > CURRENT_DATE - 364 AND d <= CURRENT_DATE)::INTEGER AS eaten_last_52_weeks
+FROM
+    meals m
+LEFT JOIN
+    meal_stats s ON s.meal_id = m.id;
+
+-- Backfill from the existing history
+SELECT refresh_meal_stats();
@@ -0,0 +1,10 @@
+-- Incremental backups cannot follow a restore: restored rows keep the updated_at and ids
+-- they were backed up with, which can fall behind the newest backup's watermarks. Every
+-- restore or truncation bumps restore_epoch, and a delta is only taken on top of a backup
+-- recorded in the same epoch.
+CREATE TABLE IF NOT EXISTS backup_state (
+    singleton BOOLEAN PRIMARY KEY DEFAULT TRUE CHECK (singleton),
+    restore_epoch INTEGER NOT NULL DEFAULT 0
+);
+
+INSERT INTO backup_state DEFAULT VALUES ON CONFLICT DO NOTHING;
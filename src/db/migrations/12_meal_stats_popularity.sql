@@ -0,0 +1,91 @@
+-- Decayed eat count per meal, so candidate scoring can read popularity from meal_stats
+-- instead of the whole history. Each time a meal was eaten counts 2^(-days ago / 180), the
+-- half-life of POPULARITY_HALF_LIFE_DAYS in lib/scoring.py. The weights are stored relative
+-- to a fixed date, so the sum only changes when history does and is scaled to today on read.
+CREATE OR REPLACE FUNCTION meal_popularity_weight(d DATE)
+RETURNS DOUBLE PRECISION AS $$
+    SELECT power(2.0, (d - DATE '2000-01-01') / 180.0)::DOUBLE PRECISION;
+$$ LANGUAGE sql IMMUTABLE;
+
+ALTER TABLE meal_stats ADD COLUMN IF NOT EXISTS popularity_mass DOUBLE PRECISION NOT NULL DEFAULT 0;
+
+CREATE OR REPLACE FUNCTION refresh_meal_stats(meal_ids INTEGER[] DEFAULT NULL)
+RETURNS VOID AS $$
+    DELETE FROM meal_stats WHERE meal_ids IS NULL OR meal_id = ANY(meal_ids);
+    INSERT INTO meal_stats
+        (meal_id, eat_count, first_eaten, last_eaten, recent_dates, popularity_mass)
+    SELECT
+        meal_id,
+        count(*),
+        min(date_eaten),
+        max(date_eaten),
+        coalesce(
+            array_agg(date_eaten ORDER BY date_eaten)
+                FILTER (WHERE date_eaten >= meal_stats_horizon()),
+            '{}'
+        ),
+        sum(meal_popularity_weight(date_eaten))
+    FROM meal_history
+    WHERE meal_ids IS NULL OR meal_id = ANY(meal_ids)
+    GROUP BY meal_id;
+$$ LANGUAGE sql;
+
+CREATE OR REPLACE FUNCTION meal_stats_after_insert()
+RETURNS TRIGGER AS $$
+BEGIN
+    INSERT INTO meal_stats AS s
+        (meal_id, eat_count, first_eaten, last_eaten, recent_dates, popularity_mass)
+    SELECT
+        meal_id,
+        count(*),
+        min(date_eaten),
+        max(date_eaten),
+        coalesce(
+            array_agg(date_eaten ORDER BY date_eaten)
+                FILTER (WHERE date_eaten >= meal_stats_horizon()),
+            '{}'
+        ),
+        sum(meal_popularity_weight(date_eaten))
+    FROM new_rows
+    GROUP BY meal_id
+    ON CONFLICT (meal_id) DO UPDATE SET
+        eat_count = s.eat_count + EXCLUDED.eat_count,
+        first_eaten = LEAST(s.first_eaten, EXCLUDED.first_eaten),
+        last_eaten = GREATEST(s.last_eaten, EXCLUDED.last_eaten),
+        recent_dates = ARRAY(
+            SELECT d FROM unnest(s.recent_dates || EXCLUDED.recent_dates) d
+            WHERE d >= meal_stats_horizon()
+            ORDER BY d
+        ),
+        popularity_mass = s.popularity_mass + EXCLUDED.popularity_mass;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Columns can only be added at the end of a replaced view
+CREATE OR REPLACE VIEW meal_stats_view AS
+SELECT
+    m.id AS meal_id,
+    m.name AS meal,
+    coalesce(s.eat_count, 0) AS eat_count,
+    s.first_eaten,
+    s.last_eaten,
+    CURRENT_DATE - s.last_eaten AS days_since_eaten,
+    CASE WHEN s.eat_count > 1
+        THEN (s.last_eaten - s.first_eaten)::FLOAT / (s.eat_count - 1)
+    END AS mean_interval_days,
+    (SELECT count(*) FROM unnest(s.recent_dates) d
+        WHERE d > CURRENT_DATE - 28 AND d <= CURRENT_DATE)::INTEGER AS eaten_last_4_weeks,
+    (SELECT count(*) FROM unnest(s.recent_dates) d
+        WHERE d > CURRENT_DATE - 84 AND d <= CURRENT_DATE)::INTEGER AS eaten_last_12_weeks,
+    (SELECT count(*) FROM unnest(s.recent_dates) d
+        WHERE d > CURRENT_DATE - 364 AND d <= CURRENT_DATE)::INTEGER AS eaten_last_52_weeks,
+    coalesce(s.popularity_mass / meal_popularity_weight(CURRENT_DATE), 0)
+        AS decayed_eat_count
+FROM
+    meals m
+LEFT JOIN
+    meal_stats s ON s.meal_id = m.id;
+
+-- Backfill the new column
+SELECT refresh_meal_stats();
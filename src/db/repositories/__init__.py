@@ -5,12 +5,17 @@ domain models. Each repository is responsible for a specific domain entity and p
 methods to interact with its corresponding database tables.
 """
 
-from .meal import MealRepository
-from .side_dish import SideDishRepository
-from .meal_history import MealHistoryRepository
+from .meal import MealRepository, AsyncMealRepository
+from .side_dish import SideDishRepository, AsyncSideDishRepository
+from .meal_history import MealHistoryRepository, AsyncMealHistoryRepository
+from .plan_cache import AsyncPlanCacheRepository
 
 __all__ = [
     "MealRepository",
     "SideDishRepository",
     "MealHistoryRepository",
+    "AsyncMealRepository",
+    "AsyncSideDishRepository",
+    "AsyncMealHistoryRepository",
+    "AsyncPlanCacheRepository",
 ]
@@ -1,37 +1,111 @@
 """Repository for meal-related database operations."""
 
 from models.meals import Meal
-from ..core.connection import get_connection
+from ..core.cache import MEALS, CatalogEntry, catalog_cache
+from ..core.connection import (
+    AsyncSession,
+    Session,
+    get_async_connection,
+    get_connection,
+)
 from lib import logger
+from lib.scoring import MealScorer
+
+# meal_types is loaded as a list of MealType by the adapter in `core/types.py`.
+_MEAL_COLUMNS = """
+    id, name, meal_types,
+    notes, frequency_factor, active_time, passive_time,
+    has_side_dish, created_at, updated_at
+"""
+
+_SELECT_ALL_MEALS = f"SELECT {_MEAL_COLUMNS} FROM meals ORDER BY name"
+_INSERT_MEAL = """
+    INSERT INTO meals (
+        id, name, meal_types, notes, frequency_factor, active_time, passive_time, has_side_dish
+    )
+    VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+"""
+
+
+# Scorer of the meal catalog with the cache generation it was built for.
+_scorer: tuple[int, MealScorer] | None = None
+
+
+def _catalog_scorer(generation: int, entry: CatalogEntry) -> MealScorer:
+    """Return the scorer for a catalog entry loaded at `generation`, building it once."""
+    global _scorer
+    if _scorer is None or _scorer[0] != generation:
+        _scorer = (generation, MealScorer(entry.items))
+    return _scorer[1]
+
+
+def _meal_params(meal: Meal) -> tuple:
+    return (
+        meal.id,
+        meal.name,
+        meal.meal_types,
+        meal.notes,
+        meal.frequency_factor,
+        meal.active_time,
+        meal.passive_time,
+        meal.has_side_dish,
+    )
 
 
 class MealRepository:
     """Repository class for handling Meal database operations."""
 
-    def __init__(self):
-        self._connection = get_connection
+    def __init__(self, session: Session | None = None):
+        self._connection = session.connection if session else get_connection
+
+    def _catalog(self) -> CatalogEntry:
+        """Return the cached meal catalog, loading it from the database on a miss."""
+        entry = catalog_cache.get(MEALS)
+        if entry is None:
+            generation = catalog_cache.generation(MEALS)
+            with self._connection() as conn:
+                conn.execute(_SELECT_ALL_MEALS, prepare=True, binary=True)
+                rows = conn.fetchall()
+            entry = catalog_cache.put(MEALS, [Meal(**row) for row in rows], generation)
+        return entry
 
     def get_all_meals(self) -> list[Meal] | None:
-        """Retrieve all meals from the database.
+        """Retrieve all meals from the catalog cache.
 
         Returns:
             list[Meal] | None: List of Meal objects if successful, None otherwise.
         """
         try:
-            with self._connection() as conn:
-                conn.execute("""
-                    SELECT 
-                        id, name, 
-                        string_to_array(trim(both '{}' from meal_types::text), ',') as meal_types,
-                        notes, frequency_factor, active_time, passive_time, 
-                        has_side_dish, created_at, updated_at
-                    FROM meals
-                    ORDER BY name
-                """)
-                rows = conn.fetchall()
-                return [Meal(**row) for row in rows] if rows else None
+            return list(self._catalog().items) or None
+        except Exception as e:
+            logger.error("Error fetching all meals: {}", e)
+            return None
+
+    def get_all_meals_json(self) -> bytes | None:
+        """Retrieve all meals as a JSON array, encoded once per catalog cache entry.
+
+        Returns:
+            bytes | None: The JSON encoded meals if there are any, None otherwise.
+        """
+        try:
+            entry = self._catalog()
+            return entry.json() if entry.items else None
+        except Exception as e:
+            logger.error("Error fetching all meals: {}", e)
+            return None
+
+    def get_meal_scorer(self) -> MealScorer | None:
+        """Retrieve the scorer of the meal catalog, built once per catalog cache generation.
+
+        Returns:
+            MealScorer | None: The scorer if there are any meals, None otherwise.
+        """
+        try:
+            generation = catalog_cache.generation(MEALS)
+            entry = self._catalog()
+            return _catalog_scorer(generation, entry) if entry.items else None
         except Exception as e:
-            logger.error(f"Error fetching all meals: {e}")
+            logger.error("Error building the meal scorer: {}", e)
             return None
 
     def get_meal_by_id(self, meal_id: int) -> Meal | None:
@@ -44,23 +118,9 @@ class MealRepository:
             Meal | None: The Meal object if found, None otherwise.
         """
         try:
-            with self._connection() as conn:
-                conn.execute(
-                    """
-                    SELECT 
-                        id, name, 
-                        string_to_array(trim(both '{}' from meal_types::text), ',') as meal_types,
-                        notes, frequency_factor, active_time, passive_time, 
-                        has_side_dish, created_at, updated_at
-                    FROM meals 
-                    WHERE id = %s
-                    """,
-                    (meal_id,),
-                )
-                row = conn.fetchone()
-                return Meal(**row) if row else None
+            return self._catalog().by_id.get(meal_id)
         except Exception as e:
-            logger.error(f"Error fetching meal with ID {meal_id}: {e}")
+            logger.error("Error fetching meal with ID {}: {}", meal_id, e)
             return None
 
     def get_meal_by_name(self, meal_name: str) -> Meal | None:
@@ -73,46 +133,112 @@ class MealRepository:
             Meal | None: The Meal object if found, None otherwise.
         """
         try:
-            with self._connection() as conn:
-                conn.execute(
-                    """
-                    SELECT 
-                        id, name, 
-                        string_to_array(trim(both '{}' from meal_types::text), ',') as meal_types,
-                        notes, frequency_factor, active_time, passive_time, 
-                        has_side_dish, created_at, updated_at
-                    FROM meals 
-                    WHERE name = %s
-                    """,
-                    (meal_name,),
-                )
-                row = conn.fetchone()
-                return Meal(**row) if row else None
+            return self._catalog().by_name.get(meal_name)
         except Exception as e:
-            logger.error(f"Error fetching meal with name {meal_name}: {e}")
+            logger.error("Error fetching meal with name {}: {}", meal_name, e)
             return None
 
     def add_meal(self, meal: Meal):
         try:
             with self._connection() as conn:
-                conn.execute(
-                    """
-                    INSERT INTO meals (
-                        id, name, meal_types, notes, frequency_factor, active_time, passive_time, has_side_dish
-                    )
-                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-                    """,
-                    (
-                        meal.id,
-                        meal.name,
-                        ",".join(meal.meal_types),
-                        meal.notes,
-                        meal.frequency_factor,
-                        meal.active_time,
-                        meal.passive_time,
-                        meal.has_side_dish,
-                    ),
-                )
+                conn.execute(_INSERT_MEAL, _meal_params(meal))
+            catalog_cache.invalidate(MEALS)
+        except Exception as e:
+            logger.error("Error adding meal: {}", e)
+            raise
+
+
+class AsyncMealRepository:
+    """Async counterpart of `MealRepository` for use in request handlers."""
+
+    def __init__(self, session: AsyncSession | None = None):
+        self._connection = session.connection if session else get_async_connection
+
+    async def _catalog(self) -> CatalogEntry:
+        """Return the cached meal catalog, loading it from the database on a miss."""
+        entry = catalog_cache.get(MEALS)
+        if entry is None:
+            generation = catalog_cache.generation(MEALS)
+            async with self._connection() as conn:
+                await conn.execute(_SELECT_ALL_MEALS, prepare=True, binary=True)
+                rows = await conn.fetchall()
+            entry = catalog_cache.put(MEALS, [Meal(**row) for row in rows], generation)
+        return entry
+
+    async def get_all_meals(self) -> list[Meal] | None:
+        """Retrieve all meals from the catalog cache.
+
+        Returns:
+            list[Meal] | None: List of Meal objects if successful, None otherwise.
+        """
+        try:
+            return list((await self._catalog()).items) or None
+        except Exception as e:
+            logger.error("Error fetching all meals: {}", e)
+            return None
+
+    async def get_all_meals_json(self) -> bytes | None:
+        """Retrieve all meals as a JSON array, encoded once per catalog cache entry.
+
+        Returns:
+            bytes | None: The JSON encoded meals if there are any, None otherwise.
+        """
+        try:
+            entry = await self._catalog()
+            return entry.json() if entry.items else None
+        except Exception as e:
+            logger.error("Error fetching all meals: {}", e)
+            return None
+
+    async def get_meal_scorer(self) -> MealScorer | None:
+        """Retrieve the scorer of the meal catalog, built once per catalog cache generation.
+
+        Returns:
+            MealScorer | None: The scorer if there are any meals, None otherwise.
+        """
+        try:
+            generation = catalog_cache.generation(MEALS)
+            entry = await self._catalog()
+            return _catalog_scorer(generation, entry) if entry.items else None
+        except Exception as e:
+            logger.error("Error building the meal scorer: {}", e)
+            return None
+
+    async def get_meal_by_id(self, meal_id: int) -> Meal | None:
+        """Retrieve a single meal by its ID.
+
+        Args:
+            meal_id: The ID of the meal to retrieve.
+
+        Returns:
+            Meal | None: The Meal object if found, None otherwise.
+        """
+        try:
+            return (await self._catalog()).by_id.get(meal_id)
+        except Exception as e:
+            logger.error("Error fetching meal with ID {}: {}", meal_id, e)
+            return None
+
+    async def get_meal_by_name(self, meal_name: str) -> Meal | None:
+        """Retrieve a single meal by its name.
+
+        Args:
+            meal_name: The name of the meal to retrieve.
+
+        Returns:
+            Meal | None: The Meal object if found, None otherwise.
+        """
+        try:
+            return (await self._catalog()).by_name.get(meal_name)
+        except Exception as e:
+            logger.error("Error fetching meal with name {}: {}", meal_name, e)
+            return None
+
+    async def add_meal(self, meal: Meal):
+        try:
+            async with self._connection() as conn:
+                await conn.execute(_INSERT_MEAL, _meal_params(meal))
+            catalog_cache.invalidate(MEALS)
         except Exception as e:
-            logger.error(f"Error adding meal: {e}")
+            logger.error("Error adding meal: {}", e)
             raise
@@ -1,22 +1,240 @@
 """Repository for meal history-related database operations."""
 
+import base64
+from datetime import date
+from typing import AsyncIterator
+
 from fastapi import HTTPException
+from psycopg.rows import dict_row
+from pydantic_core import to_json
+
+from models.meals import MealHistory, MealHistoryItem, MealStats
+from ..core.connection import (
+    AsyncSession,
+    Session,
+    get_async_connection,
+    get_connection,
+)
+from .meal import MealRepository, AsyncMealRepository
+from .side_dish import SideDishRepository, AsyncSideDishRepository
+from lib import logger, sampled
+from settings import settings
+
+_SELECT_ALL_MEAL_HISTORY = """
+    SELECT 
+        date_eaten,
+        meal,
+        side_dish
+    FROM meal_history_view
+    ORDER BY date_eaten DESC, id
+"""
+_SELECT_MEAL_HISTORY = """
+    SELECT
+        id,
+        date_eaten,
+        meal,
+        side_dish
+    FROM meal_history_view
+"""
+# Served from `meal_stats`, which triggers keep in step with the history.
+_SELECT_MEAL_STATS = """
+    SELECT
+        meal_id,
+        meal,
+        eat_count,
+        first_eaten,
+        last_eaten,
+        days_since_eaten,
+        mean_interval_days,
+        eaten_last_4_weeks,
+        eaten_last_12_weeks,
+        eaten_last_52_weeks,
+        decayed_eat_count
+    FROM meal_stats_view
+    ORDER BY last_eaten DESC NULLS LAST, meal
+"""
+_INSERT_MEAL_HISTORY = """
+    INSERT INTO meal_history (date_eaten, meal_id, side_dish_id)
+    VALUES (%s, %s, %s)
+"""
+
+# Resolves every name of an import in one round trip.
+_RESOLVE_NAMES = """
+    SELECT 'meal' AS kind, id, name FROM meals WHERE name = ANY(%(meals)s)
+    UNION ALL
+    SELECT 'side_dish' AS kind, id, name FROM side_dishes WHERE name = ANY(%(side_dishes)s)
+"""
+_COPY_MEAL_HISTORY = "COPY meal_history (date_eaten, meal_id, side_dish_id) FROM STDIN"
+
+
+def _resolve_params(items: list[MealHistoryItem]) -> dict:
+    return {
+        "meals": list({item.meal for item in items}),
+        "side_dishes": list({item.side_dish for item in items if item.side_dish}),
+    }
+
+
+def _import_rows(
+    items: list[MealHistoryItem], name_rows: list[dict]
+) -> tuple[list[tuple], list[tuple[int, str]]]:
+    """Map imported items to `meal_history` rows.
+
+    Returns:
+        tuple: (rows to copy, (index, error) of every item that names an unknown meal or side dish).
+    """
+    ids = {(row["kind"], row["name"]): row["id"] for row in name_rows}
+    rows, errors = [], []
+    for index, item in enumerate(items):
+        meal_id = ids.get(("meal", item.meal))
+        side_dish_id = ids.get(("side_dish", item.side_dish))
+        if meal_id is None:
+            errors.append((index, f"Meal not found: {item.meal}"))
+        elif item.side_dish and side_dish_id is None:
+            errors.append((index, f"Side dish not found: {item.side_dish}"))
+        else:
+            rows.append((item.date_eaten, meal_id, side_dish_id))
+    return rows, errors
+
+
+def encode_history_cursor(date_eaten: date, history_id: int) -> str:
+    """Encode the keyset position after a history row as an opaque cursor."""
+    raw = f"{date_eaten.isoformat()}|{history_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_history_cursor(cursor: str) -> tuple[date, int]:
+    """Decode a cursor from `encode_history_cursor`.
+
+    Raises:
+        ValueError: If the cursor is malformed.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        date_eaten, history_id = raw.split("|")
+        return date.fromisoformat(date_eaten), int(history_id)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise ValueError(f"Invalid meal history cursor: {cursor}") from e
+
+
+def _history_query(
+    date_from: date | None,
+    date_to: date | None,
+    after: tuple[date, int] | None,
+    limit: int | None,
+) -> tuple[str, list]:
+    """Build a filtered, keyset-paginated history query, newest first.
+
+    Rows are ordered by `(date_eaten DESC, id)`, which `idx_meal_history_date_id` serves, so
+    a page starts right after the cursor row without an OFFSET scan.
+    """
+    conditions, params = [], []
+    if date_from is not None:
+        conditions.append("date_eaten >= %s")
+        params.append(date_from)
+    if date_to is not None:
+        conditions.append("date_eaten <= %s")
+        params.append(date_to)
+    if after is not None:
+        # The leading bound is redundant but sargable: it lets the index start at the cursor.
+        conditions.append(
+            "date_eaten <= %s AND (date_eaten < %s OR (date_eaten = %s AND id > %s))"
+        )
+        params.extend([after[0], after[0], after[0], after[1]])
+
+    query = _SELECT_MEAL_HISTORY
+    if conditions:
+        query += "    WHERE " + " AND ".join(conditions) + "\n"
+    query += "    ORDER BY date_eaten DESC, id\n"
+    if limit is not None:
+        query += "    LIMIT %s\n"
+        params.append(limit)
+    return query, params
 
-from models.meals import MealHistory, MealHistoryItem
-from ..core.connection import get_connection
-from .meal import MealRepository
-from .side_dish import SideDishRepository
-from lib import logger
+
+def _page_query(
+    date_from: date | None,
+    date_to: date | None,
+    limit: int | None,
+    cursor: str | None,
+) -> tuple[str, list]:
+    """Query for a history page, fetching one row more than `limit` to detect a next page."""
+    after = decode_history_cursor(cursor) if cursor else None
+    return _history_query(
+        date_from, date_to, after, None if limit is None else limit + 1
+    )
+
+
+def _split_page(rows: list[dict], limit: int | None) -> tuple[list[dict], str | None]:
+    """Trim up to `limit + 1` rows to a page; the extra row signals a next page."""
+    if limit is None or len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_history_cursor(rows[-1]["date_eaten"], rows[-1]["id"])
+
+
+def _page_from_rows(rows: list[dict], limit: int | None) -> MealHistory:
+    """Build a history page from up to `limit + 1` rows."""
+    rows, next_cursor = _split_page(rows, limit)
+    page = _history_from_rows(rows)
+    page.next_cursor = next_cursor
+    return page
+
+
+def _page_json(rows: list[dict], limit: int | None) -> bytes:
+    """Encode a history page from up to `limit + 1` rows straight to JSON.
+
+    The rows come from `meal_history_view`, whose columns already have the types of
+    MealHistoryItem, so they are projected to the response fields and encoded without
+    building the models. The output is the same as encoding `_page_from_rows`.
+    """
+    rows, next_cursor = _split_page(rows, limit)
+    if sampled("history.encode"):
+        logger.debug("Encoding {} meal history rows", len(rows))
+    history = [
+        {
+            "date_eaten": row["date_eaten"],
+            "meal": row["meal"],
+            "side_dish": row["side_dish"],
+        }
+        for row in rows
+    ]
+    return to_json({"history": history, "next_cursor": next_cursor})
+
+
+def _history_from_rows(rows: list[dict]) -> MealHistory:
+    """Convert `meal_history_view` rows into a MealHistory object.
+
+    The rows are validated in one call, so the whole list is checked by pydantic-core
+    instead of constructing each MealHistoryItem from Python.
+    """
+    if not rows:
+        logger.info("No meal history records found in database")
+        return MealHistory(history=[])
+
+    # Formatted only if a sink takes DEBUG
+    if sampled("history.build"):
+        logger.opt(lazy=True).debug(
+            "Building meal history from {} rows, first: {}",
+            lambda: len(rows),
+            lambda: rows[:3],
+        )
+
+    try:
+        return MealHistory.model_validate({"history": rows})
+    except Exception as e:
+        logger.opt(exception=e).error("Error creating MealHistory: {}", e)
+        raise
 
 
 class MealHistoryRepository:
     """Repository class for handling MealHistory database operations."""
 
-    def __init__(self):
-        logger.debug("Initializing MealHistoryRepository")
-        self._connection = get_connection
-        self._meal_repo = MealRepository()
-        self._side_dish_repo = SideDishRepository()
+    def __init__(self, session: Session | None = None):
+        if sampled("history.repository"):
+            logger.debug("Initializing MealHistoryRepository")
+        self._connection = session.connection if session else get_connection
+        self._meal_repo = MealRepository(session)
+        self._side_dish_repo = SideDishRepository(session)
 
     def get_all_meal_history(self) -> MealHistory | None:
         """Retrieve all meal history records from the database.
@@ -24,69 +242,111 @@ class MealHistoryRepository:
         Returns:
             MealHistory | None: MealHistory object containing history items if successful, None otherwise.
         """
-        logger.debug("Fetching all meal history from database")
-
         try:
             with self._connection() as conn:
-                logger.debug("Connected to database, executing query")
-
-                # Get all history items using the meal_history_view
-                query = """
-                    SELECT 
-                        date_eaten,
-                        meal,
-                        side_dish
-                    FROM meal_history_view
-                    ORDER BY date_eaten DESC, id
-                """
-                logger.debug("Executing SQL query")
-                conn.execute(query)
-
+                conn.execute(_SELECT_ALL_MEAL_HISTORY, prepare=True, binary=True)
                 rows = conn.fetchall()
-                logger.debug(f"Fetched {len(rows)} rows from database")
+            return _history_from_rows(rows)
+        except Exception as e:
+            logger.opt(exception=e).error(
+                "Unexpected error in get_all_meal_history: {}", e
+            )
+            return None
 
-                if not rows:
-                    logger.info("No meal history records found in database")
-                    return MealHistory(history=[])
+    def get_meal_history(
+        self,
+        date_from: date | None = None,
+        date_to: date | None = None,
+        limit: int | None = None,
+        cursor: str | None = None,
+    ) -> MealHistory:
+        """Retrieve meal history in a date range, one page at a time.
 
-                # Log first few rows for debugging
-                sample_size = min(3, len(rows))
-                logger.debug(f"Sample of fetched rows: {rows[:sample_size]}")
+        Args:
+            date_from: First date to include.
+            date_to: Last date to include.
+            limit: Maximum number of items, or None for all of them.
+            cursor: `next_cursor` of the previous page.
 
-                # Convert rows to MealHistoryItem objects
-                history_items = []
-                for row in rows:
-                    try:
-                        item = MealHistoryItem(
-                            date_eaten=row["date_eaten"],
-                            meal=row["meal"],
-                            side_dish=row["side_dish"],
-                        )
-                        history_items.append(item)
-                    except Exception as item_error:
-                        logger.error(
-                            f"Error creating MealHistoryItem from row {row}: {item_error}",
-                            exc_info=True,
-                        )
-                        raise
-
-                logger.debug(f"Created {len(history_items)} MealHistoryItem objects")
-
-                try:
-                    result = MealHistory(history=history_items)
-                    logger.debug("Successfully created MealHistory object")
-                    return result
-                except Exception as history_error:
-                    logger.error(
-                        f"Error creating MealHistory: {history_error}", exc_info=True
-                    )
-                    raise
+        Returns:
+            MealHistory: The items, newest first, and `next_cursor` if there are more.
 
-        except Exception as e:
-            logger.error(
-                f"Unexpected error in get_all_meal_history: {e}", exc_info=True
-            )
-            return None
+        Raises:
+            ValueError: If the cursor is malformed.
+        """
+        return _page_from_rows(
+            self._fetch_page(date_from, date_to, limit, cursor), limit
+        )
+
+    def get_meal_history_json(
+        self,
+        date_from: date | None = None,
+        date_to: date | None = None,
+        limit: int | None = None,
+        cursor: str | None = None,
+    ) -> bytes:
+        """Retrieve a page of meal history as the JSON of a MealHistory.
+
+        Takes the same arguments as `get_meal_history`, but encodes the rows directly
+        instead of building the models, for endpoints that only return them.
+
+        Raises:
+            ValueError: If the cursor is malformed.
+        """
+        return _page_json(self._fetch_page(date_from, date_to, limit, cursor), limit)
+
+    def _fetch_page(
+        self,
+        date_from: date | None,
+        date_to: date | None,
+        limit: int | None,
+        cursor: str | None,
+    ) -> list[dict]:
+        query, params = _page_query(date_from, date_to, limit, cursor)
+        with self._connection() as conn:
+            conn.execute(query, params, prepare=True, binary=True)
+            return conn.fetchall()
+
+    def get_meal_stats(self) -> list[MealStats]:
+        """Retrieve recency and popularity statistics of every meal.
+
+        The statistics are precomputed per meal, so this reads one row per meal however
+        long the history is.
+
+        Returns:
+            list[MealStats]: One entry per meal, most recently eaten first.
+        """
+        with self._connection() as conn:
+            conn.execute(_SELECT_MEAL_STATS, prepare=True, binary=True)
+            rows = conn.fetchall()
+        return [MealStats(**row) for row in rows]
+
+    def import_meal_history(
+        self, items: list[MealHistoryItem], atomic: bool = False
+    ) -> tuple[int, list[tuple[int, str]]]:
+        """Bulk load meal history items with `COPY` in a single transaction.
+
+        All meal and side dish names are resolved in one query. Items naming an unknown meal
+        or side dish are reported and skipped.
+
+        Args:
+            items: Items to load.
+            atomic: Load nothing if any item is rejected.
+
+        Returns:
+            tuple: (number of rows loaded, (index, error) of every rejected item).
+        """
+        if not items:
+            return 0, []
+        with self._connection() as conn:
+            conn.execute(_RESOLVE_NAMES, _resolve_params(items), prepare=True)
+            rows, errors = _import_rows(items, conn.fetchall())
+            if errors and atomic:
+                return 0, errors
+            with conn.copy(_COPY_MEAL_HISTORY) as copy:
+                for row in rows:
+                    copy.write_row(row)
+        return len(rows), errors
 
     def add_meal_history(self, meal_history: MealHistoryItem):
         """Add a new meal history item to the database.
@@ -123,20 +383,215 @@ class MealHistoryRepository:
 
             with self._connection() as conn:
                 conn.execute(
-                    """
-                    INSERT INTO meal_history (date_eaten, meal_id, side_dish_id)
-                    VALUES (%s, %s, %s)
-                    """,
+                    _INSERT_MEAL_HISTORY,
                     (
                         meal_history.date_eaten,
                         meal_id,
                         side_dish_id,
                     ),
+                    prepare=True,
+                )
+        except HTTPException:
+            raise
+        except Exception as e:
+            logger.error("Error adding meal history: {}", e)
+            raise HTTPException(
+                status_code=500, detail=f"Failed to add meal history: {str(e)}"
+            )
+
+
+class AsyncMealHistoryRepository:
+    """Async counterpart of `MealHistoryRepository` for use in request handlers."""
+
+    def __init__(self, session: AsyncSession | None = None):
+        if sampled("history.async_repository"):
+            logger.debug("Initializing AsyncMealHistoryRepository")
+        self._connection = session.connection if session else get_async_connection
+        self._meal_repo = AsyncMealRepository(session)
+        self._side_dish_repo = AsyncSideDishRepository(session)
+
+    async def get_all_meal_history(self) -> MealHistory | None:
+        """Retrieve all meal history records from the database.
+
+        Returns:
+            MealHistory | None: MealHistory object containing history items if successful, None otherwise.
+        """
+        try:
+            async with self._connection() as conn:
+                await conn.execute(_SELECT_ALL_MEAL_HISTORY, prepare=True, binary=True)
+                rows = await conn.fetchall()
+            return _history_from_rows(rows)
+        except Exception as e:
+            logger.opt(exception=e).error(
+                "Unexpected error in get_all_meal_history: {}", e
+            )
+            return None
+
+    async def get_meal_history(
+        self,
+        date_from: date | None = None,
+        date_to: date | None = None,
+        limit: int | None = None,
+        cursor: str | None = None,
+    ) -> MealHistory:
+        """Retrieve meal history in a date range, one page at a time.
+
+        Args:
+            date_from: First date to include.
+            date_to: Last date to include.
+            limit: Maximum number of items, or None for all of them.
+            cursor: `next_cursor` of the previous page.
+
+        Returns:
+            MealHistory: The items, newest first, and `next_cursor` if there are more.
+
+        Raises:
+            ValueError: If the cursor is malformed.
+        """
+        return _page_from_rows(
+            await self._fetch_page(date_from, date_to, limit, cursor), limit
+        )
+
+    async def get_meal_history_json(
+        self,
+        date_from: date | None = None,
+        date_to: date | None = None,
+        limit: int | None = None,
+        cursor: str | None = None,
+    ) -> bytes:
+        """Retrieve a page of meal history as the JSON of a MealHistory.
+
+        Takes the same arguments as `get_meal_history`, but encodes the rows directly
+        instead of building the models, for endpoints that only return them.
+
+        Raises:
+            ValueError: If the cursor is malformed.
+        """
+        return _page_json(
+            await self._fetch_page(date_from, date_to, limit, cursor), limit
+        )
+
+    async def _fetch_page(
+        self,
+        date_from: date | None,
+        date_to: date | None,
+        limit: int | None,
+        cursor: str | None,
+    ) -> list[dict]:
+        query, params = _page_query(date_from, date_to, limit, cursor)
+        async with self._connection() as conn:
+            await conn.execute(query, params, prepare=True, binary=True)
+            return await conn.fetchall()
+
+    async def get_meal_stats(self) -> list[MealStats]:
+        """Retrieve recency and popularity statistics of every meal.
+
+        The statistics are precomputed per meal, so this reads one row per meal however
+        long the history is.
+
+        Returns:
+            list[MealStats]: One entry per meal, most recently eaten first.
+        """
+        async with self._connection() as conn:
+            await conn.execute(_SELECT_MEAL_STATS, prepare=True, binary=True)
+            rows = await conn.fetchall()
+        return [MealStats(**row) for row in rows]
+
+    async def stream_meal_history(
+        self,
+        date_from: date | None = None,
+        date_to: date | None = None,
+        limit: int | None = None,
+        cursor: str | None = None,
+    ) -> AsyncIterator[MealHistoryItem]:
+        """Stream meal history through a server-side cursor.
+
+        Rows are fetched from the database in batches of `HISTORY_STREAM_BATCH_SIZE`, so memory
+        use does not grow with the history. Takes the same arguments as `get_meal_history`.
+
+        Raises:
+            ValueError: If the cursor is malformed.
+        """
+        after = decode_history_cursor(cursor) if cursor else None
+        query, params = _history_query(date_from, date_to, after, limit)
+        async with self._connection() as conn:
+            async with conn.connection.cursor(
+                name="meal_history_stream", row_factory=dict_row, binary=True
+            ) as stream:
+                stream.itersize = settings.HISTORY_STREAM_BATCH_SIZE
+                await stream.execute(query, params)
+                async for row in stream:
+                    yield MealHistoryItem(
+                        date_eaten=row["date_eaten"],
+                        meal=row["meal"],
+                        side_dish=row["side_dish"],
+                    )
+
+    async def import_meal_history(
+        self, items: list[MealHistoryItem], atomic: bool = False
+    ) -> tuple[int, list[tuple[int, str]]]:
+        """Bulk load meal history items with `COPY` in a single transaction.
+
+        All meal and side dish names are resolved in one query. Items naming an unknown meal
+        or side dish are reported and skipped.
+
+        Args:
+            items: Items to load.
+            atomic: Load nothing if any item is rejected.
+
+        Returns:
+            tuple: (number of rows loaded, (index, error) of every rejected item).
+        """
+        if not items:
+            return 0, []
+        async with self._connection() as conn:
+            await conn.execute(_RESOLVE_NAMES, _resolve_params(items), prepare=True)
+            rows, errors = _import_rows(items, await conn.fetchall())
+            if errors and atomic:
+                return 0, errors
+            async with conn.copy(_COPY_MEAL_HISTORY) as copy:
+                for row in rows:
+                    await copy.write_row(row)
+        return len(rows), errors
+
+    async def add_meal_history(self, meal_history: MealHistoryItem):
+        """Add a new meal history item to the database.
+
+        Args:
+            meal_history: The meal history item to add, containing meal and side dish names.
+
+        Raises:
+            HTTPException: If the meal is not found or there's a database error.
+        """
+        try:
+            meal = await self._meal_repo.get_meal_by_name(meal_history.meal)
+            if not meal:
+                raise HTTPException(
+                    status_code=404, detail=f"Meal not found: {meal_history.meal}"
+                )
+
+            side_dish_id = None
+            if meal_history.side_dish:
+                side_dish = await self._side_dish_repo.get_side_dish_by_name(
+                    meal_history.side_dish
+                )
+                if side_dish:
+                    side_dish_id = side_dish.id
+
+            async with self._connection() as conn:
+                await conn.execute(
+                    _INSERT_MEAL_HISTORY,
+                    (
+                        meal_history.date_eaten,
+                        meal.id,
+                        side_dish_id,
+                    ),
+                    prepare=True,
                 )
         except HTTPException:
             raise
         except Exception as e:
-            logger.error(f"Error adding meal history: {e}")
+            logger.error("Error adding meal history: {}", e)
             raise HTTPException(
                 status_code=500, detail=f"Failed to add meal history: {str(e)}"
             )
@@ -0,0 +1,63 @@
+"""Repository for cached AI meal plans."""
+
+from datetime import timedelta
+
+from psycopg.types.json import Jsonb
+
+from models.plan import MealPlan
+from ..core.connection import AsyncSession, get_async_connection
+from lib import logger
+
+_SELECT_PLAN = """
+    SELECT plan
+    FROM current_plan_cache_view
+    WHERE cache_key = %s
+"""
+_UPSERT_PLAN = """
+    INSERT INTO plan_cache (cache_key, model, plan, ttl)
+    VALUES (%s, %s, %s, %s)
+    ON CONFLICT (cache_key) DO UPDATE
+    SET model = EXCLUDED.model,
+        plan = EXCLUDED.plan,
+        ttl = EXCLUDED.ttl,
+        created_at = CURRENT_TIMESTAMP
+"""
+_CLEAN_EXPIRED = "SELECT clean_expired_plan_cache()"
+
+
+def _plan_params(key: str, model: str, plan: MealPlan, ttl: float) -> tuple:
+    return (key, model, Jsonb(plan.model_dump(mode="json")), timedelta(seconds=ttl))
+
+
+class AsyncPlanCacheRepository:
+    """Repository class for handling cached plan database operations in request handlers."""
+
+    def __init__(self, session: AsyncSession | None = None):
+        self._connection = session.connection if session else get_async_connection
+
+    async def get_plan(self, key: str) -> MealPlan | None:
+        """Retrieve an unexpired cached plan.
+
+        Args:
+            key: Cache key of the plan.
+
+        Returns:
+            MealPlan | None: The cached plan if found and not expired, None otherwise.
+        """
+        try:
+            async with self._connection() as conn:
+                await conn.execute(_SELECT_PLAN, (key,))
+                row = await conn.fetchone()
+            return MealPlan.model_validate(row["plan"]) if row else None
+        except Exception as e:
+            logger.error("Error fetching cached plan {}: {}", key, e)
+            return None
+
+    async def put_plan(self, key: str, model: str, plan: MealPlan, ttl: float) -> None:
+        """Store a plan for `ttl` seconds and remove expired plans."""
+        try:
+            async with self._connection() as conn:
+                await conn.execute(_UPSERT_PLAN, _plan_params(key, model, plan, ttl))
+                await conn.execute(_CLEAN_EXPIRED)
+        except Exception as e:
+            logger.error("Error caching plan {}: {}", key, e)
@@ -1,33 +1,74 @@
 """Repository for side dish-related database operations."""
 
 from models.meals import SideDish
-from ..core.connection import get_connection
+from ..core.cache import SIDE_DISHES, CatalogEntry, catalog_cache
+from ..core.connection import (
+    AsyncSession,
+    Session,
+    get_async_connection,
+    get_connection,
+)
 from lib import logger
 
+_SELECT_ALL_SIDE_DISHES = """
+    SELECT id, name, notes, created_at, updated_at
+    FROM side_dishes
+    ORDER BY name
+"""
+_INSERT_SIDE_DISH = """
+    INSERT INTO side_dishes (
+        id, name, notes
+    )
+    VALUES (%s, %s, %s)
+"""
+
+
+def _side_dish_params(side_dish: SideDish) -> tuple:
+    return (side_dish.id, side_dish.name, side_dish.notes)
+
 
 class SideDishRepository:
     """Repository class for handling SideDish database operations."""
 
-    def __init__(self):
-        self._connection = get_connection
+    def __init__(self, session: Session | None = None):
+        self._connection = session.connection if session else get_connection
+
+    def _catalog(self) -> CatalogEntry:
+        """Return the cached side dish catalog, loading it from the database on a miss."""
+        entry = catalog_cache.get(SIDE_DISHES)
+        if entry is None:
+            generation = catalog_cache.generation(SIDE_DISHES)
+            with self._connection() as conn:
+                conn.execute(_SELECT_ALL_SIDE_DISHES, prepare=True, binary=True)
+                rows = conn.fetchall()
+            entry = catalog_cache.put(
+                SIDE_DISHES, [SideDish(**row) for row in rows], generation
+            )
+        return entry
 
     def get_all_side_dishes(self) -> list[SideDish] | None:
-        """Retrieve all side dishes from the database.
+        """Retrieve all side dishes from the catalog cache.
 
         Returns:
             list[SideDish] | None: List of SideDish objects if successful, None otherwise.
         """
         try:
-            with self._connection() as conn:
-                conn.execute("""
-                    SELECT id, name, notes, created_at, updated_at
-                    FROM side_dishes
-                    ORDER BY name
-                """)
-                rows = conn.fetchall()
-                return [SideDish(**row) for row in rows] if rows else None
+            return list(self._catalog().items) or None
+        except Exception as e:
+            logger.error("Error fetching all side dishes: {}", e)
+            return None
+
+    def get_all_side_dishes_json(self) -> bytes | None:
+        """Retrieve all side dishes as a JSON array, encoded once per catalog cache entry.
+
+        Returns:
+            bytes | None: The JSON encoded side dishes if there are any, None otherwise.
+        """
+        try:
+            entry = self._catalog()
+            return entry.json() if entry.items else None
         except Exception as e:
-            logger.error(f"Error fetching all side dishes: {e}")
+            logger.error("Error fetching all side dishes: {}", e)
             return None
 
     def get_side_dish_by_name(self, side_dish_name: str) -> SideDish | None:
@@ -40,38 +81,85 @@ class SideDishRepository:
             SideDish | None: The SideDish object if found, None otherwise.
         """
         try:
-            with self._connection() as conn:
-                conn.execute(
-                    """
-                    SELECT 
-                        id, name, notes, created_at, updated_at
-                    FROM side_dishes 
-                    WHERE name = %s
-                    """,
-                    (side_dish_name,),
-                )
-                row = conn.fetchone()
-                return SideDish(**row) if row else None
+            return self._catalog().by_name.get(side_dish_name)
         except Exception as e:
-            logger.error(f"Error fetching side dish with name {side_dish_name}: {e}")
+            logger.error("Error fetching side dish with name {}: {}", side_dish_name, e)
             return None
 
     def add_side_dish(self, side_dish: SideDish):
         try:
             with self._connection() as conn:
-                conn.execute(
-                    """
-                    INSERT INTO side_dishes (
-                        id, name, notes
-                    )
-                    VALUES (%s, %s, %s)
-                    """,
-                    (
-                        side_dish.id,
-                        side_dish.name,
-                        side_dish.notes,
-                    ),
-                )
+                conn.execute(_INSERT_SIDE_DISH, _side_dish_params(side_dish))
+            catalog_cache.invalidate(SIDE_DISHES)
+        except Exception as e:
+            logger.error("Error adding side dish: {}", e)
+            raise
+
+
+class AsyncSideDishRepository:
+    """Async counterpart of `SideDishRepository` for use in request handlers."""
+
+    def __init__(self, session: AsyncSession | None = None):
+        self._connection = session.connection if session else get_async_connection
+
+    async def _catalog(self) -> CatalogEntry:
+        """Return the cached side dish catalog, loading it from the database on a miss."""
+        entry = catalog_cache.get(SIDE_DISHES)
+        if entry is None:
+            generation = catalog_cache.generation(SIDE_DISHES)
+            async with self._connection() as conn:
+                await conn.execute(_SELECT_ALL_SIDE_DISHES, prepare=True, binary=True)
+                rows = await conn.fetchall()
+            entry = catalog_cache.put(
+                SIDE_DISHES, [SideDish(**row) for row in rows], generation
+            )
+        return entry
+
+    async def get_all_side_dishes(self) -> list[SideDish] | None:
+        """Retrieve all side dishes from the catalog cache.
+
+        Returns:
+            list[SideDish] | None: List of SideDish objects if successful, None otherwise.
+        """
+        try:
+            return list((await self._catalog()).items) or None
+        except Exception as e:
+            logger.error("Error fetching all side dishes: {}", e)
+            return None
+
+    async def get_all_side_dishes_json(self) -> bytes | None:
+        """Retrieve all side dishes as a JSON array, encoded once per catalog cache entry.
+
+        Returns:
+            bytes | None: The JSON encoded side dishes if there are any, None otherwise.
+        """
+        try:
+            entry = await self._catalog()
+            return entry.json() if entry.items else None
+        except Exception as e:
+            logger.error("Error fetching all side dishes: {}", e)
+            return None
+
+    async def get_side_dish_by_name(self, side_dish_name: str) -> SideDish | None:
+        """Retrieve a single side dish by its name.
+
+        Args:
+            side_dish_name: The name of the side dish to retrieve.
+
+        Returns:
+            SideDish | None: The SideDish object if found, None otherwise.
+        """
+        try:
+            return (await self._catalog()).by_name.get(side_dish_name)
+        except Exception as e:
+            logger.error("Error fetching side dish with name {}: {}", side_dish_name, e)
+            return None
+
+    async def add_side_dish(self, side_dish: SideDish):
+        try:
+            async with self._connection() as conn:
+                await conn.execute(_INSERT_SIDE_DISH, _side_dish_params(side_dish))
+            catalog_cache.invalidate(SIDE_DISHES)
         except Exception as e:
-            logger.error(f"Error adding side dish: {e}")
+            logger.error("Error adding side dish: {}", e)
             raise
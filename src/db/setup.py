@@ -3,157 +3,274 @@
 This module contains functions for setting up and initializing the database,
 including creating tables and seeding initial data. These functions are typically
 only run during application installation or setup.
+
+Applied migration and seed files are recorded with their checksums in the
+`schema_migrations` ledger, so installing again only runs what is new and is a
+no-op on an up-to-date database.
 """
 
+import hashlib
 import json
 
 from pathlib import Path
+from typing import NamedTuple
 
 from .core.connection import get_connection
 from lib import logger
 
+_DB_DIR = Path(__file__).parent
+_MIGRATIONS_DIR = _DB_DIR / "migrations"
+_SEED_FILES = ("seeds/seed_meals.json", "seeds/seed_sidedishes.json")
 
-def seed_database() -> None:
-    """Seed the database with initial data.
+# Every install ran all migrations before the ledger existed. A database installed that way is
+# assumed to have migrations up to this version (they drop and recreate the tables); the later
+# ones only replace functions, triggers, indexes and caches and are safe to run again.
+_PRE_LEDGER_VERSION = 5
+
+_LEDGER = """
+CREATE TABLE IF NOT EXISTS schema_migrations (
+    name TEXT PRIMARY KEY,
+    checksum TEXT NOT NULL,
+    applied_at TIMESTAMPTZ NOT NULL DEFAULT now()
+)
+"""
+
+
+class Migration(NamedTuple):
+    version: int
+    name: str
+    path: Path
+    checksum: str
+
+
+class SchemaStatus(NamedTuple):
+    installed: bool
+    pending_migrations: list[Migration]
+    pending_seeds: list[str]
+
+    @property
+    def current(self) -> bool:
+        return self.installed and not self.pending_migrations and not self.pending_seeds
+
+
+def _checksum(path: Path) -> str:
+    return hashlib.sha256(path.read_bytes()).hexdigest()
+
+
+def migration_files() -> list[Migration]:
+    """SQL migration files, ordered by their numeric prefix (e.g. '01_meals.sql')."""
+    migrations = []
+    for sql_file in _MIGRATIONS_DIR.glob("*.sql"):
+        try:
+            version = int(sql_file.stem.split("_")[0])
+        except (ValueError, IndexError):
+            logger.warning("Skipping SQL file without numeric prefix: {}", sql_file)
+            continue
+        migrations.append(
+            Migration(
+                version,
+                f"migrations/{sql_file.name}",
+                sql_file,
+                _checksum(sql_file),
+            )
+        )
+    migrations.sort()
+    return migrations
+
+
+def _ledger(conn) -> dict[str, str]:
+    """Checksums by file name from the ledger, empty if there is no ledger yet."""
+    conn.execute("SELECT to_regclass('schema_migrations') IS NOT NULL AS exists")
+    if not conn.fetchone()["exists"]:
+        return {}
+    conn.execute("SELECT name, checksum FROM schema_migrations")
+    return {row["name"]: row["checksum"] for row in conn.fetchall()}
 
-    This function loads meal and side dish data from JSON files and inserts them
-    into the database.
+
+def _adopted(migrations: list[Migration]) -> dict[str, str]:
+    """Ledger entries for a database installed before the ledger existed."""
+    adopted = {
+        m.name: m.checksum for m in migrations if m.version <= _PRE_LEDGER_VERSION
+    }
+    adopted.update({name: _checksum(_DB_DIR / name) for name in _SEED_FILES})
+    return adopted
+
+
+def _status(conn, migrations: list[Migration]) -> tuple[SchemaStatus, dict[str, str]]:
+    conn.execute("SELECT to_regclass('meals') IS NOT NULL AS installed")
+    installed = conn.fetchone()["installed"]
+    applied = _ledger(conn)
+    adopt = {}
+    if installed and not any(name.startswith("migrations/") for name in applied):
+        adopt = {k: v for k, v in _adopted(migrations).items() if k not in applied}
+        applied = {**applied, **adopt}
+
+    pending = []
+    for migration in migrations:
+        checksum = applied.get(migration.name)
+        if checksum is None:
+            pending.append(migration)
+        elif checksum != migration.checksum:
+            raise RuntimeError(
+                f"Migration {migration.name} changed after it was applied; "
+                "add a new migration instead of editing it"
+            )
+    seeds = [
+        name for name in _SEED_FILES if applied.get(name) != _checksum(_DB_DIR / name)
+    ]
+    return SchemaStatus(installed, pending, seeds), adopt
+
+
+def schema_status() -> SchemaStatus:
+    """Migrations and seed files not yet applied to the database.
+
+    Raises:
+        RuntimeError: If a migration file changed after it was applied.
     """
-    logger.info("Seeding database...")
+    with get_connection() as conn:
+        status, _ = _status(conn, migration_files())
+    return status
+
 
+def _record(conn, entries: dict[str, str]) -> None:
+    conn.executemany(
+        "INSERT INTO schema_migrations (name, checksum) VALUES (%s, %s) "
+        "ON CONFLICT (name) DO UPDATE "
+        "SET checksum = EXCLUDED.checksum, applied_at = now()",
+        list(entries.items()),
+    )
+
+
+def seed_database() -> bool:
+    """Seed the database with initial data.
+
+    Meals and side dishes are loaded from the JSON seed files and upserted by name in
+    one batch per table; rows that already match the seed data are left untouched.
+    Nothing is done if the seed files have not changed since they were last applied.
+
+    Returns:
+        bool: True if seeding succeeded or was not needed, False otherwise.
+    """
     try:
-        with open(Path(__file__).parent / "seeds/seed_meals.json", "r") as f:
+        with open(_DB_DIR / "seeds/seed_meals.json", "r") as f:
             meals = sorted(json.load(f), key=lambda x: x["name"])
-        with open(Path(__file__).parent / "seeds/seed_sidedishes.json", "r") as f:
+        with open(_DB_DIR / "seeds/seed_sidedishes.json", "r") as f:
             side_dishes = sorted(json.load(f), key=lambda x: x["name"])
     except (json.JSONDecodeError, IOError) as e:
-        logger.error(f"Error loading seed files: {e}")
-        return
+        logger.error("Error loading seed files: {}", e)
+        return False
 
-    with get_connection() as conn:
-        logger.debug("Seeding meals...")
-        for meal in meals:
-            # Convert meal_type list to PostgreSQL array format
-            meal_types = "{" + ",".join(f'"{t}"' for t in meal["meal_types"]) + "}"
-            try:
-                conn.execute(
-                    """
-                    INSERT INTO meals 
-                    (name, meal_types, notes, frequency_factor, active_time, passive_time, has_side_dish) 
-                    VALUES (%s, %s, %s, %s, %s, %s, %s)
-                    """,
+    try:
+        with get_connection() as conn:
+            conn.execute(_LEDGER)
+            status, _ = _status(conn, [])
+            if not status.pending_seeds:
+                logger.info("Seed data is up to date")
+                return True
+
+            logger.info("Seeding database...")
+            conn.executemany(
+                """
+                INSERT INTO meals
+                (name, meal_types, notes, frequency_factor, active_time, passive_time, has_side_dish)
+                VALUES (%s, %s::meal_type[], %s, %s, %s, %s, %s)
+                ON CONFLICT (name) DO UPDATE SET
+                    meal_types = EXCLUDED.meal_types,
+                    notes = EXCLUDED.notes,
+                    frequency_factor = EXCLUDED.frequency_factor,
+                    active_time = EXCLUDED.active_time,
+                    passive_time = EXCLUDED.passive_time,
+                    has_side_dish = EXCLUDED.has_side_dish
+                -- An unchanged row keeps its updated_at and stays out of incremental backups
+                WHERE (meals.meal_types, meals.notes, meals.frequency_factor,
+                       meals.active_time, meals.passive_time, meals.has_side_dish)
+                    IS DISTINCT FROM
+                      (EXCLUDED.meal_types, EXCLUDED.notes, EXCLUDED.frequency_factor,
+                       EXCLUDED.active_time, EXCLUDED.passive_time, EXCLUDED.has_side_dish)
+                """,
+                [
                     (
                         meal["name"],
-                        meal_types,  # This will be properly cast to meal_type[] by psycopg
+                        meal["meal_types"],
                         meal["notes"],
                         meal["frequency_factor"],
                         meal["active_time"],
                         meal["passive_time"],
                         meal["has_side_dish"],
-                    ),
-                )
-            except Exception as e:
-                logger.error(f"Error seeding meal {meal.get('name')}: {e}")
-                raise
-
-        logger.debug("Seeding side dishes...")
-        for side_dish in side_dishes:
-            try:
-                conn.execute(
-                    """
-                    INSERT INTO side_dishes 
-                    (name, notes) 
-                    VALUES (%s, %s)
-                    """,
-                    (side_dish["name"], side_dish["notes"]),
-                )
-            except Exception as e:
-                logger.error(f"Error seeding side dish {side_dish.get('name')}: {e}")
-                return False
-
-        return True
+                    )
+                    for meal in meals
+                ],
+            )
+            conn.executemany(
+                """
+                INSERT INTO side_dishes (name, notes) VALUES (%s, %s)
+                ON CONFLICT (name) DO UPDATE SET notes = EXCLUDED.notes
+                WHERE side_dishes.notes IS DISTINCT FROM EXCLUDED.notes
+                """,
+                [(side_dish["name"], side_dish["notes"]) for side_dish in side_dishes],
+            )
+            _record(conn, {name: _checksum(_DB_DIR / name) for name in _SEED_FILES})
+            logger.info(
+                "Seeded {} meals and {} side dishes", len(meals), len(side_dishes)
+            )
+            return True
+    except Exception as e:
+        logger.error("Error seeding database: {}", e)
+        return False
 
 
 def initialize_database() -> bool:
-    """Initialize the database by running all SQL migration files in order.
+    """Initialize the database by running the SQL migration files not yet applied, in order.
 
     SQL files should be named with a numeric prefix (e.g., '001_initial_schema.sql').
-    After running migrations, the database will be seeded with initial data.
+    Each migration runs in its own transaction together with its ledger entry, so a
+    failed migration can be fixed and the install run again.
 
     Returns:
         bool: True if initialization was successful, False otherwise.
     """
     logger.info("Initializing database...")
 
-    # Get all SQL files and sort them by their numeric prefix
-    sql_dir = Path(__file__).parent / "migrations"
-    logger.debug(f"Looking for SQL files in: {sql_dir}")
-
-    sql_files = []
-    found_files = list(sql_dir.glob("*.sql"))
-    logger.debug(f"Found {len(found_files)} SQL files total")
-
-    if not found_files:
-        logger.error("No SQL files found")
-        return False
-
-    # First collect all SQL files with numeric prefixes
-    for sql_file in sql_dir.glob("*.sql"):
-        try:
-            # Extract the numeric prefix
-            prefix = int(sql_file.stem.split("_")[0])
-            sql_files.append((prefix, sql_file))
-            logger.debug(f"Added migration file: {sql_file.name} (prefix: {prefix})")
-        except (ValueError, IndexError):
-            # Skip files that don't start with a number
-            logger.warning(f"Skipping SQL file without numeric prefix: {sql_file}")
-            continue
-
-    # Sort by the numeric prefix
-    sql_files.sort(key=lambda x: x[0])
-
-    if sql_files:
-        logger.info(
-            f"Found {len(sql_files)} migration files to execute: {[f.name for _, f in sql_files]}"
-        )
-    else:
-        logger.error("No valid SQL files found")
+    migrations = migration_files()
+    if not migrations:
+        logger.error("No valid SQL files found in {}", _MIGRATIONS_DIR)
         return False
 
     try:
         with get_connection() as conn:
-            logger.info("Starting database migration execution")
-            executed_count = 0
-
-            for prefix, sql_file in sql_files:
-                logger.info(f"Executing migration {prefix}: {sql_file.name}")
-                try:
-                    with open(sql_file, "r") as f:
-                        sql_content = f.read()
-
-                    logger.debug(
-                        f"Executing SQL content from {sql_file.name} ({len(sql_content)} characters)"
-                    )
-                    conn.execute(sql_content)
-                    executed_count += 1
-                    logger.info(
-                        f"Successfully executed migration {prefix}: {sql_file.name}"
-                    )
+            status, adopt = _status(conn, migrations)
+            conn.execute(_LEDGER)
+            if adopt:
+                logger.info(
+                    "Recording {} files applied before the migration ledger existed",
+                    len(adopt),
+                )
+                _record(conn, adopt)
+    except Exception as e:
+        logger.error("Error reading the migration ledger: {}", e)
+        return False
 
-                except Exception as e:
-                    logger.error(
-                        f"Error executing migration {prefix} ({sql_file.name}): {e}"
-                    )
-                    logger.error(f"Migration failed at file: {sql_file}")
-                    return False
+    if not status.pending_migrations:
+        logger.info("Database schema is up to date")
+        return True
+    logger.info(
+        "Found {} migrations to apply: {}",
+        len(status.pending_migrations),
+        [m.name for m in status.pending_migrations],
+    )
 
-            # Only seed if all migrations were successful
-            logger.info(
-                f"Database initialization completed successfully - executed {executed_count} migrations"
-            )
-            return True
+    for migration in status.pending_migrations:
+        logger.info("Executing migration {}: {}", migration.version, migration.name)
+        try:
+            with get_connection() as conn:
+                conn.execute(migration.path.read_text())
+                _record(conn, {migration.name: migration.checksum})
+        except Exception as e:
+            logger.error("Error executing migration {}: {}", migration.name, e)
+            return False
 
-    except Exception as e:
-        logger.error(f"Unexpected error during database initialization: {e}")
-        logger.exception("Full traceback for database initialization error")
-        return False
+    logger.info(
+        "Database initialization completed successfully - executed {} migrations",
+        len(status.pending_migrations),
+    )
+    return True
@@ -1,16 +1,21 @@
-from db.setup import initialize_database, seed_database
-from lib.backup import create_backup
+from db.setup import initialize_database, schema_status, seed_database
+from lib.backup import create_incremental_backup
 from lib import logger
 
 
-def _backup_db(minimize: bool = False, gz: bool = True):
+def _backup_db(gz: bool = True):
     """Create a backup before installation."""
-    backup_path = create_backup(minimize=minimize, gz=gz)
-    logger.info(f"Database backed up to: {backup_path}")
+    backup_path = create_incremental_backup(gz=gz)
+    logger.info("Database backed up to: {}", backup_path)
 
 
 def install():
-    _backup_db()
+    status = schema_status()
+    if status.current:
+        logger.info("Database is up to date, nothing to install")
+        return
+    if status.installed:
+        _backup_db()
     logger.info("Installing database...")
     if not initialize_database():
         logger.error("Database initialization failed")
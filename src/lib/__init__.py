@@ -1,3 +1,3 @@
-from .logger import logger
+from .logger import logger, sampled, add_sink, remove_sinks
 
-__all__ = ["logger"]
+__all__ = ["logger", "sampled", "add_sink", "remove_sinks"]
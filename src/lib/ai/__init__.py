@@ -1,9 +1,31 @@
-from .ai import get_plan, get_ollama_model, get_openrouter_model, get_mistral_model
-from .prompts import get_system_prompt
+from .ai import (
+    get_plan_async,
+    get_plan_agent,
+    get_plan_prompt,
+    stream_plan,
+    get_ollama_model,
+    get_openrouter_model,
+    get_mistral_model,
+)
+from .registry import provider_registry
+from .router import plan_router
+from .plan_cache import plan_cache
+from .limits import provider_guard, CircuitOpenError
+from .prompts import get_system_prompt, build_system_prompt, PromptBudgetError
 
 __all__ = [
-    "get_plan",
+    "get_plan_async",
+    "get_plan_agent",
+    "get_plan_prompt",
+    "provider_registry",
+    "plan_router",
+    "plan_cache",
+    "provider_guard",
+    "CircuitOpenError",
+    "stream_plan",
     "get_system_prompt",
+    "build_system_prompt",
+    "PromptBudgetError",
     "get_ollama_model",
     "get_openrouter_model",
     "get_mistral_model",
@@ -1,106 +1,169 @@
 from fastapi import HTTPException
+from pydantic import ValidationError
 from pydantic_ai import Agent
-from pydantic_ai.models.openai import OpenAIModel
-from pydantic_ai.models.mistral import MistralModel
-from pydantic_ai.providers.openai import OpenAIProvider
-from pydantic_ai.providers.openrouter import OpenRouterProvider
-from pydantic_ai.providers.mistral import MistralProvider
+from pydantic_ai.messages import ModelResponse, ToolCallPart
 
-from dotenv import load_dotenv
-import os
+from pydantic_core import from_json
+from typing import AsyncIterator
 
-from models.plan import MealPlan
-from .prompts import system_prompt
-from routes.meals import get_meal_history, get_meals, get_side_dishes
+from models.meals import Meal, MealHistory, MealStats, SideDish
+from models.plan import MealPlan, MealPlanItem
+from lib.scoring import MealScorer
+from settings import settings
+from .prompts import get_system_prompt, PromptBudgetError
+from .registry import MISTRAL, OLLAMA, OPENROUTER, provider_registry
+from .router import plan_router, provider_http_error
+from .plan_cache import plan_cache, plan_cache_key
 
-load_dotenv()
 
+def _get_prompt(
+    meal_history: MealHistory,
+    all_foods: list[Meal],
+    side_dishes: list[SideDish],
+    scorer: MealScorer | None = None,
+    meal_stats: list[MealStats] | None = None,
+) -> str:
+    # Only the ranked shortlist goes to the model; older history is already reflected
+    # in the scores.
+    scorer = scorer or MealScorer(all_foods)
+    if meal_stats is None:
+        shortlist = scorer.shortlist(meal_history.history)
+    else:
+        shortlist = scorer.shortlist_stats(meal_stats)
+    candidates = [scored.meal for scored in shortlist]
+    return get_system_prompt(meal_history, candidates, side_dishes, days=7)
 
-def _get_prompt():
-    meal_history = get_meal_history()
-    all_foods = get_meals()
-    side_dishes = get_side_dishes()
-    return system_prompt(meal_history, all_foods, side_dishes, days=7)
 
+def get_ollama_model(name: str | None = None):
+    return provider_registry.model(OLLAMA, name)
 
-def get_ollama_model(
-    name: str = "hf.co/mradermacher/Qwen3-53B-A3B-TOTAL-RECALL-MASTER-CODER-v1.4-GGUF:latest",
-):
-    model = OpenAIModel(
-        model_name=name,
-        provider=OpenAIProvider(base_url="http://localhost:11434/v1"),
-    )
-    return model
-
-
-def get_openrouter_model(
-    name: str = "qwen/qwen3-235b-a22b-07-25:free",
-    api_key: str = os.getenv("OPENROUTER_API_KEY", ""),
-):
-    if not api_key:
-        raise HTTPException(status_code=400, detail="OpenRouter API key not found")
-    model = OpenAIModel(
-        model_name=name,
-        provider=OpenRouterProvider(api_key=api_key),
+
+def get_openrouter_model(name: str | None = None, api_key: str | None = None):
+    return provider_registry.model(OPENROUTER, name, api_key)
+
+
+def get_mistral_model(name: str | None = None, api_key: str | None = None):
+    return provider_registry.model(MISTRAL, name, api_key)
+
+
+def get_plan_prompt(
+    meal_history: MealHistory,
+    all_foods: list[Meal],
+    side_dishes: list[SideDish],
+    scorer: MealScorer | None = None,
+    meal_stats: list[MealStats] | None = None,
+) -> str:
+    """Build the planning system prompt for the given inputs.
+
+    Args:
+        scorer: Scorer over `all_foods`, e.g. the cached one of the catalog; built if not given.
+        meal_stats: `meal_stats` rows to rank the candidates from. `meal_history` then only
+            needs to cover the ban window; without them it is scored in full.
+
+    Raises:
+        HTTPException: If the prompt does not fit its token budget.
+    """
+    try:
+        return _get_prompt(meal_history, all_foods, side_dishes, scorer, meal_stats)
+    except PromptBudgetError as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+def get_plan_agent() -> Agent[str, MealPlan]:
+    """Return the shared plan agent of the preferred healthy provider.
+
+    The agent takes the system prompt from `get_plan_prompt` as its `deps`. Requests made
+    through `get_plan_async` are hedged across providers instead.
+
+    Raises:
+        HTTPException: If no provider is configured.
+    """
+    return provider_registry.plan_agent(*plan_router.best())
+
+
+async def get_plan_async(
+    meal_history: MealHistory,
+    all_foods: list[Meal],
+    side_dishes: list[SideDish],
+    refresh: bool = False,
+    scorer: MealScorer | None = None,
+    meal_stats: list[MealStats] | None = None,
+) -> MealPlan:
+    """Generate a plan with the AI providers without blocking the event loop.
+
+    Plans are cached by prompt and model (see `lib.ai.plan_cache`), and a miss is hedged
+    across the configured providers (see `lib.ai.router`).
+
+    Args:
+        refresh: Ignore a cached plan and generate a new one.
+        scorer: Scorer over `all_foods`, e.g. the cached one of the catalog.
+        meal_stats: `meal_stats` rows to rank the candidates from (see `get_plan_prompt`).
+
+    Raises:
+        HTTPException: If the prompt does not fit its budget or every provider fails.
+    """
+    system_prompt = get_plan_prompt(
+        meal_history, all_foods, side_dishes, scorer, meal_stats
     )
-    return model
-
-
-def get_mistral_model(
-    name: str = "moonshotai/kimi-k2:free",
-    api_key: str = os.getenv("MISTRAL_API_KEY", ""),
-):
-    if not api_key:
-        raise HTTPException(status_code=400, detail="Mistral API key not found")
-    model = MistralModel(
-        model_name=name,
-        provider=MistralProvider(api_key=api_key),
+    model = f"{settings.PLAN_PROVIDER}:{settings.PLAN_MODEL}"
+    return await plan_cache.get_or_generate(
+        plan_cache_key(system_prompt, model),
+        model,
+        lambda: plan_router.run(system_prompt),
+        bypass=refresh,
     )
-    return model
 
 
-def get_plan():
-    from rich import print
+def _partial_plan_items(message: ModelResponse) -> list:
+    """Raw plan items from a partially streamed output tool call."""
+    for part in message.parts:
+        if isinstance(part, ToolCallPart):
+            args = part.args
+            if isinstance(args, str):
+                try:
+                    args = from_json(args, allow_partial=True)
+                except ValueError:
+                    return []
+            plan = args.get("plan") if isinstance(args, dict) else None
+            return plan if isinstance(plan, list) else []
+    return []
 
-    print("Getting plan...")
-    model_name = "mistral-small-latest"
-    agent = Agent(
-        model=get_mistral_model(model_name),
-        system_prompt=_get_prompt(),
-        output_type=MealPlan,
-    )
+
+async def stream_plan(
+    agent: Agent[str, MealPlan], system_prompt: str, debounce_by: float | None = 0.1
+) -> AsyncIterator[MealPlanItem | MealPlan]:
+    """Stream a plan from the AI provider.
+
+    Yields each `MealPlanItem` as soon as the model has finished writing it, then the validated
+    `MealPlan`, which is authoritative if the model had to retry. Closing the iterator (e.g. when the client disconnects) closes the upstream
+    response, so an abandoned request stops generating tokens.
+
+    Args:
+        agent: Agent from `get_plan_agent`.
+        system_prompt: Prompt from `get_plan_prompt`.
+        debounce_by: Seconds to group streamed chunks by before re-validating the partial plan.
+
+    Raises:
+        HTTPException: If the provider fails.
+    """
+    emitted = 0
     try:
-        result = agent.run_sync("")
+        async with agent.run_stream("", deps=system_prompt) as result:
+            async for message, _ in result.stream_structured(debounce_by=debounce_by):
+                # The last item of a partial plan may still be growing.
+                for raw in _partial_plan_items(message)[emitted:-1]:
+                    try:
+                        item = MealPlanItem.model_validate(raw)
+                    except ValidationError:
+                        # Leave it to the final validation (and possible retry).
+                        break
+                    emitted += 1
+                    yield item
+            plan = await result.get_output()
     except Exception as e:
-        match e.status_code:
-            case 404:
-                raise HTTPException(
-                    status_code=404, detail=f"Model {model_name} not found"
-                )
-            case 401:
-                raise HTTPException(
-                    status_code=401,
-                    detail=f"Trying to use {model_name}, but got Unauthorized",
-                )
-            case 403:
-                raise HTTPException(
-                    status_code=403,
-                    detail=f"Trying to use {model_name}, but got Forbidden",
-                )
-            case 429:
-                raise HTTPException(
-                    status_code=429,
-                    detail=f"Trying to use {model_name}, but got Too many requests",
-                )
-            case 500:
-                raise HTTPException(
-                    status_code=500,
-                    detail=f"Trying to use {model_name}, but got Internal server error",
-                )
-            case _:
-                raise HTTPException(
-                    status_code=500,
-                    detail=f"Trying to use {model_name}, but got Unknown error",
-                )
-    print(result)
-    return result.output
+        name = getattr(agent.model, "model_name", settings.PLAN_MODEL)
+        raise provider_http_error(e, name) from e
+
+    for item in plan.plan[emitted:]:
+        yield item
+    yield plan
@@ -0,0 +1,331 @@
+"""Client-side rate limiting, retries and circuit breaking for AI provider calls.
+
+`provider_guard.call()` wraps one agent invocation. It waits for a token from the provider's and
+the API key's token buckets, so bursts of plan requests are spread out instead of rejected, and
+retries rate limited (429), server (5xx) and connection errors with bounded exponential backoff,
+honouring `Retry-After`. A circuit breaker per provider stops sending requests to a provider that
+keeps failing until `AI_BREAKER_RESET` seconds have passed.
+"""
+
+import asyncio
+import hashlib
+import random
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from time import monotonic
+from typing import Awaitable, Callable, TypeVar
+
+import httpx
+from fastapi import HTTPException
+
+from settings import settings
+from lib import logger
+
+T = TypeVar("T")
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(HTTPException):
+    """Raised instead of calling a provider whose circuit breaker is open."""
+
+    def __init__(self, provider: str, retry_in: float):
+        super().__init__(
+            status_code=503,
+            detail=f"{provider} is unavailable, retrying in {retry_in:.0f}s",
+        )
+
+
+class TokenBucket:
+    """Async token bucket; `rate_per_minute <= 0` disables the limit."""
+
+    def __init__(self, rate_per_minute: float, burst: int):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = max(burst, 1)
+        self._tokens = float(self.capacity)
+        self._updated = monotonic()
+        self._blocked_until = 0.0
+        self._lock = asyncio.Lock()
+        self.waits = 0
+        self.waited = 0.0
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(
+            self.capacity, self._tokens + (now - self._updated) * self.rate
+        )
+        self._updated = now
+
+    async def acquire(self) -> float:
+        """Wait for a token and take it; returns the seconds waited."""
+        if self.rate <= 0:
+            return 0.0
+        start = monotonic()
+        # Waiters queue on the lock, so tokens are handed out in arrival order.
+        async with self._lock:
+            while True:
+                now = monotonic()
+                self._refill(now)
+                delay = self._blocked_until - now
+                if delay <= 0:
+                    if self._tokens >= 1:
+                        self._tokens -= 1
+                        break
+                    delay = (1 - self._tokens) / self.rate
+                await asyncio.sleep(delay)
+        waited = monotonic() - start
+        if waited > 0.001:
+            self.waits += 1
+            self.waited += waited
+        return waited
+
+    def block_for(self, seconds: float) -> None:
+        """Hand out no tokens for `seconds`, e.g. after a `Retry-After` response."""
+        self._blocked_until = max(self._blocked_until, monotonic() + seconds)
+
+    def snapshot(self) -> dict:
+        now = monotonic()
+        if self.rate > 0:
+            self._refill(now)
+        return {
+            "rate_per_minute": round(self.rate * 60, 2),
+            "burst": self.capacity,
+            "tokens": round(self._tokens, 2),
+            "blocked_for": round(max(self._blocked_until - now, 0.0), 2),
+            "waits": self.waits,
+            "waited_seconds": round(self.waited, 3),
+        }
+
+
+class CircuitBreaker:
+    """Opens after consecutive failures and lets one trial call through after a cooldown."""
+
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self.failures = 0
+        self.opened = 0
+        self._opened_at = 0.0
+        self._trial = False
+
+    def retry_in(self) -> float:
+        """Seconds until an open breaker lets a trial call through."""
+        if self.state != OPEN:
+            return 0.0
+        return max(self._opened_at + self.reset_timeout - monotonic(), 0.0)
+
+    @property
+    def is_open(self) -> bool:
+        return self.state == OPEN and self.retry_in() > 0
+
+    def allow(self) -> bool:
+        """Whether a call may go through now."""
+        if self.state == OPEN and self.retry_in() <= 0:
+            self.state = HALF_OPEN
+            self._trial = False
+        if self.state == HALF_OPEN:
+            if self._trial:
+                return False
+            self._trial = True
+            return True
+        return self.state == CLOSED
+
+    def release_trial(self) -> None:
+        """Let another trial call through after one ended without an outcome, e.g. cancelled."""
+        if self.state == HALF_OPEN:
+            self._trial = False
+
+    def record_success(self) -> None:
+        self.state = CLOSED
+        self.failures = 0
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+            if self.state != OPEN:
+                self.opened += 1
+            self.state = OPEN
+            self._opened_at = monotonic()
+
+    def snapshot(self) -> dict:
+        return {
+            "state": OPEN if self.is_open else self.state,
+            "consecutive_failures": self.failures,
+            "opened": self.opened,
+            "retry_in": round(self.retry_in(), 2),
+        }
+
+
+def _status_code(e: BaseException) -> int | None:
+    status_code = getattr(e, "status_code", None)
+    return status_code if isinstance(status_code, int) else None
+
+
+def _causes(e: BaseException):
+    seen = set()
+    while e is not None and id(e) not in seen:
+        seen.add(id(e))
+        yield e
+        e = e.__cause__ or e.__context__
+
+
+def _is_transient(e: BaseException) -> bool:
+    """Rate limits, server errors and connection problems are worth retrying."""
+    status_code = _status_code(e)
+    if status_code is not None:
+        return status_code == 429 or status_code >= 500
+    return any(isinstance(cause, httpx.TransportError) for cause in _causes(e))
+
+
+def _retry_after(e: BaseException) -> float | None:
+    """Seconds from the `Retry-After` header of the response behind an error, if any."""
+    for cause in _causes(e):
+        response = getattr(cause, "response", None) or getattr(
+            cause, "raw_response", None
+        )
+        value = getattr(response, "headers", {}).get("retry-after")
+        if not value:
+            continue
+        try:
+            return max(float(value), 0.0)
+        except ValueError:
+            pass
+        try:
+            when = parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return None
+        return max((when - datetime.now(timezone.utc)).total_seconds(), 0.0)
+    return None
+
+
+def _key_id(api_key: str) -> str:
+    """Short fingerprint of an API key, safe to show in metrics."""
+    return hashlib.sha256(api_key.encode()).hexdigest()[:8]
+
+
+class ProviderGuard:
+    """Token buckets per provider and per API key, plus a circuit breaker per provider."""
+
+    def __init__(self):
+        self._provider_buckets: dict[str, TokenBucket] = {}
+        self._key_buckets: dict[str, TokenBucket] = {}
+        self._breakers: dict[str, CircuitBreaker] = {}
+        self.retries = 0
+
+    def _provider_bucket(self, provider: str) -> TokenBucket:
+        bucket = self._provider_buckets.get(provider)
+        if bucket is None:
+            bucket = self._provider_buckets[provider] = TokenBucket(
+                settings.AI_RATE_LIMIT_PER_MINUTE, settings.AI_RATE_LIMIT_BURST
+            )
+        return bucket
+
+    def _key_bucket(self, api_key: str) -> TokenBucket:
+        key_id = _key_id(api_key)
+        bucket = self._key_buckets.get(key_id)
+        if bucket is None:
+            bucket = self._key_buckets[key_id] = TokenBucket(
+                settings.AI_KEY_RATE_LIMIT_PER_MINUTE, settings.AI_RATE_LIMIT_BURST
+            )
+        return bucket
+
+    def breaker(self, provider: str) -> CircuitBreaker:
+        breaker = self._breakers.get(provider)
+        if breaker is None:
+            breaker = self._breakers[provider] = CircuitBreaker(
+                settings.AI_BREAKER_FAILURES, settings.AI_BREAKER_RESET
+            )
+        return breaker
+
+    async def call(
+        self,
+        provider: str,
+        api_key: str | None,
+        fn: Callable[[], Awaitable[T]],
+    ) -> T:
+        """Call `fn` for a provider within its rate limits, retrying transient errors.
+
+        Args:
+            provider: Provider name, used for its bucket and circuit breaker.
+            api_key: API key the call uses, if any; each key has its own bucket.
+            fn: Makes the call; invoked again on every retry.
+
+        Raises:
+            CircuitOpenError: If the provider's circuit breaker is open.
+            Exception: The last error from `fn` once it is not transient or the retries are used up.
+        """
+        breaker = self.breaker(provider)
+        buckets = [self._provider_bucket(provider)]
+        if api_key:
+            buckets.append(self._key_bucket(api_key))
+
+        attempt = 0
+        while True:
+            if not breaker.allow():
+                raise CircuitOpenError(provider, breaker.retry_in())
+            trial = breaker.state == HALF_OPEN
+            try:
+                for bucket in buckets:
+                    await bucket.acquire()
+                result = await fn()
+            except asyncio.CancelledError:
+                # A cancelled trial (a losing hedge, a timed out plan) says nothing about the
+                # provider; without this the breaker would stay half open with no trial left.
+                if trial:
+                    breaker.release_trial()
+                raise
+            except Exception as e:
+                transient = _is_transient(e)
+                if transient and _status_code(e) != 429:
+                    breaker.record_failure()
+                elif breaker.state != CLOSED:
+                    # A failed trial call must not leave the breaker half open.
+                    breaker.record_failure()
+                retry_after = _retry_after(e)
+                if retry_after is not None:
+                    for bucket in buckets:
+                        bucket.block_for(retry_after)
+                attempt += 1
+                if not transient or attempt >= settings.AI_RETRY_ATTEMPTS:
+                    raise
+                delay = retry_after
+                if delay is None:
+                    backoff = settings.AI_RETRY_BASE_DELAY * 2 ** (attempt - 1)
+                    delay = random.uniform(0, backoff)
+                if delay > settings.AI_RETRY_MAX_DELAY:
+                    raise
+                self.retries += 1
+                logger.info(
+                    "{} call failed ({}); retry {} in {:.2f}s",
+                    provider,
+                    e,
+                    attempt,
+                    delay,
+                )
+                await asyncio.sleep(delay)
+            else:
+                breaker.record_success()
+                return result
+
+    def stats(self) -> dict:
+        """Return bucket, breaker and retry state for the metrics endpoint."""
+        providers = set(self._provider_buckets) | set(self._breakers)
+        return {
+            "retries": self.retries,
+            "providers": {
+                provider: {
+                    "bucket": self._provider_bucket(provider).snapshot(),
+                    "breaker": self.breaker(provider).snapshot(),
+                }
+                for provider in sorted(providers)
+            },
+            "keys": {
+                key_id: bucket.snapshot()
+                for key_id, bucket in self._key_buckets.items()
+            },
+        }
+
+
+provider_guard = ProviderGuard()
@@ -0,0 +1,164 @@
+"""Content-addressed cache for AI generated plans.
+
+A plan is keyed by a hash of the normalized planning prompt, which already holds everything the
+plan depends on (date, shortlisted catalog, ban window and side dishes), plus the model name.
+Plans are kept in a small in-process LRU in front of the `plan_cache` table, so a frontend reload
+or another worker asking the same question does not pay for another LLM call. Concurrent misses
+for the same key share one upstream call. A plan answered by a fallback model is returned but not
+cached, since the key names the primary model.
+"""
+
+import asyncio
+import hashlib
+import re
+from collections import OrderedDict
+from time import monotonic
+from typing import Awaitable, Callable
+
+from models.plan import MealPlan
+from settings import settings
+from lib import logger
+from db.repositories.plan_cache import AsyncPlanCacheRepository
+
+
+def plan_cache_key(system_prompt: str, model: str) -> str:
+    """Hash of a prompt and model name; whitespace differences do not change the key."""
+    normalized = re.sub(r"\s+", " ", system_prompt).strip()
+    return hashlib.sha256(f"{model}\n{normalized}".encode("utf-8")).hexdigest()
+
+
+class PlanCache:
+    """In-memory LRU over the `plan_cache` table, with single-flight misses."""
+
+    def __init__(self, repository: AsyncPlanCacheRepository):
+        self._repository = repository
+        self._entries: OrderedDict[str, tuple[MealPlan, float]] = OrderedDict()
+        self._inflight: dict[str, asyncio.Task] = {}
+        # Generation of the newest load started for each key; older loads do not write.
+        self._generations: dict[str, int] = {}
+        self._generation = 0
+        self.memory_hits = 0
+        self.db_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.bypassed = 0
+
+    def _get_local(self, key: str) -> MealPlan | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        plan, expires = entry
+        if expires <= monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return plan
+
+    def _put_local(self, key: str, plan: MealPlan, ttl: float) -> None:
+        self._entries[key] = (plan, monotonic() + ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > settings.PLAN_CACHE_SIZE:
+            self._entries.popitem(last=False)
+
+    async def _load(
+        self,
+        key: str,
+        model: str,
+        generate: Callable[[], Awaitable[tuple[MealPlan, str]]],
+        bypass: bool,
+        generation: int,
+    ) -> MealPlan:
+        ttl = settings.PLAN_CACHE_TTL
+        if not bypass:
+            plan = await self._repository.get_plan(key)
+            if plan is not None:
+                self.db_hits += 1
+                if self._generations.get(key) == generation:
+                    self._put_local(key, plan, ttl)
+                return plan
+        self.misses += 1
+        plan, answered_by = await generate()
+        if answered_by != model:
+            logger.debug("Not caching plan {} answered by {}", key[:12], answered_by)
+        elif self._generations.get(key) != generation:
+            logger.debug("Not caching plan {} superseded by a refresh", key[:12])
+        else:
+            self._put_local(key, plan, ttl)
+            await self._repository.put_plan(key, answered_by, plan, ttl)
+        return plan
+
+    async def get_or_generate(
+        self,
+        key: str,
+        model: str,
+        generate: Callable[[], Awaitable[tuple[MealPlan, str]]],
+        bypass: bool = False,
+    ) -> MealPlan:
+        """Return the cached plan for a key, or generate and cache it.
+
+        The shared upstream call keeps running if every caller gives up (e.g. on the route's
+        timeout), so its plan is cached for the next request.
+
+        Args:
+            key: Key from `plan_cache_key`.
+            model: `provider:model` the key was built for.
+            generate: Produces the plan on a miss, with the `provider:model` that answered.
+            bypass: Skip cached plans and generate a fresh one, which then replaces the
+                cached plan.
+        """
+        if settings.PLAN_CACHE_TTL <= 0:
+            plan, _ = await generate()
+            return plan
+        if bypass:
+            self.bypassed += 1
+        else:
+            plan = self._get_local(key)
+            if plan is not None:
+                self.memory_hits += 1
+                return plan
+
+        task = self._inflight.get(key)
+        if task is None or bypass:
+            # A bypass never joins: the in-flight task may resolve to a cached plan. It takes
+            # the key over instead, so later requests share its fresh plan.
+            self._generation += 1
+            generation = self._generations[key] = self._generation
+            task = asyncio.create_task(
+                self._load(key, model, generate, bypass, generation)
+            )
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._finished(key, t, generation))
+        else:
+            self.coalesced += 1
+            logger.debug("Joining in-flight plan request {}", key[:12])
+        return await asyncio.shield(task)
+
+    def _finished(self, key: str, task: asyncio.Task, generation: int) -> None:
+        if self._generations.get(key) == generation:
+            del self._generations[key]
+            del self._inflight[key]
+        if not task.cancelled():
+            # Callers see the error; this only marks it retrieved if they all left.
+            task.exception()
+
+    def clear(self) -> None:
+        """Forget the in-memory entries; the table is left alone."""
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        """Return hit/miss counters for the metrics endpoint."""
+        lookups = self.memory_hits + self.db_hits + self.misses
+        hits = self.memory_hits + self.db_hits
+        return {
+            "memory_hits": self.memory_hits,
+            "db_hits": self.db_hits,
+            "misses": self.misses,
+            "hit_ratio": round(hits / lookups, 4) if lookups else 0.0,
+            "coalesced": self.coalesced,
+            "bypassed": self.bypassed,
+            "in_flight": len(self._inflight),
+            "cached": len(self._entries),
+        }
+
+
+plan_cache = PlanCache(AsyncPlanCacheRepository())
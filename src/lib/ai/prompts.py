@@ -1,27 +1,105 @@
-from datetime import date
-from models.meals import MealHistory, Meal, SideDish
+from datetime import date, timedelta
 
+from models.meals import MealHistory, Meal, MealType, SideDish
+from models.plan import PlanPrompt
+from settings import settings
+from lib import logger
 
-def get_system_prompt(
+
+class PromptBudgetError(ValueError):
+    """Raised when a usable prompt cannot be built within the token budget."""
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimate the token count of a text (about four UTF-8 bytes per token)."""
+    return (len(text.encode("utf-8")) + 3) // 4
+
+
+def _meal_line(meal: Meal, notes: bool = True) -> str:
+    types = ",".join(MealType(t).value for t in meal.meal_types)
+    parts = [meal.name, types, "side" if meal.has_side_dish else "no side"]
+    if notes and meal.notes:
+        parts.append(meal.notes.strip())
+    return "- " + " | ".join(parts)
+
+
+def _banned_names(meal_history: MealHistory, ban_days: int, today: date) -> list[str]:
+    cutoff = today - timedelta(days=ban_days)
+    recent = sorted(
+        (item for item in meal_history.history if item.date_eaten > cutoff),
+        key=lambda item: item.date_eaten,
+        reverse=True,
+    )
+    return list(dict.fromkeys(item.meal for item in recent))
+
+
+def _priority_order(meals: list[Meal]) -> list[int]:
+    """Indexes of `meals` with the best meal of every category first, then by rank."""
+    first: list[int] = []
+    for category in MealType:
+        for i, meal in enumerate(meals):
+            if category in {MealType(t) for t in meal.meal_types}:
+                if i not in first:
+                    first.append(i)
+                break
+    return first + [i for i in range(len(meals)) if i not in first]
+
+
+def build_system_prompt(
     meal_history: MealHistory,
     all_foods: list[Meal],
     side_dishes: list[SideDish],
     days: int = 7,
-) -> str:
-    return f"""
-**Role**: You are an intelligent meal planning assistant. Your task is to generate a {days}-day dinner plan based on the user's meal history.
+    token_budget: int | None = None,
+    ban_days: int | None = None,
+    today: date | None = None,
+) -> PlanPrompt:
+    """Build the planning system prompt within a token budget.
 
-**Current Date Reference:** {date.today().isoformat()}
+    Only meals eaten inside the ban window are banned, and the catalog is encoded as one compact
+    line per meal. `all_foods` is expected in rank order; when the prompt does not fit, meal notes
+    are dropped first and then the lowest-ranked meals, always keeping at least `days` meals and
+    one meal of every category.
 
-**Banned Meals**:
-{"\n".join([meal.meal for meal in meal_history.history])}
+    Args:
+        meal_history: Meal history; only entries inside the ban window are used.
+        all_foods: Candidate meals, best first.
+        side_dishes: Available side dishes.
+        days: Number of days to plan.
+        token_budget: Maximum estimated tokens, defaults to `settings.PLAN_PROMPT_TOKEN_BUDGET`.
+        ban_days: Length of the ban window, defaults to `settings.PLAN_BAN_DAYS`.
+        today: Reference date, defaults to today.
 
-**Available Foods**:
-{"\n".join([food.model_dump_json() for food in all_foods])}
+    Returns:
+        PlanPrompt: The prompt text with per-section token estimates.
 
-**Available Side Dishes**:
-{"\n".join([side_dish.model_dump_json() for side_dish in side_dishes])}
+    Raises:
+        PromptBudgetError: If the prompt cannot fit the budget even after degrading.
+    """
+    token_budget = token_budget or settings.PLAN_PROMPT_TOKEN_BUDGET
+    ban_days = settings.PLAN_BAN_DAYS if ban_days is None else ban_days
+    today = today or date.today()
+
+    meals = list({meal.name: meal for meal in all_foods}.values())
+    banned = _banned_names(meal_history, ban_days, today)
+    sides = sorted({side_dish.name for side_dish in side_dishes})
 
+    sections = {
+        "header": f"""
+**Role**: You are an intelligent meal planning assistant. Your task is to generate a {days}-day dinner plan based on the user's meal history.
+
+**Current Date Reference:** {today.isoformat()}
+""",
+        "banned": f"""
+**Banned Meals** (eaten in the last {ban_days} days):
+{"\n".join(banned) if banned else "(none)"}
+""",
+        "meals": "",
+        "side_dishes": f"""
+**Available Side Dishes**:
+{", ".join(sides) if sides else "(none)"}
+""",
+        "rules": """
 **Core Selection Rules:**
 
 1. RECENCY FILTER (STRICT):
@@ -30,17 +108,82 @@ def get_system_prompt(
 2. CATEGORY REQUIREMENTS:
    - Must include minimum:
      • 1 chicken
-     • 1 meat 
+     • 1 meat
      • 1 fish
      • 1 vegetable
    - Multi-type foods count for all their categories
 
 3. SIDE DISH LOGIC:
-   - ONLY consider sides when 'has_side_dish: true'
+   - ONLY consider sides for foods marked 'side'
    - When enabled: Select exactly one from valid sides
    - When disabled: No side dish reference whatsoever
 
 **Absolute Prohibitions:**
 ✗ No meal or side dish invention (strict list only)
 ✗ No category omissions
-✗ No modification of selection rules"""
+✗ No modification of selection rules""",
+    }
+    meals_heading = "\n**Available Foods** (name | categories | side | notes):\n"
+
+    fixed_tokens = sum(estimate_tokens(text) for text in sections.values())
+    available = token_budget - fixed_tokens - estimate_tokens(meals_heading)
+    if available < 0:
+        raise PromptBudgetError(
+            f"Prompt needs more than {token_budget} tokens before listing any meals "
+            f"({fixed_tokens} tokens of instructions, bans and side dishes)"
+        )
+    minimum = min(days, len(meals))
+
+    notes_dropped = False
+    lines = [_meal_line(meal) for meal in meals]
+    if estimate_tokens("\n".join(lines)) > available:
+        notes_dropped = True
+        lines = [_meal_line(meal, notes=False) for meal in meals]
+
+    keep: list[int] = []
+    used = 0
+    for i in _priority_order(meals):
+        cost = estimate_tokens(lines[i] + "\n")
+        if used + cost > available:
+            if len(keep) >= minimum:
+                break
+            raise PromptBudgetError(
+                f"Prompt needs more than {token_budget} tokens: {fixed_tokens} fixed, "
+                f"and only {len(keep)} of the minimum {minimum} meals fit"
+            )
+        keep.append(i)
+        used += cost
+    keep.sort()
+
+    sections["meals"] = meals_heading + "\n".join(lines[i] for i in keep) + "\n"
+    section_tokens = {name: estimate_tokens(text) for name, text in sections.items()}
+    text = "".join(sections[name] for name in sections)
+
+    prompt = PlanPrompt(
+        text=text,
+        section_tokens=section_tokens,
+        total_tokens=sum(section_tokens.values()),
+        token_budget=token_budget,
+        dropped_meals=len(meals) - len(keep),
+        notes_dropped=notes_dropped,
+    )
+    logger.debug(
+        "Built plan prompt: {}/{} tokens {}, dropped {} meals",
+        prompt.total_tokens,
+        token_budget,
+        section_tokens,
+        prompt.dropped_meals,
+    )
+    return prompt
+
+
+def get_system_prompt(
+    meal_history: MealHistory,
+    all_foods: list[Meal],
+    side_dishes: list[SideDish],
+    days: int = 7,
+    token_budget: int | None = None,
+) -> str:
+    return build_system_prompt(
+        meal_history, all_foods, side_dishes, days=days, token_budget=token_budget
+    ).text
@@ -0,0 +1,190 @@
+"""Registry of long-lived AI provider clients, models and agents.
+
+Building a pydantic-ai model creates a provider and, unless one is passed in, a new HTTP client
+with its own TLS sessions. The registry keeps one connection-pooled `httpx.AsyncClient` per
+provider and caches models and plan agents, so plan requests reuse warm connections. It is opened
+and closed in the FastAPI lifespan. The SDK clients are built with their own retries turned off,
+so every upstream request goes through `ProviderGuard`'s retries, token bucket and breaker.
+"""
+
+import httpx
+from fastapi import HTTPException
+from mistralai import Mistral
+from openai import AsyncOpenAI
+from pydantic_ai import Agent, RunContext
+from pydantic_ai.models import Model
+from pydantic_ai.models.mistral import MistralModel
+from pydantic_ai.models.openai import OpenAIModel
+from pydantic_ai.providers.mistral import MistralProvider
+from pydantic_ai.providers.openai import OpenAIProvider
+from pydantic_ai.providers.openrouter import OpenRouterProvider
+
+from models.plan import MealPlan
+from settings import settings
+from lib import logger
+
+MISTRAL = "mistral"
+OPENROUTER = "openrouter"
+OLLAMA = "ollama"
+
+DEFAULT_MODELS = {
+    MISTRAL: "mistral-small-latest",
+    OPENROUTER: "qwen/qwen3-235b-a22b-07-25:free",
+    OLLAMA: "hf.co/mradermacher/Qwen3-53B-A3B-TOTAL-RECALL-MASTER-CODER-v1.4-GGUF:latest",
+}
+OPENROUTER_BASE_URL = "https://openrouter.ai/api/v1"
+
+
+class ProviderRegistry:
+    """Caches one HTTP client per provider and one model/agent per provider and model name."""
+
+    def __init__(self):
+        self._clients: dict[str, httpx.AsyncClient] = {}
+        self._models: dict[tuple[str, str, str | None], Model] = {}
+        self._agents: dict[tuple[str, str], Agent[str, MealPlan]] = {}
+
+    def client(self, provider: str) -> httpx.AsyncClient:
+        """Return the shared HTTP client for a provider, creating it if needed."""
+        client = self._clients.get(provider)
+        if client is None or client.is_closed:
+            client = httpx.AsyncClient(
+                timeout=httpx.Timeout(settings.AI_HTTP_TIMEOUT, connect=10.0),
+                limits=httpx.Limits(
+                    max_connections=settings.AI_HTTP_MAX_CONNECTIONS,
+                    max_keepalive_connections=settings.AI_HTTP_MAX_CONNECTIONS,
+                    keepalive_expiry=settings.AI_HTTP_KEEPALIVE_EXPIRY,
+                ),
+            )
+            self._clients[provider] = client
+        return client
+
+    def _openai_client(
+        self, provider: str, base_url: str, api_key: str | None
+    ) -> AsyncOpenAI:
+        """An OpenAI SDK client on the provider's shared HTTP client, without SDK retries."""
+        return AsyncOpenAI(
+            base_url=base_url,
+            # Ollama needs no key, but the SDK requires one.
+            api_key=api_key or "api-key-not-set",
+            http_client=self.client(provider),
+            max_retries=0,
+        )
+
+    def api_key(self, provider: str) -> str | None:
+        """Return the configured API key of a provider, or None if it needs none."""
+        match provider:
+            case "mistral":
+                return settings.MISTRAL_API_KEY
+            case "openrouter":
+                return settings.OPENROUTER_API_KEY
+            case _:
+                return None
+
+    def model(
+        self, provider: str, name: str | None = None, api_key: str | None = None
+    ) -> Model:
+        """Return a cached model for a provider.
+
+        Args:
+            provider: One of `mistral`, `openrouter` or `ollama`.
+            name: Model name, defaults to the provider's entry in `DEFAULT_MODELS`.
+            api_key: API key, defaults to the provider's key in `settings`.
+
+        Raises:
+            HTTPException: If the provider needs an API key and none is configured.
+            ValueError: If the provider is unknown.
+        """
+        name = name or DEFAULT_MODELS.get(provider)
+        key = (provider, name, api_key)
+        if key in self._models:
+            return self._models[key]
+
+        match provider:
+            case "mistral":
+                api_key = api_key or self.api_key(provider)
+                if not api_key:
+                    raise HTTPException(
+                        status_code=400, detail="Mistral API key not found"
+                    )
+                model = MistralModel(
+                    model_name=name,
+                    provider=MistralProvider(
+                        mistral_client=Mistral(
+                            api_key=api_key,
+                            async_client=self.client(provider),
+                            retry_config=None,
+                        )
+                    ),
+                )
+            case "openrouter":
+                api_key = api_key or self.api_key(provider)
+                if not api_key:
+                    raise HTTPException(
+                        status_code=400, detail="OpenRouter API key not found"
+                    )
+                model = OpenAIModel(
+                    model_name=name,
+                    provider=OpenRouterProvider(
+                        openai_client=self._openai_client(
+                            provider, OPENROUTER_BASE_URL, api_key
+                        )
+                    ),
+                )
+            case "ollama":
+                model = OpenAIModel(
+                    model_name=name,
+                    provider=OpenAIProvider(
+                        openai_client=self._openai_client(
+                            provider, f"{settings.ollama_url}/v1", None
+                        )
+                    ),
+                )
+            case _:
+                raise ValueError(f"Unknown AI provider: {provider}")
+
+        self._models[key] = model
+        return model
+
+    def plan_agent(
+        self, provider: str, name: str | None = None
+    ) -> Agent[str, MealPlan]:
+        """Return a cached plan agent; the system prompt is passed per run as `deps`."""
+        name = name or DEFAULT_MODELS.get(provider)
+        key = (provider, name)
+        agent = self._agents.get(key)
+        if agent is None:
+            agent = Agent(
+                model=self.model(provider, name),
+                deps_type=str,
+                output_type=MealPlan,
+            )
+
+            @agent.system_prompt
+            def _system_prompt(ctx: RunContext[str]) -> str:
+                return ctx.deps
+
+            self._agents[key] = agent
+        return agent
+
+    def open(self) -> None:
+        """Create the HTTP client of every configured provider up front."""
+        providers = [OLLAMA]
+        if settings.MISTRAL_API_KEY:
+            providers.append(MISTRAL)
+        if settings.OPENROUTER_API_KEY:
+            providers.append(OPENROUTER)
+        for provider in providers:
+            self.client(provider)
+        logger.info("AI provider registry opened: {}", ", ".join(providers))
+
+    async def aclose(self) -> None:
+        """Close all HTTP clients and forget cached models and agents."""
+        for client in self._clients.values():
+            await client.aclose()
+        self._clients.clear()
+        self._models.clear()
+        self._agents.clear()
+        logger.info("AI provider registry closed")
+
+
+provider_registry = ProviderRegistry()
@@ -0,0 +1,274 @@
+"""Hedged plan requests across AI providers.
+
+`PlanRouter` sends a plan request to the preferred healthy provider. If it has not answered
+within that provider's p95 latency, a hedged request goes to the next provider and the first
+valid `MealPlan` wins; the other request is cancelled. A provider that fails is failed over to
+immediately. Latencies and outcomes are kept in a rolling window per provider and model.
+"""
+
+import asyncio
+from collections import deque
+from time import perf_counter
+
+from fastapi import HTTPException
+
+from models.plan import MealPlan
+from settings import settings
+from lib import logger
+from .limits import ProviderGuard, provider_guard
+from .registry import DEFAULT_MODELS, ProviderRegistry, provider_registry
+
+# Outcomes kept per provider for the latency and error rate statistics.
+WINDOW_SIZE = 50
+# Below this many successful calls the p95 is not trusted and PLAN_HEDGE_DELAY is used.
+MIN_LATENCY_SAMPLES = 5
+# Providers failing more often than this are tried after the healthy ones.
+UNHEALTHY_ERROR_RATE = 0.5
+
+
+def provider_http_error(e: Exception, model_name: str) -> HTTPException:
+    """Map an error raised by the model provider to an HTTPException."""
+    match getattr(e, "status_code", None):
+        case 404:
+            return HTTPException(
+                status_code=404, detail=f"Model {model_name} not found"
+            )
+        case 401:
+            return HTTPException(
+                status_code=401,
+                detail=f"Trying to use {model_name}, but got Unauthorized",
+            )
+        case 403:
+            return HTTPException(
+                status_code=403,
+                detail=f"Trying to use {model_name}, but got Forbidden",
+            )
+        case 429:
+            return HTTPException(
+                status_code=429,
+                detail=f"Trying to use {model_name}, but got Too many requests",
+            )
+        case 500:
+            return HTTPException(
+                status_code=500,
+                detail=f"Trying to use {model_name}, but got Internal server error",
+            )
+        case _:
+            return HTTPException(
+                status_code=500,
+                detail=f"Trying to use {model_name}, but got Unknown error",
+            )
+
+
+class ProviderStats:
+    """Rolling latency and error statistics of one provider and model."""
+
+    def __init__(self, size: int = WINDOW_SIZE):
+        self._latencies: deque[float] = deque(maxlen=size)
+        self._outcomes: deque[bool] = deque(maxlen=size)
+        self.requests = 0
+        self.failures = 0
+        self.hedges = 0
+        self.wins = 0
+
+    def record_success(self, latency: float) -> None:
+        self.requests += 1
+        self._latencies.append(latency)
+        self._outcomes.append(True)
+
+    def record_failure(self) -> None:
+        self.requests += 1
+        self.failures += 1
+        self._outcomes.append(False)
+
+    def percentile(self, q: float) -> float | None:
+        """Latency percentile in seconds, or None without enough samples."""
+        if len(self._latencies) < MIN_LATENCY_SAMPLES:
+            return None
+        latencies = sorted(self._latencies)
+        return latencies[min(int(q * len(latencies)), len(latencies) - 1)]
+
+    @property
+    def error_rate(self) -> float:
+        if not self._outcomes:
+            return 0.0
+        return self._outcomes.count(False) / len(self._outcomes)
+
+    def hedge_delay(self) -> float:
+        """Seconds to wait for this provider before sending a hedged request."""
+        p95 = self.percentile(0.95)
+        return settings.PLAN_HEDGE_DELAY if p95 is None else p95
+
+    def snapshot(self) -> dict:
+        p50, p95 = self.percentile(0.5), self.percentile(0.95)
+        return {
+            "requests": self.requests,
+            "failures": self.failures,
+            "error_rate": round(self.error_rate, 4),
+            "p50_ms": None if p50 is None else round(p50 * 1000, 1),
+            "p95_ms": None if p95 is None else round(p95 * 1000, 1),
+            "hedges": self.hedges,
+            "wins": self.wins,
+        }
+
+
+def _parse_providers(spec: str) -> list[tuple[str, str]]:
+    """Parse `provider[:model],...`; model names may contain colons themselves."""
+    providers = []
+    for entry in spec.split(","):
+        provider, _, name = entry.strip().partition(":")
+        if provider:
+            providers.append((provider, name or DEFAULT_MODELS.get(provider)))
+    return providers
+
+
+class PlanRouter:
+    """Routes plan requests to the configured providers with hedging and failover."""
+
+    def __init__(self, registry: ProviderRegistry, guard: ProviderGuard):
+        self._registry = registry
+        self._guard = guard
+        self._stats: dict[tuple[str, str], ProviderStats] = {}
+
+    def _stats_for(self, key: tuple[str, str]) -> ProviderStats:
+        stats = self._stats.get(key)
+        if stats is None:
+            stats = self._stats[key] = ProviderStats()
+        return stats
+
+    def candidates(self) -> list[tuple[str, str]]:
+        """Configured (provider, model) pairs in the order they should be tried.
+
+        `PLAN_PROVIDER` comes first, then `PLAN_FALLBACK_PROVIDERS`, skipping providers without
+        an API key. Providers with an open circuit breaker go last, unhealthy ones just before.
+        """
+        configured = [(settings.PLAN_PROVIDER, settings.PLAN_MODEL)]
+        configured += _parse_providers(settings.PLAN_FALLBACK_PROVIDERS)
+        usable = [
+            key
+            for key in dict.fromkeys(configured)
+            if self._registry.api_key(key[0]) != ""
+        ]
+        return sorted(
+            usable,
+            key=lambda key: (
+                self._guard.breaker(key[0]).is_open,
+                self._stats_for(key).error_rate > UNHEALTHY_ERROR_RATE,
+            ),
+        )
+
+    def best(self) -> tuple[str, str]:
+        """The provider and model a single, unhedged request should go to.
+
+        Raises:
+            HTTPException: If no provider is configured.
+        """
+        candidates = self.candidates()
+        if not candidates:
+            raise HTTPException(status_code=503, detail="No AI provider configured")
+        return candidates[0]
+
+    async def _attempt(self, key: tuple[str, str], system_prompt: str) -> MealPlan:
+        provider, name = key
+        stats = self._stats_for(key)
+        start = perf_counter()
+        try:
+            agent = self._registry.plan_agent(provider, name)
+            result = await self._guard.call(
+                provider,
+                self._registry.api_key(provider),
+                lambda: agent.run("", deps=system_prompt),
+            )
+        except asyncio.CancelledError:
+            raise
+        except HTTPException:
+            stats.record_failure()
+            raise
+        except Exception as e:
+            stats.record_failure()
+            raise provider_http_error(e, name) from e
+        stats.record_success(perf_counter() - start)
+        return result.output
+
+    async def run(self, system_prompt: str) -> tuple[MealPlan, str]:
+        """Get a plan from the first provider to answer with a valid `MealPlan`.
+
+        Args:
+            system_prompt: Prompt from `get_plan_prompt`.
+
+        Returns:
+            tuple: The plan and the `provider:model` that answered it.
+
+        Raises:
+            HTTPException: If no provider is configured or all of them failed. With a single
+                provider its own error is raised, otherwise a 502 listing every failure.
+        """
+        candidates = self.candidates()
+        if not candidates:
+            raise HTTPException(status_code=503, detail="No AI provider configured")
+
+        pending: dict[asyncio.Task, tuple[tuple[str, str], float]] = {}
+        errors: list[tuple[tuple[str, str], HTTPException]] = []
+        queue = iter(candidates)
+
+        def launch(hedge: bool) -> bool:
+            key = next(queue, None)
+            if key is None:
+                return False
+            if hedge:
+                self._stats_for(key).hedges += 1
+                logger.info("Hedging plan request to {} ({})", key[0], key[1])
+            task = asyncio.create_task(self._attempt(key, system_prompt))
+            pending[task] = (key, perf_counter())
+            return True
+
+        launch(hedge=False)
+        can_hedge = True
+        try:
+            while pending:
+                timeout = None
+                if can_hedge and len(pending) == 1:
+                    key, started = next(iter(pending.values()))
+                    delay = self._stats_for(key).hedge_delay()
+                    timeout = max(delay - (perf_counter() - started), 0.0)
+                done, _ = await asyncio.wait(
+                    pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED
+                )
+                if not done:
+                    can_hedge = launch(hedge=True)
+                    continue
+                for task in done:
+                    key, _ = pending.pop(task)
+                    try:
+                        plan = task.result()
+                    except HTTPException as e:
+                        logger.warning(
+                            "Plan request to {} failed: {}", key[0], e.detail
+                        )
+                        errors.append((key, e))
+                        continue
+                    self._stats_for(key).wins += 1
+                    return plan, f"{key[0]}:{key[1]}"
+                if not pending:
+                    launch(hedge=False)
+        finally:
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+
+        if len(errors) == 1:
+            raise errors[0][1]
+        detail = "; ".join(f"{key[0]}: {e.detail}" for key, e in errors)
+        raise HTTPException(
+            status_code=502, detail=f"All AI providers failed: {detail}"
+        )
+
+    def stats(self) -> dict:
+        """Return the rolling statistics of every provider that has been used."""
+        return {
+            f"{provider}:{name}": stats.snapshot()
+            for (provider, name), stats in self._stats.items()
+        }
+
+
+plan_router = PlanRouter(provider_registry, provider_guard)
@@ -1,110 +1,846 @@
-"""Backup and restore utilities for the meal planner application."""
+"""Backup and restore utilities for the meal planner application.
 
+A backup is one NDJSON stream, gzipped by default:
+
+    {"backup": {"format": "meal-planner-backup", "version": 2, "kind": "full", ...}}
+    {"section": "meals"}
+    {"id": 1, "name": "...", ...}       one line per row, as produced by `row_to_json`
+    ...
+    {"manifest": {..., "tables": {"meals": {"rows": ..., "sha256": ...}, ...}}}
+
+Tables are read in id ordered batches within one repeatable read transaction and written batch by
+batch through an incremental compressor, so memory use does not depend on the size of the tables.
+The manifest is also written next to the backup file as `<name>.manifest.json`.
+
+Backups are incremental: a delta (`"kind": "delta"`) holds only the rows changed since its
+`parent`, found from the watermarks the parent's manifest recorded. A delta and the backups it
+builds on form a chain that `iter_chain` replays into one full backup stream, and
+`compact_backups` periodically merges the newest chain into a new full backup so chains stay
+short and old ones can be removed. Restoring or truncating the tables starts a new restore
+epoch, recorded in every manifest, and the first backup of an epoch is always a full one.
+
+`restore_backup` reads a full backup stream back incrementally and replaces the tables in one
+transaction; `restore_backup_chain` restores a stored backup of either kind.
+"""
+
+import asyncio
 import gzip
+import hashlib
 import json
-from datetime import datetime
+import zlib
+from contextlib import nullcontext
+from datetime import datetime, timedelta
 from pathlib import Path
+from typing import (
+    AsyncIterable,
+    AsyncIterator,
+    BinaryIO,
+    Iterable,
+    Iterator,
+    NamedTuple,
+)
 from zoneinfo import ZoneInfo
 
-from db.repositories.meal import MealRepository
-from db.repositories.side_dish import SideDishRepository
-from db.repositories.meal_history import MealHistoryRepository
+import psycopg
+from psycopg import sql
+
+from db.core.connection import get_async_connection, get_connection
+from models.backup import BackupKind, BackupManifest, BackupTable
 from lib.logger import logger
 from settings import settings
 
+BACKUP_FORMAT = "meal-planner-backup"
+BACKUP_VERSION = 2
+# Referenced tables first, which is also the order a restore loads them in.
+BACKUP_TABLES = ("meals", "side_dishes", "meal_history")
 
-def _write_backup_file(
-    backup_file: Path, backup_data: dict, minimize: bool = False, gz: bool = True
-) -> None:
-    try:
-        with gzip.open(backup_file, "wb") if gz else open(backup_file, "w") as f:
-            content = json.dumps(
-                backup_data,
-                indent=2 if not minimize else None,
-                ensure_ascii=False,
-                default=str,
+_COMPRESS_LEVEL = 6
+# Rows collected before each `COPY` into a staging table during a restore.
+_RESTORE_COPY_ROWS = 10_000
+# Foreign keys between the backed up tables, checked once after a restore.
+_REFERENCES = (
+    ("meal_history", "meal_id", "meals"),
+    ("meal_history", "side_dish_id", "side_dishes"),
+)
+_CONTROL_PREFIXES = (b'{"backup":', b'{"section":', b'{"manifest":')
+# Column whose highest value a backup records as the starting point of the next delta.
+_WATERMARKS = {"meals": "updated_at", "side_dishes": "updated_at", "meal_history": "id"}
+# Tables whose rows are only added, so a delta holds the rows past the watermark id. The
+# others are small catalogs whose deltas hold the updated rows and the ids still present.
+_APPEND_ONLY = ("meal_history",)
+_BUMP_RESTORE_EPOCH = "UPDATE backup_state SET restore_epoch = restore_epoch + 1"
+
+
+class _HashingWriter:
+    """Binary file wrapper that hashes everything written through it."""
+
+    def __init__(self, f: BinaryIO):
+        self._f = f
+        self.sha256 = hashlib.sha256()
+
+    def write(self, data: bytes) -> int:
+        self.sha256.update(data)
+        return self._f.write(data)
+
+    def flush(self) -> None:
+        self._f.flush()
+
+
+def _control_line(key: str, value) -> bytes:
+    return json.dumps({key: value}, ensure_ascii=False).encode("utf-8") + b"\n"
+
+
+class _Chunk(NamedTuple):
+    rows: int
+    data: bytes
+
+
+class _FullBackupNeeded(Exception):
+    """The changes since the previous backup cannot be expressed as a delta."""
+
+
+def _table_chunks(
+    conn, table: str, where: sql.Composable = sql.SQL("TRUE"), params: tuple = ()
+) -> Iterator[_Chunk]:
+    """NDJSON of a table's rows in id order, `BACKUP_BATCH_SIZE` rows per chunk.
+
+    The server renders each chunk with `row_to_json`, so there is one round trip per chunk
+    rather than per row, and a chunk is the only part of the table held in memory.
+    """
+    query = sql.SQL(
+        "SELECT count(*) AS rows, max(id) AS last_id, "
+        "string_agg(row_to_json(t)::text || E'\\n', '' ORDER BY id) AS data "
+        "FROM (SELECT * FROM {table} WHERE id > %s AND ({where}) ORDER BY id LIMIT %s) t"
+    ).format(table=sql.Identifier(table), where=where)
+    last_id = 0
+    while True:
+        conn.execute(query, (last_id, *params, settings.BACKUP_BATCH_SIZE))
+        row = conn.fetchone()
+        if not row["rows"]:
+            return
+        last_id = row["last_id"]
+        yield _Chunk(row["rows"], row["data"].encode("utf-8"))
+
+
+def _delta_filter(table: str, previous: BackupTable) -> tuple[sql.Composable, tuple]:
+    """Rows of a table that changed since the backup `previous` describes."""
+    if table in _APPEND_ONLY:
+        return sql.SQL("id > %s"), (previous.watermark or 0,)
+    since = previous.watermark
+    if since is not None:
+        # A transaction that started before the previous backup can commit an older
+        # updated_at after it; rows sent twice are simply replaced again on restore.
+        since -= timedelta(seconds=settings.BACKUP_DELTA_OVERLAP)
+    return sql.SQL("(updated_at > %s OR NOT id = ANY(%s))"), (since, previous.ids or [])
+
+
+def _restore_epoch(conn) -> int:
+    """Restores of the database so far, 0 before the migration that counts them has run.
+
+    Installing backs up the database before migrating it, so the table may not exist yet.
+    """
+    conn.execute("SELECT to_regclass('backup_state') IS NOT NULL AS exists")
+    if not conn.fetchone()["exists"]:
+        return 0
+    conn.execute("SELECT restore_epoch FROM backup_state")
+    return conn.fetchone()["restore_epoch"]
+
+
+def manifest_path(backup_file: Path) -> Path:
+    """Path of the manifest written next to a backup file."""
+    name = backup_file.name.removesuffix(".gz").removesuffix(".ndjson")
+    return backup_file.with_name(f"{name}.manifest.json")
+
+
+def iter_backup(
+    manifest: BackupManifest, previous: BackupManifest | None = None
+) -> Iterator[bytes]:
+    """Yield the NDJSON lines of a backup of the current database state.
+
+    The row count and checksum of each table are filled into `manifest` as the table is
+    written, and the manifest is the last line.
+
+    Args:
+        manifest: Manifest of the backup, with its format, version and creation time set.
+        previous: Manifest of the previous backup, to write a delta holding only the rows
+            changed since it: meals and side dishes updated since its watermark or not in
+            its ids, and meal history past its watermark id. Deletions of meals and side
+            dishes are carried by the ids recorded for them.
+
+    Raises:
+        _FullBackupNeeded: Before anything is yielded, if the database was restored or meal
+            history rows were deleted or replaced since `previous`, which a delta cannot
+            express.
+    """
+    with get_connection() as conn:
+        # One snapshot for all tables, so the references between them stay consistent.
+        conn.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ, READ ONLY")
+        manifest.restore_epoch = _restore_epoch(conn)
+        if previous is not None and previous.restore_epoch != manifest.restore_epoch:
+            raise _FullBackupNeeded(f"the database was restored since {previous.file}")
+
+        filters = {}
+        for table in BACKUP_TABLES:
+            where, params = sql.SQL("TRUE"), ()
+            if previous is not None:
+                before = previous.tables.get(table)
+                if before is None or before.total is None:
+                    raise _FullBackupNeeded(f"{previous.file} has no {table} watermark")
+                where, params = _delta_filter(table, before)
+            ids = sql.SQL(
+                "NULL" if table in _APPEND_ONLY else "array_agg(id ORDER BY id)"
             )
-            if gz:
-                f.write(content.encode("utf-8"))
-            else:
-                f.write(content)
+            conn.execute(
+                sql.SQL(
+                    "SELECT count(*) AS total, count(*) FILTER (WHERE {where}) AS selected, "
+                    "max({column}) AS watermark, {ids} AS ids FROM {table}"
+                ).format(
+                    where=where,
+                    column=sql.Identifier(_WATERMARKS[table]),
+                    ids=ids,
+                    table=sql.Identifier(table),
+                ),
+                params,
+            )
+            stats = conn.fetchone()
+            if previous is not None and table in _APPEND_ONLY:
+                if stats["total"] != before.total + stats["selected"] or (
+                    stats["watermark"] or 0
+                ) < (before.watermark or 0):
+                    raise _FullBackupNeeded(
+                        f"{table} rows were removed or replaced since {previous.file}"
+                    )
+            manifest.tables[table] = BackupTable(
+                total=stats["total"],
+                watermark=stats["watermark"],
+                ids=None if table in _APPEND_ONLY else stats["ids"] or [],
+            )
+            filters[table] = (where, params)
+
+        header = manifest.model_dump(
+            mode="json", include={"format", "version", "kind", "parent", "created_at"}
+        )
+        yield _control_line("backup", header)
+        for table in BACKUP_TABLES:
+            yield _control_line("section", table)
+            checksum = hashlib.sha256()
+            rows = 0
+            for chunk in _table_chunks(conn, table, *filters[table]):
+                checksum.update(chunk.data)
+                rows += chunk.rows
+                yield chunk.data
+            manifest.tables[table].rows = rows
+            manifest.tables[table].sha256 = checksum.hexdigest()
+            logger.debug("Backed up {} rows of {}", rows, table)
+
+    yield _control_line(
+        "manifest", manifest.model_dump(mode="json", exclude={"file", "file_sha256"})
+    )
+
+
+def new_backup_manifest(
+    gz: bool = True, previous: BackupManifest | None = None
+) -> BackupManifest:
+    """Manifest for a backup taken now, named after its creation time.
+
+    Args:
+        gz: Whether the backup is gzipped.
+        previous: Manifest of the backup a delta applies on top of; None for a full backup.
+    """
+    created_at = datetime.now(ZoneInfo("UTC"))
+    name = f"{created_at.strftime('%Y-%m-%d_%H-%M-%S-%fZ')}-backup.ndjson"
+    return BackupManifest(
+        format=BACKUP_FORMAT,
+        version=BACKUP_VERSION,
+        kind=BackupKind.FULL if previous is None else BackupKind.DELTA,
+        parent=None if previous is None else previous.file,
+        created_at=created_at,
+        file=f"{name}.gz" if gz else name,
+    )
+
+
+def iter_gzip(chunks: Iterable[bytes]) -> Iterator[bytes]:
+    """Gzip a byte stream incrementally, e.g. `iter_backup` for a download."""
+    compressor = zlib.compressobj(_COMPRESS_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        if data := compressor.compress(chunk):
+            yield data
+    yield compressor.flush()
+
 
-        logger.info(f"Backup created successfully: {backup_file}")
-        return backup_file
+def _write_backup(
+    manifest: BackupManifest, lines: Iterable[bytes], directory: Path | None = None
+) -> Path:
+    """Write a backup stream to `manifest.file`, gzipped if the name ends in `.gz`.
 
+    The backup is written to a `.partial` file that is renamed into place once complete, and
+    its manifest is written next to it.
+    """
+    name = manifest.file
+    gz = name.endswith(".gz")
+    backup_file = Path(directory or settings.DATA_DIR) / name
+    partial = backup_file.with_name(f"{name}.partial")
+
+    try:
+        with open(partial, "wb") as raw:
+            out = _HashingWriter(raw)
+            with (
+                gzip.GzipFile(
+                    filename=name.removesuffix(".gz"),
+                    mode="wb",
+                    fileobj=out,
+                    compresslevel=_COMPRESS_LEVEL,
+                )
+                if gz
+                else nullcontext(out)
+            ) as f:
+                for data in lines:
+                    f.write(data)
+        partial.replace(backup_file)
+    except _FullBackupNeeded:
+        partial.unlink(missing_ok=True)
+        raise
     except Exception as e:
-        logger.error(f"Error creating backup: {e}")
+        partial.unlink(missing_ok=True)
+        logger.error("Error creating backup: {}", e)
         raise
 
+    manifest.file_sha256 = out.sha256.hexdigest()
+    manifest_path(backup_file).write_text(manifest.model_dump_json(indent=2))
+    logger.info(
+        "Backup created successfully: {} ({} backup; {})",
+        backup_file,
+        manifest.kind.value,
+        ", ".join(f"{t}: {info.rows} rows" for t, info in manifest.tables.items()),
+    )
+    return backup_file
+
 
-def create_backup(minimize: bool = False, gz: bool = True) -> Path:
-    """Create a backup of the current database state.
+def create_backup(gz: bool = True, directory: Path | None = None) -> Path:
+    """Create a full backup of the current database state.
 
     Args:
-        minimize: Whether to minimize the JSON output (no indentation).
         gz: Whether to compress the backup with gzip.
+        directory: Directory to write the backup to, `DATA_DIR` by default.
 
     Returns:
         Path: The path to the created backup file.
     """
-    backup_data: dict = {}
+    logger.info("Creating database backup...")
+    manifest = new_backup_manifest(gz)
+    return _write_backup(manifest, iter_backup(manifest), directory)
+
+
+async def _iter_lines(chunks: AsyncIterable[bytes]) -> AsyncIterator[list[bytes]]:
+    """Complete lines of a plain or gzipped byte stream, one list per received chunk."""
+    decompressor = None
+    head = b""
+    pending = b""
+    async for chunk in chunks:
+        if decompressor is None and head is not None:
+            head += chunk
+            if len(head) < 2:
+                continue
+            chunk, head = head, None
+            if chunk[:2] == b"\x1f\x8b":
+                decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        try:
+            data = decompressor.decompress(chunk) if decompressor else chunk
+        except zlib.error as e:
+            raise ValueError(f"Corrupt gzip data: {e}") from e
+        lines = (pending + data).split(b"\n")
+        pending = lines.pop()
+        if lines:
+            yield lines
+    if decompressor is not None and not decompressor.eof:
+        raise ValueError("Backup is truncated")
+    rest = pending if head is None else head
+    if rest.strip():
+        yield [rest]
+
+
+def _control(line: bytes) -> tuple[str, object]:
+    try:
+        ((key, value),) = json.loads(line).items()
+    except ValueError as e:
+        raise ValueError(f"Malformed backup line: {line[:80]!r}") from e
+    return key, value
+
+
+def _staging(table: str) -> sql.Identifier:
+    return sql.Identifier(f"restore_{table}")
+
+
+class _Section:
+    """Rows of one table received so far, and the ones not yet copied to staging."""
+
+    def __init__(self, table: str):
+        self.table = table
+        self.rows = 0
+        self.sha256 = hashlib.sha256()
+        self.buffer: list[bytes] = []
+
+    async def flush(self, conn) -> None:
+        if not self.buffer:
+            return
+        data = b"\n".join(self.buffer) + b"\n"
+        self.sha256.update(data)
+        self.rows += len(self.buffer)
+        self.buffer = []
+        query = sql.SQL("COPY {} (row) FROM STDIN").format(_staging(self.table))
+        try:
+            async with conn.copy(query) as copy:
+                # COPY's text format treats backslashes as escapes.
+                await copy.write(data.replace(b"\\", b"\\\\"))
+        except psycopg.DataError as e:
+            raise ValueError(f"Invalid row in {self.table}: {e}") from e
+
+
+async def restore_backup(chunks: AsyncIterable[bytes]) -> BackupManifest:
+    """Replace the meals, side dishes and meal history with a backup from `iter_backup`.
+
+    Each section is copied into a staging table as it arrives. Once the whole backup has been
+    read and its row counts and checksums match its manifest, the tables are truncated, filled
+    from the staging tables and their id sequences reset, all in the same transaction, so a
+    malformed, truncated or corrupted backup leaves the database unchanged.
+
+    Args:
+        chunks: The backup, plain or gzipped, in chunks of any size.
 
-    # Generate backup filename with timestamp
-    backup_file = Path(
-        settings.DATA_DIR
-        / f"{datetime.now(ZoneInfo('UTC')).strftime('%Y-%m-%d_%H-%M-%SZ')}-backup_data.json"
+    Returns:
+        BackupManifest: Manifest of the restored backup.
+
+    Raises:
+        ValueError: If the data is not a complete and intact backup.
+    """
+    from db.core.cache import catalog_cache
+
+    header = manifest = None
+    sections: dict[str, _Section] = {}
+    section = None
+
+    async with get_async_connection() as conn:
+        for table in BACKUP_TABLES:
+            await conn.execute(
+                sql.SQL(
+                    "CREATE TEMP TABLE {} (row json NOT NULL) ON COMMIT DROP"
+                ).format(_staging(table))
+            )
+
+        async for lines in _iter_lines(chunks):
+            for line in lines:
+                if not line:
+                    continue
+                if manifest is not None:
+                    raise ValueError("Unexpected data after the backup manifest")
+                if header is None and not line.startswith(b'{"backup":'):
+                    raise ValueError("Not a meal planner backup")
+                if not line.startswith(_CONTROL_PREFIXES):
+                    if section is None:
+                        raise ValueError("Backup row outside of a table section")
+                    section.buffer.append(line)
+                    if len(section.buffer) >= _RESTORE_COPY_ROWS:
+                        await section.flush(conn)
+                    continue
+
+                key, value = _control(line)
+                if header is None:
+                    header = value
+                    if not isinstance(header, dict):
+                        raise ValueError("Not a meal planner backup")
+                    if (header.get("format"), header.get("version")) != (
+                        BACKUP_FORMAT,
+                        BACKUP_VERSION,
+                    ):
+                        raise ValueError(
+                            f"Unsupported backup format: {header.get('format')} "
+                            f"version {header.get('version')}"
+                        )
+                    if header.get("kind", BackupKind.FULL) != BackupKind.FULL:
+                        raise ValueError(
+                            "This is an incremental backup; restore it from the "
+                            "backup directory so the backups it builds on are applied"
+                        )
+                elif key == "section":
+                    if value not in BACKUP_TABLES or value in sections:
+                        raise ValueError(f"Unexpected backup section: {value}")
+                    if section is not None:
+                        await section.flush(conn)
+                    section = sections[value] = _Section(value)
+                elif key == "manifest":
+                    if section is not None:
+                        await section.flush(conn)
+                    manifest = BackupManifest.model_validate(value)
+                else:
+                    raise ValueError(f"Unexpected backup line: {key}")
+
+        if manifest is None:
+            raise ValueError("Backup is truncated: no manifest")
+        for table in BACKUP_TABLES:
+            expected = manifest.tables.get(table)
+            received = sections.get(table)
+            if expected is None or received is None:
+                raise ValueError(f"Backup has no {table} section")
+            if (received.rows, received.sha256.hexdigest()) != (
+                expected.rows,
+                expected.sha256,
+            ):
+                raise ValueError(f"Backup section {table} does not match its checksum")
+
+        # Skip the per-row foreign key triggers while loading; the references are checked
+        # with one query per key below. Notify triggers are skipped too, hence pg_notify.
+        await conn.execute("SET LOCAL session_replication_role = replica")
+        await conn.execute(
+            sql.SQL("TRUNCATE {} RESTART IDENTITY CASCADE").format(
+                sql.SQL(", ").join(map(sql.Identifier, reversed(BACKUP_TABLES)))
+            )
+        )
+        for table in BACKUP_TABLES:
+            try:
+                await conn.execute(
+                    sql.SQL(
+                        "INSERT INTO {table} "
+                        "SELECT r.* FROM {staging} s, json_populate_record(NULL::{table}, s.row) r"
+                    ).format(table=sql.Identifier(table), staging=_staging(table))
+                )
+            except (psycopg.DataError, psycopg.IntegrityError) as e:
+                raise ValueError(f"Cannot restore {table}: {e}") from e
+            await conn.execute(
+                sql.SQL(
+                    "SELECT setval(pg_get_serial_sequence(%s, 'id'), "
+                    "coalesce(max(id), 0) + 1, false) FROM {}"
+                ).format(sql.Identifier(table)),
+                (table,),
+            )
+        for table, column, referenced in _REFERENCES:
+            await conn.execute(
+                sql.SQL(
+                    "SELECT t.{column} AS missing FROM {table} t "
+                    "WHERE t.{column} IS NOT NULL AND NOT EXISTS "
+                    "(SELECT 1 FROM {referenced} r WHERE r.id = t.{column}) LIMIT 1"
+                ).format(
+                    table=sql.Identifier(table),
+                    column=sql.Identifier(column),
+                    referenced=sql.Identifier(referenced),
+                )
+            )
+            if row := await conn.fetchone():
+                raise ValueError(
+                    f"Backup {table}.{column} references missing "
+                    f"{referenced} id {row['missing']}"
+                )
+        await conn.execute("SET LOCAL session_replication_role = origin")
+        await conn.execute(_BUMP_RESTORE_EPOCH)
+        # The meal_stats triggers were skipped too.
+        await conn.execute("SELECT refresh_meal_stats()")
+        for table in ("meals", "side_dishes"):
+            await conn.execute("SELECT pg_notify('catalog_changed', %s)", (table,))
+
+    catalog_cache.invalidate()
+    logger.info(
+        "Backup restored ({})",
+        ", ".join(f"{t}: {info.rows} rows" for t, info in manifest.tables.items()),
     )
+    return manifest
 
-    if gz:
-        backup_file = backup_file.with_suffix(".json.gz")
 
-    logger.info("Creating database backup...")
+def read_manifest(backup_file: Path) -> BackupManifest:
+    """Read the manifest written next to a backup file."""
+    return BackupManifest.model_validate_json(manifest_path(backup_file).read_text())
 
-    # Get current data using repositories
-    meal_repo = MealRepository()
-    side_dish_repo = SideDishRepository()
-    meal_history_repo = MealHistoryRepository()
 
-    # Serialize models to dictionaries
-    meals = meal_repo.get_all_meals()
-    logger.debug(f"Fetched {len(meals) if meals else 0} meals from database")
-    if meals:
-        backup_data["meals"] = [meal.model_dump(mode="json") for meal in meals]
+def list_backups(directory: Path | None = None) -> list[tuple[Path, BackupManifest]]:
+    """Backups with a manifest in a directory, `DATA_DIR` by default, oldest first.
 
-    side_dishes = side_dish_repo.get_all_side_dishes()
-    logger.debug(
-        f"Fetched {len(side_dishes) if side_dishes else 0} side dishes from database"
+    A compacted full backup shares its creation time with the delta it was made from and
+    sorts after it, so the last backup is the one a new delta should build on.
+    """
+    directory = Path(directory or settings.DATA_DIR)
+    backups = []
+    for path in directory.glob("*.manifest.json"):
+        try:
+            manifest = BackupManifest.model_validate_json(path.read_text())
+        except (OSError, ValueError) as e:
+            logger.warning("Skipping unreadable backup manifest {}: {}", path.name, e)
+            continue
+        if manifest.file and (directory / manifest.file).exists():
+            backups.append((directory / manifest.file, manifest))
+    backups.sort(key=lambda b: (b[1].created_at, b[1].kind == BackupKind.FULL))
+    return backups
+
+
+def backup_chain(backup_file: Path) -> list[tuple[Path, BackupManifest]]:
+    """The full backup a backup builds on and the deltas leading to it, oldest first.
+
+    Raises:
+        ValueError: If a backup of the chain or its manifest is missing.
+    """
+    chain = []
+    path = Path(backup_file)
+    while True:
+        try:
+            manifest = read_manifest(path)
+        except OSError as e:
+            raise ValueError(f"Backup {path.name} has no readable manifest") from e
+        if not path.exists():
+            raise ValueError(f"Backup {path.name} is missing")
+        chain.append((path, manifest))
+        if manifest.kind == BackupKind.FULL:
+            return chain[::-1]
+        parent = path.with_name(manifest.parent or "")
+        if not manifest.parent or any(parent == p for p, _ in chain):
+            raise ValueError(f"Backup {path.name} has no usable parent")
+        path = parent
+
+
+def _read_rows(
+    path: Path, manifest: BackupManifest, tables: tuple[str, ...] = BACKUP_TABLES
+) -> Iterator[tuple[str, bytes]]:
+    """(table, NDJSON line) of each row of a stored backup, verified against its manifest.
+
+    Stops after the last of `tables`; a section is checked against the manifest once it
+    has been read completely.
+    """
+    last = max(map(BACKUP_TABLES.index, tables))
+    section = None
+    checksum = hashlib.sha256()
+    rows = 0
+
+    def check():
+        expected = manifest.tables.get(section)
+        if expected is None or (rows, checksum.hexdigest()) != (
+            expected.rows,
+            expected.sha256,
+        ):
+            raise ValueError(f"Backup {path.name} section {section} is corrupt")
+
+    with (gzip.open if path.suffix == ".gz" else open)(path, "rb") as f:
+        try:
+            for line in f:
+                if not line.startswith(_CONTROL_PREFIXES):
+                    if section in tables:
+                        checksum.update(line)
+                        rows += 1
+                        yield section, line
+                    continue
+                if section in tables:
+                    check()
+                key, value = _control(line)
+                if key == "manifest" or (
+                    key == "section" and BACKUP_TABLES.index(value) > last
+                ):
+                    return
+                section = value if key == "section" else None
+                checksum = hashlib.sha256()
+                rows = 0
+        except (OSError, EOFError, zlib.error) as e:
+            raise ValueError(f"Backup {path.name} is unreadable: {e}") from e
+    raise ValueError(f"Backup {path.name} is truncated")
+
+
+def _merged_catalog(chain: list[tuple[Path, BackupManifest]], table: str) -> _Chunk:
+    """Rows of a catalog table as of the newest backup of a chain."""
+    rows: dict[int, bytes] = {}
+    for path, manifest in chain:
+        for _, line in _read_rows(path, manifest, (table,)):
+            rows[json.loads(line)["id"]] = line
+        ids = manifest.tables[table].ids
+        if ids is not None:
+            rows = {i: rows[i] for i in ids if i in rows}
+    return _Chunk(len(rows), b"".join(rows[i] for i in sorted(rows)))
+
+
+def _appended_rows(
+    chain: list[tuple[Path, BackupManifest]], table: str
+) -> Iterator[_Chunk]:
+    """Rows of an append-only table across a chain, in chunks of `_RESTORE_COPY_ROWS`."""
+    for path, manifest in chain:
+        lines = []
+        for _, line in _read_rows(path, manifest, (table,)):
+            lines.append(line)
+            if len(lines) >= _RESTORE_COPY_ROWS:
+                yield _Chunk(len(lines), b"".join(lines))
+                lines = []
+        if lines:
+            yield _Chunk(len(lines), b"".join(lines))
+
+
+def iter_chain(
+    chain: list[tuple[Path, BackupManifest]], manifest: BackupManifest
+) -> Iterator[bytes]:
+    """Yield a full backup stream of the state recorded by the newest backup of a chain.
+
+    Catalog tables are merged in memory, applying each delta's rows and dropping the ids it
+    no longer lists; append-only tables are streamed from each backup in turn. The resulting
+    row counts are checked against the totals the newest backup recorded.
+
+    Args:
+        chain: A chain from `backup_chain`.
+        manifest: Manifest of the result, with its format, version and creation time set;
+            its tables are filled in as they are written.
+
+    Raises:
+        ValueError: If a backup of the chain is corrupt or the chain does not add up.
+    """
+    head = chain[-1][1]
+    header = manifest.model_dump(
+        mode="json", include={"format", "version", "kind", "parent", "created_at"}
     )
-    if side_dishes:
-        backup_data["side_dishes"] = [
-            side_dish.model_dump(mode="json") for side_dish in side_dishes
-        ]
-
-    meal_history = meal_history_repo.get_all_meal_history()
-    logger.debug(
-        f"Fetched {len(meal_history.history) if meal_history else 0} meal history items from database"
+    yield _control_line("backup", header)
+    for table in BACKUP_TABLES:
+        yield _control_line("section", table)
+        checksum = hashlib.sha256()
+        rows = 0
+        chunks = (
+            _appended_rows(chain, table)
+            if table in _APPEND_ONLY
+            else [_merged_catalog(chain, table)]
+        )
+        for chunk in chunks:
+            checksum.update(chunk.data)
+            rows += chunk.rows
+            yield chunk.data
+        expected = head.tables[table]
+        if expected.total is not None and rows != expected.total:
+            raise ValueError(
+                f"Backup chain of {head.file} gives {rows} {table} rows, "
+                f"{expected.total} were backed up"
+            )
+        manifest.tables[table] = BackupTable(
+            rows=rows,
+            sha256=checksum.hexdigest(),
+            total=rows,
+            watermark=expected.watermark,
+            ids=expected.ids,
+        )
+    yield _control_line(
+        "manifest", manifest.model_dump(mode="json", exclude={"file", "file_sha256"})
     )
-    if meal_history:
-        backup_data["meal_history"] = [
-            meal_history_item.model_dump(mode="json")
-            for meal_history_item in meal_history.history
-        ]
 
-    logger.debug(f"Backup data: {backup_data}")
 
-    # Write backup file
-    _write_backup_file(backup_file, backup_data, minimize, gz)
+def _remove_backup(path: Path) -> None:
+    path.unlink(missing_ok=True)
+    manifest_path(path).unlink(missing_ok=True)
+    logger.info("Removed old backup {}", path.name)
+
+
+def _prune_backups(directory: Path) -> None:
+    """Remove backups older than the newest `BACKUP_KEEP_CHAINS` full backups."""
+    backups = list_backups(directory)
+    bases = [m for _, m in backups if m.kind == BackupKind.FULL]
+    if len(bases) <= settings.BACKUP_KEEP_CHAINS:
+        return
+    oldest = bases[-settings.BACKUP_KEEP_CHAINS].created_at
+    for path, manifest in backups:
+        if manifest.created_at < oldest:
+            _remove_backup(path)
+    # Deltas whose chain lost its base to the pruning above.
+    for path, manifest in list_backups(directory):
+        if manifest.kind == BackupKind.DELTA:
+            try:
+                backup_chain(path)
+            except ValueError:
+                _remove_backup(path)
+
+
+def compact_backups(directory: Path | None = None) -> Path | None:
+    """Merge the newest backup chain into a full backup and remove old backups.
+
+    The full backup is named after the newest delta, with `-base` in place of `-backup`, and
+    has its creation time. Only the chains of the newest `BACKUP_KEEP_CHAINS` full backups
+    are kept.
+
+    Returns:
+        Path | None: The new full backup, or None if the newest backup already was one.
+    """
+    directory = Path(directory or settings.DATA_DIR)
+    backups = list_backups(directory)
+    compacted = None
+    if backups and backups[-1][1].kind == BackupKind.DELTA:
+        chain = backup_chain(backups[-1][0])
+        head = chain[-1][1]
+        logger.info("Compacting {} backups up to {}", len(chain), head.file)
+        manifest = BackupManifest(
+            format=BACKUP_FORMAT,
+            version=BACKUP_VERSION,
+            created_at=head.created_at,
+            restore_epoch=head.restore_epoch,
+            file=head.file.replace("-backup.ndjson", "-base.ndjson"),
+        )
+        compacted = _write_backup(manifest, iter_chain(chain, manifest), directory)
+    _prune_backups(directory)
+    return compacted
+
+
+def create_incremental_backup(gz: bool = True, directory: Path | None = None) -> Path:
+    """Create a delta on top of the newest backup, or a full backup if there is none.
+
+    The newest chain is compacted first once it has `BACKUP_MAX_DELTAS` deltas, and a full
+    backup is taken instead when the changes cannot be expressed as a delta: after meal
+    history rows were deleted, or after a backup was restored or the tables truncated.
+
+    Args:
+        gz: Whether to compress the backup with gzip.
+        directory: Directory holding the backups, `DATA_DIR` by default.
+
+    Returns:
+        Path: The path to the created backup file.
+    """
+    directory = Path(directory or settings.DATA_DIR)
+    backups = list_backups(directory)
+    if backups:
+        path, previous = backups[-1]
+        try:
+            if len(backup_chain(path)) > settings.BACKUP_MAX_DELTAS:
+                path = compact_backups(directory)
+                previous = read_manifest(path)
+            logger.info("Creating incremental database backup on {}...", path.name)
+            manifest = new_backup_manifest(gz, previous)
+            return _write_backup(manifest, iter_backup(manifest, previous), directory)
+        except _FullBackupNeeded as e:
+            logger.info("Taking a full backup: {}", e)
+        except ValueError as e:
+            logger.warning("Cannot extend the backup chain of {}: {}", path.name, e)
+
+    backup_file = create_backup(gz, directory)
+    _prune_backups(directory)
+    return backup_file
+
+
+async def restore_backup_chain(backup_file: Path) -> BackupManifest:
+    """Restore a stored backup, full or delta, with `restore_backup`.
+
+    The chain of the backup is replayed while it is restored, so a delta restores the
+    complete state at the time it was taken.
+
+    Raises:
+        ValueError: If a backup of the chain is missing or corrupt.
+    """
+    chain = await asyncio.to_thread(backup_chain, backup_file)
+    manifest = BackupManifest(
+        format=BACKUP_FORMAT,
+        version=BACKUP_VERSION,
+        created_at=chain[-1][1].created_at,
+        file=Path(backup_file).name,
+    )
+    lines = iter_chain(chain, manifest)
 
-    logger.info(f"Backup created successfully: {backup_file}")
+    async def chunks() -> AsyncIterator[bytes]:
+        # The backup files are read in a worker thread, one chunk at a time.
+        while (chunk := await asyncio.to_thread(next, lines, None)) is not None:
+            yield chunk
 
-    # TODO: Implement message model here.
+    try:
+        return await restore_backup(chunks())
+    finally:
+        lines.close()
 
 
 def truncate_all_tables():
     """Truncate all data from meals, side_dishes, and meal_history tables."""
     logger.info("Truncating all tables...")
 
-    from db.core.connection import get_connection
+    from db.core.cache import catalog_cache
 
     try:
         with get_connection() as conn:
@@ -118,11 +854,15 @@ def truncate_all_tables():
 
             # Re-enable foreign key constraints
             conn.execute("SET session_replication_role = 'origin';")
+            conn.execute(_BUMP_RESTORE_EPOCH)
 
             logger.info("All tables truncated successfully")
 
+        # Triggers are disabled in replica mode, so no change notification was sent.
+        catalog_cache.invalidate()
+
     except Exception as e:
-        logger.error(f"Error truncating tables: {e}")
+        logger.error("Error truncating tables: {}", e)
         raise
 
 
@@ -132,6 +872,6 @@ def backup_and_truncate() -> Path:
     Returns:
         Path: The path to the created backup file.
     """
-    backup_path = create_backup()
+    backup_path = create_incremental_backup()
     truncate_all_tables()
     return backup_path
@@ -0,0 +1,399 @@
+"""Indexed queries over the serialized application log.
+
+`LogIndex` keeps a sidecar index in `LOG_DIR/.index` with the byte offset, timestamp and level of
+every record in `app.log` and in the rotated (and gzipped) files next to it. The index of the
+live file is extended incrementally as it grows and rebuilt when loguru rotates it; rotated
+files are indexed once. Queries binary-search the index arrays for their time range, filter the
+rest and only read and parse the lines they return, seeking straight to them.
+
+A gzip stream cannot be entered at an arbitrary offset, so when a gzipped archive is indexed its
+lines are also written to the sidecar directory as a series of independent gzip members of about
+`_BLOCK_SIZE` bytes each, with a table of where each member starts. Reading a line from an archive
+then inflates only the member holding it, not the archive up to it.
+"""
+
+import base64
+import gzip
+import json
+from contextlib import nullcontext
+from pathlib import Path
+from threading import Lock
+
+import numpy as np
+
+from settings import settings
+
+LOG_FILE = "app.log"
+INDEX_DIR = ".index"
+
+_RECORD = np.dtype([("offset", "<u8"), ("time", "<f8"), ("level", "u1")])
+# Start of each gzip member of an archive's seekable copy: its position in the copy and the
+# offset in the archive's uncompressed lines it begins at.
+_BLOCK = np.dtype([("position", "<u8"), ("offset", "<u8")])
+# Bytes of log read per step when indexing.
+_CHUNK_SIZE = 1 << 20
+# Uncompressed bytes per gzip member of an archive's seekable copy.
+_BLOCK_SIZE = 1 << 16
+
+LEVELS = {
+    "TRACE": 5,
+    "DEBUG": 10,
+    "INFO": 20,
+    "SUCCESS": 25,
+    "WARNING": 30,
+    "ERROR": 40,
+    "CRITICAL": 50,
+}
+
+
+def encode_log_cursor(file_name: str, inode: int, offset: int, time: float) -> str:
+    """Encode the position of a log record as an opaque cursor."""
+    raw = f"{file_name}|{inode}|{offset}|{time!r}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_log_cursor(cursor: str) -> tuple[str, int, int, float]:
+    """Decode a cursor from `encode_log_cursor`.
+
+    Raises:
+        ValueError: If the cursor is malformed.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        file_name, inode, offset, time = raw.rsplit("|", 3)
+        return file_name, int(inode), int(offset), float(time)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise ValueError(f"Invalid log cursor: {cursor}") from e
+
+
+def _open(path: Path):
+    return gzip.open(path, "rb") if path.suffix == ".gz" else open(path, "rb")
+
+
+class _BlockWriter:
+    """Writes lines as independent gzip members of about `_BLOCK_SIZE` bytes each."""
+
+    def __init__(self, f):
+        self._f = f
+        self._lines: list[bytes] = []
+        self._size = 0
+        self._start = 0
+        self.blocks: list[tuple[int, int]] = []
+
+    def add(self, offset: int, line: bytes) -> None:
+        if not self._lines:
+            self._start = offset
+        self._lines.append(line)
+        self._size += len(line)
+        if self._size >= _BLOCK_SIZE:
+            self.flush()
+
+    def flush(self) -> None:
+        if self._lines:
+            self.blocks.append((self._f.tell(), self._start))
+            self._f.write(gzip.compress(b"".join(self._lines)))
+            self._lines, self._size = [], 0
+
+
+class _FileIndex:
+    """Index of one log file: one `_RECORD` per line, plus how far it has been indexed."""
+
+    def __init__(self, path: Path, sidecar: Path):
+        self.path = path
+        self.sidecar = sidecar
+        self.meta_path = sidecar.with_suffix(".json")
+        self.compressed = path.suffix == ".gz"
+        # Seekable copy of a gzipped archive and the table of its members.
+        self.blocks_path = sidecar.with_suffix(".blocks")
+        self.data_path = sidecar.with_suffix(".gzdata")
+        self.records = np.empty(0, dtype=_RECORD)
+        self.blocks = np.empty(0, dtype=_BLOCK)
+        self.indexed_to = 0
+        self.inode = None
+
+        if sidecar.exists() and self.meta_path.exists():
+            try:
+                meta = json.loads(self.meta_path.read_text())
+                records = np.fromfile(sidecar, dtype=_RECORD)
+                if self.compressed:
+                    self.blocks = np.fromfile(self.blocks_path, dtype=_BLOCK)
+                    if not self.data_path.exists():
+                        raise OSError(f"{self.data_path} is missing")
+                if len(records) == meta["records"]:
+                    self.records = records
+                    self.indexed_to = meta["indexed_to"]
+                    self.inode = meta["inode"]
+            except (OSError, ValueError, KeyError):
+                pass
+
+    def _reset(self) -> None:
+        self.records = np.empty(0, dtype=_RECORD)
+        self.blocks = np.empty(0, dtype=_BLOCK)
+        self.indexed_to = 0
+        self.sidecar.unlink(missing_ok=True)
+        self.blocks_path.unlink(missing_ok=True)
+        self.data_path.unlink(missing_ok=True)
+
+    def refresh(self) -> None:
+        """Index whatever was appended since the last refresh."""
+        try:
+            stat = self.path.stat()
+        except FileNotFoundError:
+            return
+        compressed = self.compressed
+        if self.inode != stat.st_ino or (
+            not compressed and stat.st_size < self.indexed_to
+        ):
+            # A new file under the same name (rotation) or a truncated one.
+            self._reset()
+            self.inode = stat.st_ino
+        elif compressed or stat.st_size == self.indexed_to:
+            return
+
+        new: list[tuple[int, float, int]] = []
+        with (
+            _open(self.path) as f,
+            open(self.data_path, "wb") if compressed else nullcontext() as data,
+        ):
+            # An archive is indexed in one pass from its start, so its copy is written whole.
+            blocks = _BlockWriter(data) if compressed else None
+            f.seek(self.indexed_to)
+            offset = self.indexed_to
+            pending = b""
+            while chunk := f.read(_CHUNK_SIZE):
+                lines = (pending + chunk).split(b"\n")
+                pending = lines.pop()
+                for line in lines:
+                    if line.strip():
+                        record = self._parse(line)
+                        if record is not None:
+                            new.append((offset, *record))
+                    if blocks is not None:
+                        blocks.add(offset, line + b"\n")
+                    offset += len(line) + 1
+            if compressed:
+                if pending.strip():
+                    record = self._parse(pending)
+                    if record is not None:
+                        new.append((offset, *record))
+                if pending:
+                    blocks.add(offset, pending)
+                blocks.flush()
+                offset += len(pending)
+        if compressed:
+            self.blocks = np.array(blocks.blocks, dtype=_BLOCK)
+            self.blocks.tofile(self.blocks_path)
+        # An unfinished last line of the live file is indexed on a later refresh.
+        self.indexed_to = offset
+
+        if new:
+            records = np.array(new, dtype=_RECORD)
+            self.records = np.concatenate([self.records, records])
+            with open(self.sidecar, "ab") as f:
+                records.tofile(f)
+        self.meta_path.write_text(
+            json.dumps(
+                {
+                    "records": len(self.records),
+                    "indexed_to": self.indexed_to,
+                    "inode": self.inode,
+                }
+            )
+        )
+
+    @staticmethod
+    def _parse(line: bytes) -> tuple[float, int] | None:
+        try:
+            record = json.loads(line)["record"]
+            return record["time"]["timestamp"], record["level"]["no"]
+        except (ValueError, KeyError, TypeError):
+            return None
+
+    def read(self, offsets: list[int]) -> list[str]:
+        """Read the lines starting at the given ascending offsets."""
+        if self.compressed:
+            return self._read_blocks(offsets)
+        lines = []
+        with open(self.path, "rb") as f:
+            for offset in offsets:
+                f.seek(offset)
+                lines.append(f.readline().decode("utf-8").rstrip("\n"))
+        return lines
+
+    def _read_blocks(self, offsets: list[int]) -> list[str]:
+        """Read lines of an archive from its seekable copy, inflating each member once."""
+        lines = []
+        starts = self.blocks["offset"]
+        positions = self.blocks["position"].tolist() + [self.data_path.stat().st_size]
+        members = np.searchsorted(starts, offsets, side="right") - 1
+        member, block, start = None, b"", 0
+        with open(self.data_path, "rb") as f:
+            for offset, m in zip(offsets, members.tolist()):
+                if m != member:
+                    member, start = m, int(starts[m])
+                    f.seek(positions[m])
+                    block = gzip.decompress(f.read(positions[m + 1] - positions[m]))
+                at = offset - start
+                end = block.find(b"\n", at)
+                line = block[at:] if end < 0 else block[at:end]
+                lines.append(line.decode("utf-8"))
+        return lines
+
+    def remove(self) -> None:
+        self.sidecar.unlink(missing_ok=True)
+        self.meta_path.unlink(missing_ok=True)
+        self.blocks_path.unlink(missing_ok=True)
+        self.data_path.unlink(missing_ok=True)
+
+
+class LogIndex:
+    """Sidecar-indexed view over the live log file and its rotated archives."""
+
+    def __init__(self, log_dir: Path):
+        self.log_dir = Path(log_dir)
+        self._files: dict[str, _FileIndex] = {}
+        self._lock = Lock()
+
+    def _log_files(self) -> list[Path]:
+        """Log files, oldest first; a rotated file still being compressed is read as is."""
+        rotated = {
+            path.name.removesuffix(".gz"): path
+            for path in self.log_dir.glob("app.*.log.gz")
+        }
+        rotated.update({path.name: path for path in self.log_dir.glob("app.*.log")})
+        files = [rotated[name] for name in sorted(rotated)]
+        current = self.log_dir / LOG_FILE
+        if current.exists():
+            files.append(current)
+        return files
+
+    def refresh(self) -> list[_FileIndex]:
+        """Bring the index up to date with the log directory."""
+        index_dir = self.log_dir / INDEX_DIR
+        index_dir.mkdir(exist_ok=True)
+        with self._lock:
+            files = self._log_files()
+            names = {path.name for path in files}
+            for name in list(self._files):
+                if name not in names:
+                    self._files.pop(name).remove()
+            for sidecar in index_dir.glob("*.idx"):
+                if sidecar.stem not in names:
+                    _FileIndex(self.log_dir / sidecar.stem, sidecar).remove()
+
+            indexes = []
+            for path in files:
+                index = self._files.get(path.name)
+                if index is None:
+                    index = _FileIndex(path, index_dir / f"{path.name}.idx")
+                    self._files[path.name] = index
+                index.refresh()
+                indexes.append(index)
+            return indexes
+
+    def query(
+        self,
+        levels: set[str] | None = None,
+        start: float | None = None,
+        end: float | None = None,
+        limit: int | None = None,
+        cursor: str | None = None,
+        current_only: bool = False,
+    ) -> tuple[list[tuple[str, str]], str | None]:
+        """Find log records, oldest first.
+
+        Args:
+            levels: Level names to include, or None for all levels.
+            start: Earliest timestamp to include.
+            end: Latest timestamp to include.
+            limit: Maximum number of records, or None for all of them.
+            cursor: `next_cursor` of the previous page.
+            current_only: Only search the live `app.log`, not the rotated archives.
+
+        Returns:
+            tuple: ((level name, raw JSON line) of each record, cursor of the next page or None).
+
+        Raises:
+            ValueError: If the cursor is malformed.
+        """
+        after = decode_log_cursor(cursor) if cursor else None
+        level_names = {no: name for name, no in LEVELS.items()}
+        level_nos = (
+            None
+            if levels is None
+            else np.array([LEVELS[level] for level in levels if level in LEVELS])
+        )
+
+        indexes = self.refresh()
+        if current_only:
+            indexes = [index for index in indexes if index.path.name == LOG_FILE]
+        after_time = None
+        if after is not None:
+            file_name, inode, _, after_time = after
+            position = next(
+                (
+                    i
+                    for i, index in enumerate(indexes)
+                    if index.path.name == file_name and index.inode == inode
+                ),
+                None,
+            )
+            if position is None:
+                # The file was rotated or compressed since; continue by time instead.
+                after = None
+            else:
+                indexes = indexes[position:]
+                after_time = None
+
+        want = None if limit is None else limit + 1
+        picked: list[tuple[_FileIndex, np.ndarray]] = []
+        count = 0
+        for index in indexes:
+            # Records are in file order, which is time order, so bounds are binary searches.
+            records = index.records
+            times = records["time"]
+            lo, hi = 0, len(records)
+            if after is not None and index.path.name == after[0]:
+                lo = max(lo, int(np.searchsorted(records["offset"], after[2], "right")))
+            if after_time is not None:
+                lo = max(lo, int(np.searchsorted(times, after_time, "right")))
+            if start is not None:
+                lo = max(lo, int(np.searchsorted(times, start, "left")))
+            if end is not None:
+                hi = int(np.searchsorted(times, end, "right"))
+            matches = records[lo:hi]
+            if level_nos is not None:
+                matches = matches[np.isin(matches["level"], level_nos)]
+            if want is not None:
+                matches = matches[: want - count]
+            if len(matches):
+                picked.append((index, matches))
+                count += len(matches)
+            if want is not None and count >= want:
+                break
+
+        next_cursor = None
+        if limit is not None and count > limit:
+            # One record more than asked for was picked to know there is a next page.
+            index, matches = picked[-1]
+            if len(matches) > 1:
+                picked[-1] = (index, matches[:-1])
+            else:
+                picked.pop()
+            index, matches = picked[-1]
+            last = matches[-1]
+            next_cursor = encode_log_cursor(
+                index.path.name, index.inode, int(last["offset"]), float(last["time"])
+            )
+
+        results: list[tuple[str, str]] = []
+        for index, matches in picked:
+            lines = index.read(matches["offset"].tolist())
+            results.extend(
+                (level_names.get(level, str(level)), line)
+                for level, line in zip(matches["level"].tolist(), lines)
+            )
+        return results, next_cursor
+
+
+log_index = LogIndex(settings.LOG_DIR)
@@ -0,0 +1,333 @@
+"""Full-text search over the application log.
+
+`LogSearch` ingests log records from `app.log` and its rotated archives into an SQLite FTS5 index
+in `LOG_DIR/.index/search.db`. Ingestion is incremental: it reuses the offsets of `log_index` and
+only reads records it has not seen. A file renamed by rotation keeps its records, and records of
+files removed by compression or retention are dropped. Searches ingest at most once per
+`LOG_SEARCH_INGEST_INTERVAL` and never wait for an ingestion another search is running.
+"""
+
+import base64
+import json
+import sqlite3
+from contextlib import contextmanager
+from pathlib import Path
+from threading import Lock
+from time import monotonic
+from typing import Iterator
+
+from settings import settings
+from lib.log_index import INDEX_DIR, LogIndex, log_index
+
+# Entry ids are derived from the record time, so rowid order is time order and FTS5 can return
+# the newest matches without sorting; the low bits keep records logged in the same microsecond apart.
+_ID_BITS = 8
+# Ids looked up at a time, a minute's worth, when checking which ids other files already use.
+_ID_WINDOW = 60_000_000 << _ID_BITS
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sources (
+    name TEXT PRIMARY KEY,
+    inode INTEGER NOT NULL,
+    indexed_to INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS entries (
+    id INTEGER PRIMARY KEY,
+    source TEXT NOT NULL,
+    level TEXT NOT NULL,
+    module TEXT,
+    function TEXT,
+    message TEXT,
+    extra TEXT,
+    raw TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_source ON entries(source);
+CREATE VIRTUAL TABLE IF NOT EXISTS entries_fts USING fts5(
+    message, extra, module, function, content='entries', content_rowid='id'
+);
+CREATE TRIGGER IF NOT EXISTS entries_ad AFTER DELETE ON entries BEGIN
+    INSERT INTO entries_fts(entries_fts, rowid, message, extra, module, function)
+    VALUES ('delete', old.id, old.message, old.extra, old.module, old.function);
+END;
+"""
+
+
+def _time_id(timestamp: float) -> int:
+    """Smallest entry id for a timestamp."""
+    return round(timestamp * 1_000_000) << _ID_BITS
+
+
+def encode_search_cursor(entry_id: int) -> str:
+    """Encode the position of a search result as an opaque cursor."""
+    return base64.urlsafe_b64encode(str(entry_id).encode()).decode().rstrip("=")
+
+
+def decode_search_cursor(cursor: str) -> int:
+    """Decode a cursor from `encode_search_cursor`.
+
+    Raises:
+        ValueError: If the cursor is malformed.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        return int(raw)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise ValueError(f"Invalid log search cursor: {cursor}") from e
+
+
+def _entry_row(source: str, line: str) -> tuple | None:
+    try:
+        record = json.loads(line)["record"]
+        return (
+            _time_id(record["time"]["timestamp"]),
+            source,
+            record["level"]["name"],
+            record.get("module"),
+            record.get("function"),
+            record.get("message"),
+            json.dumps(record.get("extra") or {}, ensure_ascii=False),
+            line,
+        )
+    except (ValueError, KeyError, TypeError):
+        return None
+
+
+class LogSearch:
+    """SQLite FTS5 index over the log files tracked by a `LogIndex`."""
+
+    def __init__(self, index: LogIndex, path: Path):
+        self._index = index
+        self.path = Path(path)
+        self._lock = Lock()
+        self._ready = False
+        self._ingested_at: float | None = None
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        """Connection that commits on success, rolls back on error and is always closed."""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(self.path)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            if not self._ready:
+                conn.executescript(_SCHEMA)
+                self._ready = True
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _rename(conn: sqlite3.Connection, old: str, new: str) -> None:
+        conn.execute("UPDATE entries SET source = ? WHERE source = ?", (new, old))
+        conn.execute("UPDATE sources SET name = ? WHERE name = ?", (new, old))
+
+    @staticmethod
+    def _insert(conn: sqlite3.Connection, rows: list[tuple], last_id: int) -> int:
+        """Insert parsed records of one file, oldest first; returns the last id used."""
+        entries = []
+        taken: set[int] = set()
+        checked_to = -1
+        for row in rows:
+            # Ids only grow within a file, even if the clock went back.
+            last_id = max(row[0], last_id + 1)
+            # Another file may have a record from the same microsecond.
+            while True:
+                if last_id > checked_to:
+                    taken.update(
+                        entry_id
+                        for (entry_id,) in conn.execute(
+                            "SELECT id FROM entries WHERE id BETWEEN ? AND ?",
+                            (last_id, last_id + _ID_WINDOW),
+                        )
+                    )
+                    checked_to = last_id + _ID_WINDOW
+                if last_id not in taken:
+                    break
+                last_id += 1
+            entries.append((last_id, *row[1:]))
+        conn.executemany(
+            "INSERT INTO entries "
+            "(id, source, level, module, function, message, extra, raw) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            entries,
+        )
+        # One bulk statement is much faster than an insert trigger per row.
+        conn.executemany(
+            "INSERT INTO entries_fts (rowid, message, extra, module, function) "
+            "VALUES (?, ?, ?, ?, ?)",
+            [(e[0], e[5], e[6], e[3], e[4]) for e in entries],
+        )
+        return last_id
+
+    def ingest(self) -> int:
+        """Add records written since the last ingestion.
+
+        Returns:
+            int: Number of records added.
+        """
+        with self._lock:
+            added = self._ingest()
+            self._ingested_at = monotonic()
+        return added
+
+    def _ingest_if_due(self) -> None:
+        """Ingest unless that was done in the last `LOG_SEARCH_INGEST_INTERVAL` seconds.
+
+        A search that finds another one ingesting answers from the index as it is.
+        """
+        since = None if self._ingested_at is None else monotonic() - self._ingested_at
+        if since is not None and since < settings.LOG_SEARCH_INGEST_INTERVAL:
+            return
+        if not self._lock.acquire(blocking=False):
+            return
+        try:
+            self._ingest()
+            self._ingested_at = monotonic()
+        finally:
+            self._lock.release()
+
+    def _ingest(self) -> int:
+        files = self._index.refresh()
+        current = {index.path.name: index for index in files}
+        added = 0
+        with self._connect() as conn:
+            sources = {
+                name: (inode, indexed_to)
+                for name, inode, indexed_to in conn.execute(
+                    "SELECT name, inode, indexed_to FROM sources"
+                )
+            }
+
+            # Follow rotation (app.log renamed aside) and compression (x.log -> x.log.gz);
+            # the records, and their offsets, stay the same.
+            by_inode = {inode: name for name, (inode, _) in sources.items()}
+            for name, index in current.items():
+                if name in sources:
+                    continue
+                old = by_inode.get(index.inode)
+                if old is None or (
+                    old in current and current[old].inode == index.inode
+                ):
+                    old = name.removesuffix(".gz")
+                    if old == name or old not in sources or old in current:
+                        continue
+                self._rename(conn, old, name)
+                _, indexed_to = sources.pop(old)
+                sources[name] = (index.inode, indexed_to)
+
+            # Drop files that are gone or were replaced under the same name.
+            for name, (inode, _) in list(sources.items()):
+                index = current.get(name)
+                if index is None or index.inode != inode:
+                    conn.execute("DELETE FROM entries WHERE source = ?", (name,))
+                    conn.execute("DELETE FROM sources WHERE name = ?", (name,))
+                    del sources[name]
+
+            for name, index in current.items():
+                indexed_to = sources.get(name, (None, -1))[1]
+                records = index.records
+                new = records[records["offset"].astype("i8") > indexed_to]
+                if len(new):
+                    rows = [
+                        row
+                        for line in index.read(new["offset"].tolist())
+                        if (row := _entry_row(name, line)) is not None
+                    ]
+                    (last_id,) = conn.execute(
+                        "SELECT coalesce(max(id), 0) FROM entries WHERE source = ?",
+                        (name,),
+                    ).fetchone()
+                    self._insert(conn, rows, last_id)
+                    added += len(rows)
+                    indexed_to = int(new["offset"][-1])
+                conn.execute(
+                    "INSERT INTO sources (name, inode, indexed_to) VALUES (?, ?, ?) "
+                    "ON CONFLICT (name) DO UPDATE "
+                    "SET inode = excluded.inode, indexed_to = excluded.indexed_to",
+                    (name, index.inode, indexed_to),
+                )
+        return added
+
+    def search(
+        self,
+        query: str | None = None,
+        levels: set[str] | None = None,
+        module: str | None = None,
+        function: str | None = None,
+        start: float | None = None,
+        end: float | None = None,
+        limit: int = 50,
+        cursor: str | None = None,
+    ) -> tuple[list[str], str | None]:
+        """Search log records, newest first.
+
+        Args:
+            query: FTS5 query over the message, `extra`, module and function, e.g.
+                `"plan failed"`, `mistral AND timeout` or `extra: request_id`.
+            levels: Level names to include, or None for all levels.
+            module: Only records from this module.
+            function: Only records from this function.
+            start: Earliest timestamp to include.
+            end: Latest timestamp to include.
+            limit: Maximum number of records.
+            cursor: `next_cursor` of the previous page.
+
+        Returns:
+            tuple: (raw JSON lines, cursor of the next page or None).
+
+        Raises:
+            ValueError: If the query or cursor is malformed.
+        """
+        self._ingest_if_due()
+
+        # Time bounds and the cursor are ranges over the (time ordered) rowid.
+        key = "f.rowid" if query else "e.id"
+        conditions, params = [], []
+        if query:
+            conditions.append("entries_fts MATCH ?")
+            params.append(query)
+        if start is not None:
+            conditions.append(f"{key} >= ?")
+            params.append(_time_id(start))
+        if end is not None:
+            conditions.append(f"{key} < ?")
+            params.append(_time_id(end) + (1 << _ID_BITS))
+        if cursor:
+            conditions.append(f"{key} < ?")
+            params.append(decode_search_cursor(cursor))
+        if levels:
+            conditions.append(f"e.level IN ({', '.join('?' * len(levels))})")
+            params.extend(sorted(levels))
+        if module:
+            conditions.append("e.module = ?")
+            params.append(module)
+        if function:
+            conditions.append("e.function = ?")
+            params.append(function)
+
+        sql = (
+            "SELECT e.id, e.raw FROM entries_fts f JOIN entries e ON e.id = f.rowid"
+            if query
+            else "SELECT e.id, e.raw FROM entries e"
+        )
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        sql += f" ORDER BY {key} DESC LIMIT ?"
+        params.append(limit + 1)
+
+        with self._connect() as conn:
+            try:
+                rows = conn.execute(sql, params).fetchall()
+            except sqlite3.OperationalError as e:
+                raise ValueError(f"Invalid search query: {e}") from e
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_search_cursor(rows[-1][0])
+        return [raw for _, raw in rows], next_cursor
+
+
+log_search = LogSearch(log_index, settings.LOG_DIR / INDEX_DIR / "search.db")
@@ -0,0 +1,172 @@
+"""Shared follower of the live application log.
+
+`log_follower` polls `app.log` in one background task while anyone is subscribed, parses each new
+record once and fans it out to every subscriber's queue, so N connected dashboards cost the same
+as one. When loguru rotates the file, the rest of the old file is read through the still open
+handle before the follower switches to the new one.
+"""
+
+import asyncio
+import json
+import os
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import AsyncIterator
+
+from settings import settings
+from lib import logger
+from lib.log_index import LOG_FILE
+
+
+class LogSubscription:
+    """Queue of raw log lines matching a subscriber's level and module filters."""
+
+    def __init__(self, levels: set[str] | None, modules: set[str] | None):
+        self.levels = levels
+        self.modules = modules
+        self.queue: asyncio.Queue[str] = asyncio.Queue(
+            maxsize=settings.LOG_TAIL_QUEUE_SIZE
+        )
+        self.dropped = 0
+
+    def matches(self, record: dict) -> bool:
+        if self.levels is not None and record["level"]["name"] not in self.levels:
+            return False
+        return self.modules is None or record["module"] in self.modules
+
+    def put(self, line: str) -> None:
+        """Queue a line, dropping the oldest one if the subscriber is not keeping up."""
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(line)
+
+
+class _Tail:
+    """Read position in a log file that follows the file across rotations."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._file = None
+        self._inode = None
+        self._pending = b""
+
+    def open(self, from_end: bool) -> None:
+        try:
+            self._file = open(self.path, "rb")
+        except FileNotFoundError:
+            self._file = None
+            return
+        self._inode = os.fstat(self._file.fileno()).st_ino
+        self._pending = b""
+        if from_end:
+            self._file.seek(0, os.SEEK_END)
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def read_lines(self) -> list[bytes]:
+        """Complete lines appended since the last read."""
+        if self._file is None:
+            self.open(from_end=False)
+            if self._file is None:
+                return []
+        data = self._file.read()
+        try:
+            rotated = os.stat(self.path).st_ino != self._inode
+        except FileNotFoundError:
+            rotated = False
+        data = self._pending + data
+        if rotated:
+            # Anything written to the old file before the rename was read above.
+            self.close()
+            self.open(from_end=False)
+            if self._file is not None:
+                data += b"\n" + self._file.read()
+
+        lines = data.split(b"\n")
+        self._pending = lines.pop()
+        return [line for line in lines if line.strip()]
+
+
+class LogFollower:
+    """Follows one log file and fans new records out to subscribers."""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._subscribers: set[LogSubscription] = set()
+        self._task: asyncio.Task | None = None
+
+    def _publish(self, lines: list[bytes]) -> None:
+        for raw in lines:
+            try:
+                line = raw.decode("utf-8")
+                record = json.loads(line)["record"]
+            except (ValueError, KeyError, UnicodeDecodeError):
+                continue
+            for subscription in self._subscribers:
+                if subscription.matches(record):
+                    subscription.put(line)
+
+    async def _follow(self) -> None:
+        tail = _Tail(self.path)
+        tail.open(from_end=True)
+        try:
+            while True:
+                try:
+                    lines = await asyncio.to_thread(tail.read_lines)
+                except OSError as e:
+                    logger.warning("Failed to read {}: {}", self.path.name, e)
+                    tail.close()
+                    lines = []
+                if lines:
+                    self._publish(lines)
+                await asyncio.sleep(settings.LOG_TAIL_INTERVAL)
+        finally:
+            tail.close()
+
+    @asynccontextmanager
+    async def subscribe(
+        self, levels: set[str] | None = None, modules: set[str] | None = None
+    ) -> AsyncIterator[LogSubscription]:
+        """Receive new log records while the context is open.
+
+        Args:
+            levels: Level names to receive, or None for all levels.
+            modules: Module names to receive, or None for all modules.
+        """
+        subscription = LogSubscription(levels, modules)
+        self._subscribers.add(subscription)
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._follow())
+            logger.debug("Log follower started")
+        try:
+            yield subscription
+        finally:
+            self._subscribers.discard(subscription)
+            if not self._subscribers:
+                await self.stop()
+
+    async def stop(self) -> None:
+        """Stop following the log file."""
+        task, self._task = self._task, None
+        if task is None:
+            return
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+        logger.debug("Log follower stopped")
+
+    def stats(self) -> dict:
+        return {
+            "running": self._task is not None and not self._task.done(),
+            "subscribers": len(self._subscribers),
+            "dropped": sum(s.dropped for s in self._subscribers),
+        }
+
+
+log_follower = LogFollower(settings.LOG_DIR / LOG_FILE)
@@ -1,19 +1,44 @@
+from collections import defaultdict
 from loguru import logger
 from sys import stdout
 from pathlib import Path
 
 from settings import settings
 
-logger.remove()
-logger.add(
+_CONSOLE_FORMAT = (
+    "{time:YYYY-MM-DD at HH:mm:ss} | <level>{level}</level> | {file}:{line} | {message}"
+)
+
+# Lowest level taken by any sink added with `add_sink`, or None without sinks.
+_min_level: int | None = None
+
+
+def add_sink(sink, level: str, **kwargs) -> int:
+    """Add a loguru sink and remember its level for `sampled`; returns the sink ID."""
+    global _min_level
+    sink_id = logger.add(sink, level=level, **kwargs)
+    level_no = logger.level(level).no
+    _min_level = level_no if _min_level is None else min(_min_level, level_no)
+    return sink_id
+
+
+def remove_sinks() -> None:
+    """Remove every sink, including ones added with `add_sink`."""
+    global _min_level
+    logger.remove()
+    _min_level = None
+
+
+remove_sinks()
+add_sink(
     stdout,
-    level="DEBUG",
-    format="{time:YYYY-MM-DD at HH:mm:ss} | <level>{level}</level> | {file}:{line} | {message} | {extra}",
+    level=settings.LOG_CONSOLE_LEVEL,
+    format=_CONSOLE_FORMAT + (" | {extra}" if settings.LOG_CONSOLE_EXTRA else ""),
 )
 
-logger.add(
+add_sink(
     Path(settings.LOG_DIR) / "app.log",
-    level="INFO",
+    level=settings.LOG_FILE_LEVEL,
     format="{level} | {file}:{line} | {message}",
     rotation="3 days",
     retention="1 month",
@@ -23,4 +48,26 @@ logger.add(
     serialize=True,
 )
 
-__all__ = ["logger"]
+_sample_counts: defaultdict[str, int] = defaultdict(int)
+_DEBUG = logger.level("DEBUG").no
+
+
+def sampled(site: str, every: int | None = None) -> bool:
+    """Whether to log at a call site now: true on the first and then every `every`-th call.
+
+    Guards high-frequency debug messages, e.g. `if sampled("history.build"): logger.debug(...)`,
+    so they cost a counter increment instead of a log record on most calls, and a level check
+    when no sink takes DEBUG. Each `site` name counts separately. `every` defaults to
+    `LOG_SAMPLE_EVERY`; 1 or less logs every call.
+    """
+    if _min_level is None or _min_level > _DEBUG:
+        return False
+    every = settings.LOG_SAMPLE_EVERY if every is None else every
+    if every <= 1:
+        return True
+    count = _sample_counts[site]
+    _sample_counts[site] = count + 1
+    return count % every == 0
+
+
+__all__ = ["logger", "sampled", "add_sink", "remove_sinks"]
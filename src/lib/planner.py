@@ -0,0 +1,128 @@
+"""Deterministic local meal planner.
+
+`plan_locally` builds a `MealPlan` from the same inputs as the AI planner in a few milliseconds.
+It is used when the caller asks for it and as the fallback when the AI provider is slow or down.
+"""
+
+import random
+from datetime import date
+
+import numpy as np
+
+from models.meals import Meal, MealHistory, MealStats, MealType, SideDish
+from models.plan import MealPlan, MealPlanItem
+from lib.scoring import CATEGORIES, MealScorer
+from settings import settings
+
+
+class PlanningError(ValueError):
+    """Raised when no plan can satisfy the constraints with the given catalog."""
+
+
+def _side_dish_rotation(
+    meal_history: MealHistory, side_dishes: list[SideDish]
+) -> list[str]:
+    """Side dish names ordered from least to most recently eaten."""
+    last_eaten: dict[str, date] = {}
+    for item in meal_history.history:
+        if item.side_dish and item.date_eaten > last_eaten.get(
+            item.side_dish, date.min
+        ):
+            last_eaten[item.side_dish] = item.date_eaten
+    names = sorted({side_dish.name for side_dish in side_dishes})
+    return sorted(names, key=lambda name: last_eaten.get(name, date.min))
+
+
+def plan_locally(
+    meal_history: MealHistory,
+    meals: list[Meal],
+    side_dishes: list[SideDish],
+    days: int = 7,
+    ban_days: int | None = None,
+    today: date | None = None,
+    scorer: MealScorer | None = None,
+    meal_stats: list[MealStats] | None = None,
+) -> MealPlan:
+    """Build a meal plan without calling an AI provider.
+
+    Meals eaten inside the ban window are never picked. The plan contains at least one meal of
+    every category; the remaining days are filled by sampling without replacement, weighted by the
+    backend score (which includes `frequency_factor`). Meals with `has_side_dish` get the least
+    recently eaten side dishes in rotation, other meals get none. The random draw is seeded with
+    the date, so the same inputs on the same day give the same plan.
+
+    Args:
+        meal_history: Meal history used for the ban window and scoring.
+        meals: Meal catalog.
+        side_dishes: Side dish catalog.
+        days: Number of days to plan.
+        ban_days: Length of the ban window, defaults to `settings.PLAN_BAN_DAYS`.
+        today: Reference date, defaults to today.
+        scorer: Scorer over `meals`, e.g. the cached one of the catalog; built if not given.
+        meal_stats: `meal_stats` rows to score from, as of the database's current date.
+            `meal_history` then only needs to cover the ban window, and side dishes not
+            eaten inside it count as the least recently eaten.
+
+    Returns:
+        MealPlan: A plan with `days` items.
+
+    Raises:
+        PlanningError: If there are too few allowed meals or a category cannot be covered.
+    """
+    today = today or date.today()
+    ban_days = settings.PLAN_BAN_DAYS if ban_days is None else ban_days
+
+    scorer = scorer or MealScorer(meals)
+    if meal_stats is None:
+        score, _, _, last = scorer.score(
+            *scorer.history_arrays(meal_history.history), today=today
+        )
+    else:
+        score, _, _, last = scorer.score_stats(meal_stats)
+    candidates = np.flatnonzero((last >= ban_days) & (score > 0)).tolist()
+    if len(candidates) < days:
+        raise PlanningError(
+            f"Only {len(candidates)} meals are allowed, {days} are needed"
+        )
+
+    # Weighted random order (Efraimidis-Spirakis): sort by u ** (1 / weight).
+    rng = random.Random(today.toordinal())
+    keys = {i: rng.random() ** (1.0 / score[i]) for i in candidates}
+    order = sorted(candidates, key=keys.__getitem__, reverse=True)
+
+    chosen: list[int] = []
+    uncovered = set(range(len(CATEGORIES)))
+    while uncovered:
+        best = max(
+            (i for i in order if i not in chosen),
+            key=lambda i: int(scorer.types[i, list(uncovered)].sum()),
+            default=None,
+        )
+        covered = {c for c in uncovered if best is not None and scorer.types[best, c]}
+        if not covered:
+            missing = ", ".join(CATEGORIES[c].value for c in sorted(uncovered))
+            raise PlanningError(f"No allowed meal covers: {missing}")
+        chosen.append(best)
+        uncovered -= covered
+    chosen.extend([i for i in order if i not in chosen][: days - len(chosen)])
+    chosen = chosen[:days]
+    rng.shuffle(chosen)
+
+    rotation = _side_dish_rotation(meal_history, side_dishes)
+    plan: list[MealPlanItem] = []
+    for day, i in enumerate(chosen, start=1):
+        meal = scorer.meals[i]
+        side_dish = None
+        if meal.has_side_dish and rotation:
+            side_dish = rotation.pop(0)
+            rotation.append(side_dish)
+        plan.append(
+            MealPlanItem(
+                id=day,
+                meal_name=meal.name,
+                meal_type=[MealType(t) for t in meal.meal_types],
+                side_dish=side_dish,
+                notes=meal.notes,
+            )
+        )
+    return MealPlan(plan=plan)
@@ -0,0 +1,190 @@
+"""Backend scoring for meal candidates (S_recency, S_popularity).
+
+`MealScorer` turns the catalog into NumPy arrays once and scores every meal against the meal
+history in a single vectorized pass. The ranked, category-balanced shortlist it returns is what
+the plan prompt and the `/meals/scores` endpoint work from. The meal repository keeps one scorer
+per catalog cache generation (`get_meal_scorer`), and the endpoint scores from the per-meal
+`meal_stats` instead of the history.
+"""
+
+from datetime import date
+
+import numpy as np
+
+from models.meals import Meal, MealHistoryItem, MealStats, MealType
+from models.plan import MealScore
+from settings import settings
+
+CATEGORIES: tuple[MealType, ...] = tuple(MealType)
+_CATEGORY_INDEX = {category: i for i, category in enumerate(CATEGORIES)}
+
+# Days for S_recency to recover to ~63% after a meal was eaten.
+RECENCY_TAU_DAYS = 21.0
+# Half-weight age of a history entry when counting popularity (~ half a year).
+# `12_meal_stats_popularity.sql` uses the same half-life for `decayed_eat_count`.
+POPULARITY_HALF_LIFE_DAYS = 180.0
+# How much a fully popular meal is boosted over one that was never eaten.
+POPULARITY_WEIGHT = 0.5
+
+
+class MealScorer:
+    """Vectorized scorer over a fixed meal catalog."""
+
+    def __init__(self, meals: list[Meal]):
+        self.meals = list(meals)
+        self._index = {meal.name: i for i, meal in enumerate(self.meals)}
+        self._ids = {meal.id: i for i, meal in enumerate(self.meals)}
+        self.frequency = np.fromiter(
+            (meal.frequency_factor for meal in self.meals),
+            dtype=np.float64,
+            count=len(self.meals),
+        )
+        self.types = np.zeros((len(self.meals), len(CATEGORIES)), dtype=bool)
+        for i, meal in enumerate(self.meals):
+            for meal_type in meal.meal_types:
+                self.types[i, _CATEGORY_INDEX[MealType(meal_type)]] = True
+
+    def history_arrays(
+        self, history: list[MealHistoryItem]
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """Convert history items into (meal index, date ordinal) arrays.
+
+        Entries for meals that are no longer in the catalog are dropped.
+        """
+        index = self._index
+        pairs = [
+            (index[item.meal], item.date_eaten.toordinal())
+            for item in history
+            if item.meal in index
+        ]
+        if not pairs:
+            return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.int64)
+        arr = np.array(pairs, dtype=np.int64)
+        return arr[:, 0].astype(np.intp), arr[:, 1]
+
+    def score(
+        self,
+        meal_idx: np.ndarray,
+        eaten: np.ndarray,
+        today: date | None = None,
+    ) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """Score every meal in the catalog.
+
+        Args:
+            meal_idx: Catalog index of each history entry.
+            eaten: Date ordinal of each history entry.
+            today: Reference date, defaults to today.
+
+        Returns:
+            tuple: (score, S_recency, S_popularity, days since last eaten) arrays, one value per
+                meal. Days since eaten is `inf` for meals that were never eaten.
+        """
+        n = len(self.meals)
+        today_ord = (today or date.today()).toordinal()
+        days_ago = np.maximum(today_ord - eaten, 0).astype(np.float64)
+
+        last = np.full(n, np.inf)
+        np.minimum.at(last, meal_idx, days_ago)
+        decay = np.exp2(-days_ago / POPULARITY_HALF_LIFE_DAYS)
+        counts = np.bincount(meal_idx, weights=decay, minlength=n)
+        return self._combine(last, counts)
+
+    def score_stats(
+        self, stats: list[MealStats]
+    ) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """Score every meal in the catalog from its `meal_stats` row, as of today.
+
+        Gives the same scores as `score` over the full history, for history not dated
+        in the future, without reading it. Meals without a row are scored as never eaten.
+        """
+        n = len(self.meals)
+        last = np.full(n, np.inf)
+        counts = np.zeros(n)
+        for row in stats:
+            i = self._ids.get(row.meal_id)
+            if i is None:
+                continue
+            if row.days_since_eaten is not None:
+                last[i] = max(row.days_since_eaten, 0)
+            counts[i] = row.decayed_eat_count
+        return self._combine(last, counts)
+
+    def _combine(
+        self, last: np.ndarray, counts: np.ndarray
+    ) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """Scores from the days since each meal was eaten and its decayed eat count."""
+        n = len(self.meals)
+        recency = -np.expm1(-last / RECENCY_TAU_DAYS)
+        peak = counts.max() if n else 0.0
+        popularity = counts / peak if peak > 0 else np.zeros(n)
+
+        score = self.frequency * recency * (1.0 + POPULARITY_WEIGHT * popularity)
+        return score, recency, popularity, last
+
+    def shortlist(
+        self,
+        history: list[MealHistoryItem],
+        k: int | None = None,
+        per_category: int = 2,
+        ban_days: int | None = None,
+        today: date | None = None,
+    ) -> list[MealScore]:
+        """Return the top-k meals, guaranteeing a minimum per category.
+
+        Args:
+            history: Meal history to score against.
+            k: Shortlist size, defaults to `settings.PLAN_SHORTLIST_SIZE`.
+            per_category: Minimum number of meals from each category, where available.
+            ban_days: Meals eaten within this many days are left out entirely,
+                defaults to `settings.PLAN_BAN_DAYS`.
+            today: Reference date, defaults to today.
+
+        Returns:
+            list[MealScore]: Candidates ordered by descending score.
+        """
+        scores = self.score(*self.history_arrays(history), today=today)
+        return self._rank(scores, k, per_category, ban_days)
+
+    def shortlist_stats(
+        self,
+        stats: list[MealStats],
+        k: int | None = None,
+        per_category: int = 2,
+        ban_days: int | None = None,
+    ) -> list[MealScore]:
+        """Like `shortlist`, scoring from the `meal_stats` rows of the meals as of today."""
+        return self._rank(self.score_stats(stats), k, per_category, ban_days)
+
+    def _rank(
+        self,
+        scores: tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray],
+        k: int | None,
+        per_category: int,
+        ban_days: int | None,
+    ) -> list[MealScore]:
+        k = settings.PLAN_SHORTLIST_SIZE if k is None else k
+        ban_days = settings.PLAN_BAN_DAYS if ban_days is None else ban_days
+
+        score, recency, popularity, last = scores
+        allowed = last >= ban_days
+        order = np.argsort(-score, kind="stable")
+        order = order[allowed[order]]
+
+        picked: list[int] = []
+        for c in range(len(CATEGORIES)):
+            picked.extend(order[self.types[order, c]][:per_category].tolist())
+        selected = np.zeros(len(self.meals), dtype=bool)
+        selected[picked] = True
+        remaining = max(k - int(selected.sum()), 0)
+        selected[order[~selected[order]][:remaining]] = True
+
+        return [
+            MealScore(
+                meal=self.meals[i],
+                score=float(score[i]),
+                recency=float(recency[i]),
+                popularity=float(popularity[i]),
+                days_since_eaten=None if np.isinf(last[i]) else int(last[i]),
+            )
+            for i in order[selected[order]].tolist()
+        ]
@@ -2,19 +2,38 @@ from fastapi import FastAPI
 from contextlib import asynccontextmanager
 
 
-from routes import meal_router, log_router, backup_router
+from routes import meal_router, log_router, backup_router, metrics_router
 from lib import logger
-from db import test_connection
+from lib.ai.registry import provider_registry
+from lib.log_tail import log_follower
+from db import (
+    test_connection,
+    open_pool,
+    close_pool,
+    open_async_pool,
+    close_async_pool,
+    start_catalog_listener,
+    stop_catalog_listener,
+)
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     logger.info("Starting application...")
+    open_pool()
+    await open_async_pool()
     if not test_connection():
         logger.error("Database connection failed")
         exit(1)
+    start_catalog_listener()
+    provider_registry.open()
     yield
     logger.info("Shutting down application...")
+    await log_follower.stop()
+    await provider_registry.aclose()
+    await stop_catalog_listener()
+    await close_async_pool()
+    close_pool()
 
 
 app = FastAPI(lifespan=lifespan)
@@ -22,6 +41,7 @@ app = FastAPI(lifespan=lifespan)
 app.include_router(meal_router)
 app.include_router(log_router)
 app.include_router(backup_router)
+app.include_router(metrics_router)
 
 
 @app.get("/")
@@ -0,0 +1,54 @@
+from datetime import datetime
+from enum import Enum
+
+from pydantic import BaseModel, Field
+
+
+class BackupKind(str, Enum):
+    FULL = "full"
+    DELTA = "delta"
+
+
+class BackupTable(BaseModel):
+    rows: int = Field(0, description="Number of rows in the table's section.")
+    sha256: str = Field(
+        "", description="SHA-256 of the section's NDJSON lines, uncompressed."
+    )
+    total: int | None = Field(
+        None, description="Rows in the table when the backup was taken."
+    )
+    watermark: int | datetime | None = Field(
+        None,
+        description="Highest `updated_at` (meals, side dishes) or id (meal history) "
+        "when the backup was taken; the next delta starts from it.",
+    )
+    ids: list[int] | None = Field(
+        None,
+        description="Ids in the table when the backup was taken, for tables whose "
+        "deletions a delta must carry.",
+    )
+
+
+class BackupManifest(BaseModel):
+    format: str = Field(description="Backup format identifier.")
+    version: int = Field(description="Backup format version.")
+    kind: BackupKind = Field(
+        BackupKind.FULL,
+        description="A full backup, or a delta holding the changes since `parent`.",
+    )
+    parent: str | None = Field(
+        None, description="File name of the backup a delta applies on top of."
+    )
+    created_at: datetime = Field(description="When the backup was taken (UTC).")
+    restore_epoch: int = Field(
+        0,
+        description="Restores of the database before the backup was taken; a delta only "
+        "applies on top of a backup from the same epoch.",
+    )
+    tables: dict[str, BackupTable] = Field(
+        default_factory=dict, description="Row count and checksum per table."
+    )
+    file: str | None = Field(None, description="Name of the backup file.")
+    file_sha256: str | None = Field(
+        None, description="SHA-256 of the backup file as written to disk."
+    )
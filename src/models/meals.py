@@ -58,3 +58,46 @@ class MealHistoryItem(BaseModel):
 
 class MealHistory(BaseModel):
     history: list[MealHistoryItem] = Field(..., description="History of meals eaten.")
+    next_cursor: str | None = Field(
+        default=None,
+        description="Cursor of the next page, if the history was requested in pages.",
+    )
+
+
+class MealStats(BaseModel):
+    meal_id: int = Field(description="ID of the meal.")
+    meal: str = Field(description="Name of the meal.")
+    eat_count: int = Field(description="Number of times the meal has been eaten.")
+    first_eaten: date | None = Field(
+        default=None, description="First date the meal was eaten."
+    )
+    last_eaten: date | None = Field(
+        default=None, description="Last date the meal was eaten."
+    )
+    days_since_eaten: int | None = Field(
+        default=None, description="Days since the meal was last eaten."
+    )
+    mean_interval_days: float | None = Field(
+        default=None,
+        description="Mean number of days between consecutive times the meal was eaten.",
+    )
+    eaten_last_4_weeks: int = Field(description="Times eaten in the last 4 weeks.")
+    eaten_last_12_weeks: int = Field(description="Times eaten in the last 12 weeks.")
+    eaten_last_52_weeks: int = Field(description="Times eaten in the last 52 weeks.")
+    decayed_eat_count: float = Field(
+        0.0,
+        description="Times eaten, each weighted by half for every 180 days since; "
+        "the popularity the candidate scores are based on.",
+    )
+
+
+class MealHistoryImportError(BaseModel):
+    index: int = Field(description="Position of the rejected item in the upload.")
+    error: str = Field(description="Why the item was rejected.")
+
+
+class MealHistoryImportResult(BaseModel):
+    inserted: int = Field(description="Number of history items stored.")
+    errors: list[MealHistoryImportError] = Field(
+        default_factory=list, description="Items that were rejected."
+    )
@@ -1,6 +1,6 @@
 from pydantic import BaseModel, Field
 
-from .meals import MealType
+from .meals import Meal, MealType
 
 
 class MealPlanItem(BaseModel):
@@ -13,3 +13,30 @@ class MealPlanItem(BaseModel):
 
 class MealPlan(BaseModel):
     plan: list[MealPlanItem] = Field(description="Meal plan for the week.")
+
+
+class MealScore(BaseModel):
+    meal: Meal = Field(description="Candidate meal.")
+    score: float = Field(description="Combined ranking score (higher is better).")
+    recency: float = Field(description="S_recency: 0 when just eaten, 1 when long ago.")
+    popularity: float = Field(
+        description="S_popularity: relative, time-decayed eat count."
+    )
+    days_since_eaten: int | None = Field(
+        description="Days since the meal was last eaten, None if never."
+    )
+
+
+class PlanPrompt(BaseModel):
+    text: str = Field(description="Rendered system prompt.")
+    section_tokens: dict[str, int] = Field(
+        description="Estimated token count per prompt section."
+    )
+    total_tokens: int = Field(description="Estimated token count of the whole prompt.")
+    token_budget: int = Field(description="Token budget the prompt was built for.")
+    dropped_meals: int = Field(
+        default=0, description="Lowest-ranked candidates left out to fit the budget."
+    )
+    notes_dropped: bool = Field(
+        default=False, description="Whether meal notes were left out to fit the budget."
+    )
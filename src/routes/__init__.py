@@ -1,5 +1,6 @@
 from .meals import meal_router
 from .logs import log_router
 from .backup import router as backup_router
+from .metrics import metrics_router
 
-__all__ = ["meal_router", "log_router", "backup_router"]
+__all__ = ["meal_router", "log_router", "backup_router", "metrics_router"]
@@ -1,16 +1,84 @@
 """Backup and restore endpoints for the meal planner application."""
 
-from fastapi import APIRouter, HTTPException
-from fastapi.responses import FileResponse
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import StreamingResponse
+
+from lib import logger
+from lib.backup import (
+    compact_backups,
+    iter_backup,
+    iter_gzip,
+    list_backups,
+    new_backup_manifest,
+    read_manifest,
+    restore_backup,
+    restore_backup_chain,
+)
+from models.backup import BackupManifest
 
 router = APIRouter(prefix="/api/backup", tags=["backup"])
 
 
+@router.get("/", response_model=list[BackupManifest])
+def get_backups() -> list[BackupManifest]:
+    """List the stored backups, full and incremental, oldest first."""
+    return [manifest for _, manifest in list_backups()]
+
+
 @router.get("/export")
-def export_data() -> FileResponse:
-    raise HTTPException(status_code=501, detail="Not implemented")
+def export_data() -> StreamingResponse:
+    """Download a gzipped backup of the current database state.
+
+    The backup is produced while it is sent, in the format written by `create_backup`.
+    """
+    manifest = new_backup_manifest(gz=True)
+    return StreamingResponse(
+        iter_gzip(iter_backup(manifest)),
+        media_type="application/gzip",
+        headers={"Content-Disposition": f'attachment; filename="{manifest.file}"'},
+    )
+
+
+@router.post("/import", response_model=BackupManifest)
+async def import_data(request: Request) -> BackupManifest:
+    """Restore a backup sent as the request body, gzipped or plain.
+
+    The meals, side dishes and meal history are replaced in one transaction once the whole
+    backup has been received and verified against its manifest; on any error the database
+    is left as it was.
+    """
+    try:
+        return await restore_backup(request.stream())
+    except ValueError as e:
+        logger.warning("Rejected backup import: {}", e)
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.post("/restore/{name}", response_model=BackupManifest)
+async def restore_stored_backup(name: str) -> BackupManifest:
+    """Restore a stored backup by file name, replaying the chain of a delta.
+
+    The tables are replaced as by `/import`; on any error the database is left as it was.
+    """
+    backups = {path.name: path for path, _ in list_backups()}
+    if name not in backups:
+        raise HTTPException(status_code=404, detail=f"Backup {name} not found")
+    try:
+        return await restore_backup_chain(backups[name])
+    except ValueError as e:
+        logger.warning("Cannot restore backup {}: {}", name, e)
+        raise HTTPException(status_code=400, detail=str(e))
+
 
+@router.post("/compact", response_model=BackupManifest | None)
+def compact() -> BackupManifest | None:
+    """Merge the newest backup chain into a full backup and remove old backups.
 
-@router.post("/import")
-def import_data() -> FileResponse:
-    raise HTTPException(status_code=501, detail="Not implemented")
+    Returns the manifest of the new full backup, or null if the newest backup already is one.
+    """
+    try:
+        compacted = compact_backups()
+    except ValueError as e:
+        logger.warning("Cannot compact backups: {}", e)
+        raise HTTPException(status_code=400, detail=str(e))
+    return read_manifest(compacted) if compacted else None
@@ -1,11 +1,23 @@
-from fastapi import APIRouter, HTTPException
-from pathlib import Path
-from typing import Any
+import asyncio
+from datetime import datetime
 from enum import Enum
 
+from fastapi import (
+    APIRouter,
+    HTTPException,
+    Query,
+    Request,
+    Response,
+    WebSocket,
+    WebSocketDisconnect,
+)
+from fastapi.responses import StreamingResponse
+
 from models.logs import LogEntry
-from settings import settings
 from lib import logger
+from lib.log_index import log_index
+from lib.log_search import log_search
+from lib.log_tail import log_follower
 
 log_router = APIRouter(prefix="/logs", tags=["Logs"])
 
@@ -19,56 +31,194 @@ class LogLevel(Enum):
     CRITICAL = "CRITICAL"
 
 
-def read_logs() -> list[dict[str, Any]]:
-    """Read and parse log file into a list of log entries."""
-    log_file = Path(settings.LOG_DIR) / "app.log"
-    if not log_file.exists():
-        return []
+def read_logs(
+    levels: set[str] | None = None,
+    start: datetime | None = None,
+    end: datetime | None = None,
+    limit: int | None = None,
+    cursor: str | None = None,
+    current_only: bool = False,
+) -> tuple[list[tuple[str, LogEntry]], str | None]:
+    """Read log entries from the current and rotated log files through the log index.
+
+    With `current_only`, the rotated files are left out.
 
+    Returns:
+        tuple: ((level name, entry) of each record, oldest first, and the next page's cursor).
+
+    Raises:
+        ValueError: If the cursor is malformed.
+    """
+    lines, next_cursor = log_index.query(
+        levels=levels,
+        start=start.timestamp() if start else None,
+        end=end.timestamp() if end else None,
+        limit=limit,
+        cursor=cursor,
+        current_only=current_only,
+    )
     logs = []
-    with open(log_file, "r") as f:
-        for line in f:
-            line = line.strip()
-            if not line:
-                continue
-            try:
-                log_entry = LogEntry.model_validate_json(line)
-                logs.append(log_entry.model_dump())
-            except Exception as e:
-                logger.warning(f"Failed to parse log line: {e}")
-    return logs
+    for level, line in lines:
+        try:
+            logs.append((level, LogEntry.model_validate_json(line)))
+        except Exception as e:
+            logger.warning("Failed to parse log line: {}", e)
+    return logs, next_cursor
 
 
 @log_router.get("/")
-async def get_logs():
-    """Get all logs grouped by level."""
+def get_logs(start: datetime | None = None, end: datetime | None = None):
+    """Get logs grouped by level, optionally limited to a time range.
+
+    Without `start` only the live log file is read; the rotated archives are searched only
+    when `start` is given. Use `/logs/{level}` with `limit` to page through all of them.
+    """
+    levels = ["DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"]
     try:
-        entries = read_logs()
-        return {
-            "levels": {
-                level.lower(): [
-                    e for e in entries if e["record"]["level"]["name"] == level
-                ]
-                for level in ["DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"]
-            }
-        }
+        entries, _ = read_logs(set(levels), start, end, current_only=start is None)
     except Exception as e:
-        logger.error(f"Error reading logs: {e}")
+        logger.error("Error reading logs: {}", e)
         raise HTTPException(status_code=500, detail="Failed to read logs")
 
+    grouped = {level.lower(): [] for level in levels}
+    for level, entry in entries:
+        grouped[level.lower()].append(entry)
+    return {"levels": grouped}
+
+
+def _tail_filters(
+    level: list[LogLevel] | None, module: list[str] | None
+) -> tuple[set[str] | None, set[str] | None]:
+    levels = {l.value for l in level} if level else None
+    if levels and LogLevel.ALL.value in levels:
+        levels = None
+    return levels, set(module) if module else None
+
+
+@log_router.get("/stream")
+async def stream_logs(
+    request: Request,
+    level: list[LogLevel] | None = Query(None),
+    module: list[str] | None = Query(None),
+):
+    """Follow new log entries as Server-Sent Events.
+
+    Each entry is sent as a `log` event with the serialized `LogEntry`. `level` and `module`
+    can be repeated to receive only some levels or modules. A comment is sent every
+    15 seconds while nothing is logged, to keep the connection open.
+    """
+    levels, modules = _tail_filters(level, module)
+
+    async def events():
+        async with log_follower.subscribe(levels, modules) as subscription:
+            while not await request.is_disconnected():
+                try:
+                    line = await asyncio.wait_for(subscription.queue.get(), 15.0)
+                except TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                yield f"event: log\ndata: {line}\n\n"
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@log_router.websocket("/ws")
+async def stream_logs_ws(
+    websocket: WebSocket,
+    level: list[LogLevel] | None = Query(None),
+    module: list[str] | None = Query(None),
+):
+    """Follow new log entries over a WebSocket, one serialized `LogEntry` per message.
+
+    Takes the same filters as `/logs/stream`.
+    """
+    levels, modules = _tail_filters(level, module)
+    await websocket.accept()
+    try:
+        async with log_follower.subscribe(levels, modules) as subscription:
+            while True:
+                await websocket.send_text(await subscription.queue.get())
+    except WebSocketDisconnect:
+        pass
+
+
+@log_router.get("/search", response_model=list[LogEntry])
+def search_logs(
+    response: Response,
+    q: str | None = None,
+    level: list[LogLevel] | None = Query(None),
+    module: str | None = None,
+    function: str | None = None,
+    start: datetime | None = None,
+    end: datetime | None = None,
+    limit: int = Query(50, ge=1, le=1000),
+    cursor: str | None = None,
+):
+    """Full-text search over the current and rotated logs, newest first.
+
+    `q` is an SQLite FTS5 query over the message, the `extra` fields, the module and the
+    function, e.g. `plan AND timeout`, `"failed to read"` or `extra: request_id`. `module` and
+    `function` match exactly. The cursor of the next page is returned in the `X-Next-Cursor`
+    header.
+    """
+    levels, _ = _tail_filters(level, None)
+    try:
+        lines, next_cursor = log_search.search(
+            q,
+            levels,
+            module,
+            function,
+            start.timestamp() if start else None,
+            end.timestamp() if end else None,
+            limit,
+            cursor,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error("Error searching logs: {}", e)
+        raise HTTPException(status_code=500, detail="Failed to search logs")
+
+    entries = []
+    for line in lines:
+        try:
+            entries.append(LogEntry.model_validate_json(line))
+        except Exception as e:
+            logger.warning("Failed to parse log line: {}", e)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return entries
+
 
 @log_router.get("/{level}", response_model=list[LogEntry])
-async def get_logs_by_level(level: LogLevel):
-    """Get logs for a specific level (debug, info, warning, error, critical)."""
-    level = level.value
-    if level not in ["ALL", "DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"]:
-        raise HTTPException(status_code=400, detail="Invalid log level")
+def get_logs_by_level(
+    level: LogLevel,
+    response: Response,
+    start: datetime | None = None,
+    end: datetime | None = None,
+    limit: int | None = Query(None, ge=1, le=10000),
+    cursor: str | None = None,
+):
+    """Get logs for a specific level (debug, info, warning, error, critical), oldest first.
 
+    `start` and `end` limit the logs to a time range. With `limit`, logs are returned in pages;
+    the cursor of the next page is returned in the `X-Next-Cursor` header.
+    """
+    level = level.value
     try:
-        entries = read_logs()
-        if level == "ALL":
-            return entries
-        return {level: [e for e in entries if e["record"]["level"]["name"] == level]}
+        entries, next_cursor = read_logs(
+            None if level == "ALL" else {level}, start, end, limit, cursor
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
-        logger.error(f"Error reading {level} logs: {e}")
+        logger.error("Error reading {} logs: {}", level, e)
         raise HTTPException(status_code=500, detail=f"Failed to read {level} logs")
+
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return [entry for _, entry in entries]
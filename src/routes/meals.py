@@ -1,104 +1,463 @@
-from fastapi import APIRouter, HTTPException
+import asyncio
+import codecs
+import json
+from contextlib import aclosing
+from datetime import date, timedelta
+from enum import Enum
+from typing import AsyncIterator
 
-from models.meals import Meal, MealHistoryItem, SideDish, MealHistory
-from db.repositories.meal import MealRepository
-from db.repositories.side_dish import SideDishRepository
-from db.repositories.meal_history import MealHistoryRepository
+from fastapi import APIRouter, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
+
+from pydantic import ValidationError
+from pydantic_core import to_json
+
+from models.meals import (
+    Meal,
+    MealHistoryItem,
+    SideDish,
+    MealHistory,
+    MealHistoryImportError,
+    MealHistoryImportResult,
+    MealStats,
+)
+from models.plan import MealPlan, MealScore
+from db import async_unit_of_work
+from db.repositories.meal import AsyncMealRepository
+from db.repositories.side_dish import AsyncSideDishRepository
+from db.repositories.meal_history import (
+    AsyncMealHistoryRepository,
+    decode_history_cursor,
+)
 from lib import logger
+from lib.planner import PlanningError, plan_locally
+from lib.scoring import MealScorer
+from settings import settings
 
 meal_router = APIRouter(prefix="/meals", tags=["meals"])
 
+
+class Planner(Enum):
+    AUTO = "auto"
+    AI = "ai"
+    LOCAL = "local"
+
+
+class HistoryFormat(Enum):
+    JSON = "json"
+    NDJSON = "ndjson"
+
+
 # Initialize repositories
-meal_repo = MealRepository()
-side_dish_repo = SideDishRepository()
-meal_history_repo = MealHistoryRepository()
+meal_repo = AsyncMealRepository()
+side_dish_repo = AsyncSideDishRepository()
+meal_history_repo = AsyncMealHistoryRepository()
+
+# Characters a single uploaded history item may take; a larger one is not a history item.
+_UPLOAD_ITEM_MAX_CHARS = 1 << 16
+
+
+def _json_response(content: bytes) -> Response:
+    """Send JSON encoded from models built by the repositories.
+
+    Returning a `Response` skips the validation and encoding FastAPI would otherwise apply for
+    the route's `response_model`, which stays in place for the API schema.
+    """
+    return Response(content, media_type="application/json")
 
 
 @meal_router.get("/", response_model=list[Meal])
 async def get_meals():
     """Get all meals from the database."""
-    meals = meal_repo.get_all_meals()
+    meals = await meal_repo.get_all_meals_json()
     if meals is None:
         raise HTTPException(
             status_code=500, detail="Failed to fetch meals from the database"
         )
-    return meals
+    return _json_response(meals)
 
 
 @meal_router.get("/side_dishes", response_model=list[SideDish])
 async def get_side_dishes():
     """Get all side dishes from the database."""
-    side_dishes = side_dish_repo.get_all_side_dishes()
+    side_dishes = await side_dish_repo.get_all_side_dishes_json()
     if side_dishes is None:
         raise HTTPException(
             status_code=500, detail="Failed to fetch side dishes from the database"
         )
-    return side_dishes
+    return _json_response(side_dishes)
 
 
 @meal_router.get("/meal_history", response_model=MealHistory)
-async def get_meal_history():
-    """Get the complete meal history from the database.
+async def get_meal_history(
+    date_from: date | None = Query(None, alias="from"),
+    date_to: date | None = Query(None, alias="to"),
+    limit: int | None = Query(None, ge=1, le=1000),
+    cursor: str | None = None,
+    format: HistoryFormat = HistoryFormat.JSON,
+):
+    """Get the meal history from the database, newest first.
+
+    `from` and `to` limit the history to a date range. With `limit`, the history is returned
+    in pages: pass the `next_cursor` of a page as `cursor` to get the next one.
+    `format=ndjson` streams one `MealHistoryItem` per line instead, from a server-side cursor,
+    for exporting long histories.
 
     Returns:
         MealHistory: A MealHistory object containing the meal history items.
         Returns an empty list if no history is found.
     """
+    if format == HistoryFormat.NDJSON:
+        if cursor:
+            try:
+                decode_history_cursor(cursor)
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+
+        async def lines():
+            async with aclosing(
+                meal_history_repo.stream_meal_history(date_from, date_to, limit, cursor)
+            ) as items:
+                async for item in items:
+                    yield to_json(item) + b"\n"
+
+        return StreamingResponse(lines(), media_type="application/x-ndjson")
+
     try:
-        meal_history = meal_history_repo.get_all_meal_history()
-        return meal_history
+        return _json_response(
+            await meal_history_repo.get_meal_history_json(
+                date_from, date_to, limit, cursor
+            )
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
-        logger.error(f"Error fetching meal history: {e}")
+        logger.error("Error fetching meal history: {}", e)
         # Return empty meal history on error to maintain consistent response format
         return MealHistory(history=[])
 
 
 @meal_router.post("/meal_history", response_model=MealHistoryItem)
 async def add_meal_history(meal_history: MealHistoryItem):
-    """Add a new meal history item to the database."""
-    try:
-        # TODO: Validate meal and side dish exist in the database
-
-        meal = meal_repo.get_meal_by_name(meal_history.meal)
-        if meal is None:
-            raise HTTPException(status_code=404, detail="Meal not found")
+    """Add a new meal history item to the database.
 
-        if meal_history.side_dish is not None:
-            side_dish = side_dish_repo.get_side_dish_by_name(meal_history.side_dish)
-            if side_dish is None:
-                raise HTTPException(status_code=404, detail="Side dish not found")
+    The lookups and the insert run on one connection in one transaction.
+    """
+    try:
+        async with async_unit_of_work() as session:
+            if meal_history.side_dish is not None:
+                side_dish = await AsyncSideDishRepository(
+                    session
+                ).get_side_dish_by_name(meal_history.side_dish)
+                if side_dish is None:
+                    raise HTTPException(status_code=404, detail="Side dish not found")
 
-        meal_history_repo.add_meal_history(meal_history)
+            await AsyncMealHistoryRepository(session).add_meal_history(meal_history)
         return meal_history
+    except HTTPException:
+        raise
     except Exception as e:
-        logger.error(f"Error adding meal history: {e}")
+        logger.error("Error adding meal history: {}", e)
         raise HTTPException(status_code=500, detail="Failed to add meal history")
 
 
+async def _iter_json_array(chunks: AsyncIterator[bytes]) -> AsyncIterator[object]:
+    """Yield the items of a JSON array as the body arrives, holding one item at a time.
+
+    Raises:
+        ValueError: If the body is not a JSON array or an item is malformed.
+    """
+    decoder = json.JSONDecoder()
+    text = codecs.getincrementaldecoder("utf-8")()
+    buffer, pos, state, ended = "", 0, "start", False
+
+    async def more() -> bool:
+        nonlocal buffer, pos
+        chunk = await anext(chunks, None)
+        buffer = buffer[pos:] + text.decode(chunk or b"", final=chunk is None)
+        pos = 0
+        return chunk is not None
+
+    while True:
+        pos = json.decoder.WHITESPACE.match(buffer, pos).end()
+        if pos == len(buffer):
+            if ended:
+                break
+            ended = not await more()
+            continue
+        char = buffer[pos]
+        if state == "start":
+            if char != "[":
+                raise ValueError("Expected a JSON array of meal history items")
+            pos, state = pos + 1, "first"
+        elif state in ("first", "next") and char == "]":
+            pos, state = pos + 1, "end"
+        elif state == "next":
+            if char != ",":
+                raise ValueError("Expected ',' or ']' after an array item")
+            pos, state = pos + 1, "item"
+        elif state in ("first", "item"):
+            try:
+                item, end = decoder.raw_decode(buffer, pos)
+                after = json.decoder.WHITESPACE.match(buffer, end).end()
+                complete = after < len(buffer) and buffer[after] in ",]"
+            except json.JSONDecodeError:
+                end, complete = None, False
+            # An item is only known to be whole once a delimiter follows it: "12" may be the
+            # start of "12.5", and an item cut by a chunk boundary does not decode yet.
+            if not (complete or ended) and len(buffer) - pos <= _UPLOAD_ITEM_MAX_CHARS:
+                ended = not await more()
+                continue
+            if end is None:
+                decoder.raw_decode(buffer, pos)
+            pos, state = end, "next"
+            yield item
+        else:
+            raise ValueError("Unexpected data after the JSON array")
+    if state != "end":
+        raise ValueError("Unexpected end of the JSON array")
+
+
+async def _read_history_upload(request: Request) -> list[MealHistoryItem | str]:
+    """Parse an uploaded JSON array or NDJSON stream of history items.
+
+    Returns one entry per uploaded item: the parsed item, or why it could not be parsed.
+    """
+
+    def parse(raw) -> MealHistoryItem | str:
+        try:
+            return MealHistoryItem.model_validate(raw)
+        except ValidationError as e:
+            return "; ".join(
+                f"{'.'.join(map(str, err['loc'])) or 'item'}: {err['msg']}"
+                for err in e.errors()
+            )
+
+    def check_size(count: int) -> None:
+        if count > settings.HISTORY_IMPORT_MAX_ROWS:
+            raise HTTPException(
+                status_code=413,
+                detail=f"At most {settings.HISTORY_IMPORT_MAX_ROWS} items per upload",
+            )
+
+    if "ndjson" in request.headers.get("content-type", ""):
+        parsed: list[MealHistoryItem | str] = []
+        buffer = b""
+        async for chunk in request.stream():
+            buffer += chunk
+            *lines, buffer = buffer.split(b"\n")
+            for line in lines:
+                if line.strip():
+                    try:
+                        parsed.append(parse(json.loads(line)))
+                    except ValueError as e:
+                        parsed.append(f"Invalid JSON: {e}")
+            check_size(len(parsed))
+        if buffer.strip():
+            try:
+                parsed.append(parse(json.loads(buffer)))
+            except ValueError as e:
+                parsed.append(f"Invalid JSON: {e}")
+        check_size(len(parsed))
+        return parsed
+
+    # Counted as it is parsed, so an upload over the limit is refused before it is read whole.
+    parsed = []
+    try:
+        async for raw in _iter_json_array(aiter(request.stream())):
+            parsed.append(parse(raw))
+            check_size(len(parsed))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid JSON: {e}")
+    return parsed
+
+
+@meal_router.post("/meal_history/bulk", response_model=MealHistoryImportResult)
+async def import_meal_history(request: Request, atomic: bool = False):
+    """Add many meal history items at once.
+
+    The body is a JSON array of `MealHistoryItem`s, or one item per line with
+    `Content-Type: application/x-ndjson`. Names are resolved in one query and the rows are
+    loaded with `COPY` in a single transaction. Items that are invalid or name an unknown
+    meal or side dish are skipped and reported by their position in the upload; with
+    `atomic=true` nothing is stored if any item is rejected.
+    """
+    parsed = await _read_history_upload(request)
+    errors = [
+        MealHistoryImportError(index=index, error=entry)
+        for index, entry in enumerate(parsed)
+        if isinstance(entry, str)
+    ]
+    positions = [i for i, entry in enumerate(parsed) if not isinstance(entry, str)]
+    items = [parsed[i] for i in positions]
+    if errors and atomic:
+        return MealHistoryImportResult(inserted=0, errors=errors)
+
+    try:
+        inserted, rejected = await meal_history_repo.import_meal_history(
+            items, atomic=atomic
+        )
+    except Exception as e:
+        logger.error("Error importing meal history: {}", e)
+        raise HTTPException(status_code=500, detail="Failed to import meal history")
+
+    errors += [
+        MealHistoryImportError(index=positions[i], error=error) for i, error in rejected
+    ]
+    errors.sort(key=lambda error: error.index)
+    logger.info("Imported {} meal history items, rejected {}", inserted, len(errors))
+    return MealHistoryImportResult(inserted=inserted, errors=errors)
+
+
+@meal_router.get("/scores", response_model=list[MealScore])
+async def get_meal_scores(k: int | None = None, per_category: int = 2):
+    """Get the ranked, category-balanced candidate shortlist used for planning."""
+    scorer = await meal_repo.get_meal_scorer()
+    if scorer is None:
+        raise HTTPException(
+            status_code=500, detail="Failed to fetch meals from the database"
+        )
+    try:
+        stats = await meal_history_repo.get_meal_stats()
+    except Exception as e:
+        logger.error("Error fetching meal stats: {}", e)
+        raise HTTPException(status_code=500, detail="Failed to fetch meal stats")
+    return scorer.shortlist_stats(stats, k=k, per_category=per_category)
+
+
+@meal_router.get("/stats", response_model=list[MealStats])
+async def get_meal_stats():
+    """Get when each meal was last eaten and how often, most recently eaten first.
+
+    Counts cover the whole history and rolling windows of 4, 12 and 52 weeks ending today.
+    """
+    try:
+        return _json_response(to_json(await meal_history_repo.get_meal_stats()))
+    except Exception as e:
+        logger.error("Error fetching meal stats: {}", e)
+        raise HTTPException(status_code=500, detail="Failed to fetch meal stats")
+
+
+async def _load_plan_inputs() -> (
+    tuple[MealHistory, list[Meal], list[SideDish], MealScorer | None, list[MealStats]]
+):
+    """Load what planning needs without reading the whole history.
+
+    Candidates are scored from the per-meal `meal_stats`, so only the history inside the
+    ban window is fetched, for the banned meals and the side dish rotation.
+    """
+    date_from = date.today() - timedelta(days=settings.PLAN_BAN_DAYS - 1)
+    try:
+        meal_history = await meal_history_repo.get_meal_history(date_from=date_from)
+        meal_stats = await meal_history_repo.get_meal_stats()
+    except Exception as e:
+        logger.error("Error fetching meal history for planning: {}", e)
+        raise HTTPException(status_code=500, detail="Failed to fetch meal history")
+    meals = await meal_repo.get_all_meals() or []
+    side_dishes = await side_dish_repo.get_all_side_dishes() or []
+    scorer = await meal_repo.get_meal_scorer()
+    return meal_history, meals, side_dishes, scorer, meal_stats
+
+
+def _sse(event: str, data: str) -> str:
+    return f"event: {event}\ndata: {data}\n\n"
+
+
+@meal_router.get("/plan", response_model=MealPlan)
+async def get_plan(
+    response: Response, planner: Planner = Planner.AUTO, refresh: bool = False
+):
+    """Generate a 7-day meal plan.
+
+    `planner=ai` always asks the AI provider and waits for it, `planner=local` uses the
+    deterministic local planner, and `planner=auto` (default) asks the AI provider but falls
+    back to the local planner if it fails or takes longer than `PLAN_AI_TIMEOUT` seconds. The planner that
+    produced the plan is returned in the `X-Planner` header.
+
+    AI plans are cached for identical inputs; `refresh=true` bypasses the cache and replaces
+    the cached plan.
+    """
+    from lib.ai import get_plan_async
+
+    meal_history, meals, side_dishes, scorer, meal_stats = await _load_plan_inputs()
+
+    if planner != Planner.LOCAL:
+        try:
+            plan = await asyncio.wait_for(
+                get_plan_async(
+                    meal_history,
+                    meals,
+                    side_dishes,
+                    refresh=refresh,
+                    scorer=scorer,
+                    meal_stats=meal_stats,
+                ),
+                # An explicit AI request waits for the provider; only the fallback is timed.
+                timeout=None if planner == Planner.AI else settings.PLAN_AI_TIMEOUT,
+            )
+            response.headers["X-Planner"] = Planner.AI.value
+            return plan
+        except Exception as e:
+            if planner == Planner.AI:
+                raise
+            if isinstance(e, TimeoutError):
+                e = f"no plan within {settings.PLAN_AI_TIMEOUT}s"
+            logger.warning("AI planner unavailable, using local planner: {}", e)
+
+    try:
+        plan = plan_locally(
+            meal_history, meals, side_dishes, scorer=scorer, meal_stats=meal_stats
+        )
+    except PlanningError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    response.headers["X-Planner"] = Planner.LOCAL.value
+    return plan
+
+
+@meal_router.get("/plan/stream")
+async def stream_meal_plan(request: Request):
+    """Stream a 7-day meal plan from the AI provider as Server-Sent Events.
+
+    Emits an `item` event with each `MealPlanItem` as soon as the model has written it, then
+    a `plan` event with the validated `MealPlan`. Provider failures after the stream has
+    started are reported as an `error` event. If the client disconnects, the upstream
+    request is aborted.
+    """
+    from lib.ai import get_plan_agent, get_plan_prompt, stream_plan
+
+    system_prompt = get_plan_prompt(*await _load_plan_inputs())
+    agent = get_plan_agent()
+
+    async def events():
+        try:
+            async with aclosing(stream_plan(agent, system_prompt)) as outputs:
+                async for output in outputs:
+                    if await request.is_disconnected():
+                        logger.info("Client disconnected, aborting plan stream")
+                        return
+                    event = "plan" if isinstance(output, MealPlan) else "item"
+                    yield _sse(event, output.model_dump_json())
+        except HTTPException as e:
+            yield _sse(
+                "error", json.dumps({"status_code": e.status_code, "detail": e.detail})
+            )
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 @meal_router.get("/{meal_id}", response_model=Meal)
 async def get_meal(meal_id: int):
     """Get a specific meal by ID from the database."""
-    meal = meal_repo.get_meal_by_id(meal_id)
+    meal = await meal_repo.get_meal_by_id(meal_id)
     if meal is None:
         raise HTTPException(status_code=404, detail="Meal not found")
     return meal
 
 
-@meal_router.get("/plan")
-def get_plan():
-    from lib.ai import get_plan
-
-    # from lib.prompts import system_prompt
-    # from fastapi.responses import PlainTextResponse
-
-    # meal_history = get_meal_history()
-    # all_foods = get_meals()
-    # side_dishes = get_side_dishes()
-    # return PlainTextResponse(system_prompt(meal_history, all_foods, side_dishes))
-    plan = get_plan()
-    return plan
-
-
 @meal_router.get("/temp/")
 def get_temp():
     from fastapi.responses import JSONResponse
@@ -0,0 +1,38 @@
+"""Monitoring endpoints for the meal planner application."""
+
+from fastapi import APIRouter
+
+from db import get_pool_stats, catalog_cache
+from lib.ai import plan_cache, plan_router, provider_guard
+
+metrics_router = APIRouter(prefix="/metrics", tags=["Metrics"])
+
+
+@metrics_router.get("/db")
+def get_db_metrics():
+    """Get connection pool statistics (in use, waiting, checkout latency)."""
+    return get_pool_stats()
+
+
+@metrics_router.get("/cache")
+def get_cache_metrics():
+    """Get catalog cache hit/miss counters."""
+    return catalog_cache.stats()
+
+
+@metrics_router.get("/ai")
+def get_ai_metrics():
+    """Get rolling latency, error rate and hedging counters per AI provider."""
+    return plan_router.stats()
+
+
+@metrics_router.get("/ai/limits")
+def get_ai_limit_metrics():
+    """Get rate limiter, circuit breaker and retry state per AI provider."""
+    return provider_guard.stats()
+
+
+@metrics_router.get("/ai/cache")
+def get_ai_cache_metrics():
+    """Get AI plan cache hit/miss and request coalescing counters."""
+    return plan_cache.stats()
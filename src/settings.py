@@ -13,6 +13,17 @@ class Settings(BaseSettings):
     APP_PORT: int = Field(8000, env="APP_PORT")
     DATA_DIR: Path = Field(Path(__file__).parent / "data", env="DATA_DIR")
     LOG_DIR: Path = Field(Path(__file__).parent / "data" / "logs", env="LOG_DIR")
+    # Seconds between checks of app.log for the live tail, and lines buffered per client
+    LOG_TAIL_INTERVAL: float = Field(0.5, env="LOG_TAIL_INTERVAL")
+    LOG_TAIL_QUEUE_SIZE: int = Field(1000, env="LOG_TAIL_QUEUE_SIZE")
+    # Seconds a log search may answer from the search index before new records are ingested
+    LOG_SEARCH_INGEST_INTERVAL: float = Field(5.0, env="LOG_SEARCH_INGEST_INTERVAL")
+    # Minimum levels of the stdout and app.log sinks, and whether stdout shows bound extras
+    LOG_CONSOLE_LEVEL: str = Field("DEBUG", env="LOG_CONSOLE_LEVEL")
+    LOG_FILE_LEVEL: str = Field("INFO", env="LOG_FILE_LEVEL")
+    LOG_CONSOLE_EXTRA: bool = Field(True, env="LOG_CONSOLE_EXTRA")
+    # Sampled hot-path debug messages are logged once per this many calls of each call site
+    LOG_SAMPLE_EVERY: int = Field(100, env="LOG_SAMPLE_EVERY")
 
     # Database settings
     DB_HOST: str = Field(getenv("DB_HOST", "127.0.0.1"), env="DB_HOST")
@@ -21,10 +32,59 @@ class Settings(BaseSettings):
     DB_PASSWORD: str = Field(getenv("DB_PASSWORD", "password"), env="DB_PASSWORD")
     DB_NAME: str = Field(getenv("DB_NAME", "meal_planner"), env="DB_NAME")
 
+    # Connection pool settings
+    DB_POOL_MIN_SIZE: int = Field(2, env="DB_POOL_MIN_SIZE")
+    DB_POOL_MAX_SIZE: int = Field(10, env="DB_POOL_MAX_SIZE")
+    DB_POOL_MAX_IDLE: float = Field(300.0, env="DB_POOL_MAX_IDLE")
+    DB_POOL_TIMEOUT: float = Field(10.0, env="DB_POOL_TIMEOUT")
+    # Rows fetched per round trip when streaming meal history
+    HISTORY_STREAM_BATCH_SIZE: int = Field(500, env="HISTORY_STREAM_BATCH_SIZE")
+    HISTORY_IMPORT_MAX_ROWS: int = Field(100_000, env="HISTORY_IMPORT_MAX_ROWS")
+    # Rows per batch read from each table when writing a backup
+    BACKUP_BATCH_SIZE: int = Field(5000, env="BACKUP_BATCH_SIZE")
+    # Incremental backups: deltas per chain before it is compacted into a full backup,
+    # full backups (with their deltas) kept, and seconds of updates a delta re-reads
+    BACKUP_MAX_DELTAS: int = Field(7, env="BACKUP_MAX_DELTAS")
+    BACKUP_KEEP_CHAINS: int = Field(2, env="BACKUP_KEEP_CHAINS")
+    BACKUP_DELTA_OVERLAP: float = Field(300.0, env="BACKUP_DELTA_OVERLAP")
+
     @property
     def db_url(self):
         return f"postgresql://{self.DB_USER}:{self.DB_PASSWORD}@{self.DB_HOST}:{self.DB_PORT}/{self.DB_NAME}"
 
+    # Meal planning settings
+    PLAN_SHORTLIST_SIZE: int = Field(20, env="PLAN_SHORTLIST_SIZE")
+    PLAN_BAN_DAYS: int = Field(14, env="PLAN_BAN_DAYS")
+    PLAN_PROMPT_TOKEN_BUDGET: int = Field(2000, env="PLAN_PROMPT_TOKEN_BUDGET")
+    PLAN_AI_TIMEOUT: float = Field(10.0, env="PLAN_AI_TIMEOUT")
+    PLAN_PROVIDER: str = Field("mistral", env="PLAN_PROVIDER")
+    PLAN_MODEL: str = Field("mistral-small-latest", env="PLAN_MODEL")
+    # Comma separated `provider[:model]` entries tried after PLAN_PROVIDER
+    PLAN_FALLBACK_PROVIDERS: str = Field(
+        "openrouter,ollama", env="PLAN_FALLBACK_PROVIDERS"
+    )
+    PLAN_HEDGE_DELAY: float = Field(4.0, env="PLAN_HEDGE_DELAY")
+    # Seconds an AI plan stays cached (0 disables the cache) and in-memory entries kept
+    PLAN_CACHE_TTL: float = Field(86400.0, env="PLAN_CACHE_TTL")
+    PLAN_CACHE_SIZE: int = Field(128, env="PLAN_CACHE_SIZE")
+
+    # AI provider HTTP client settings
+    AI_HTTP_TIMEOUT: float = Field(60.0, env="AI_HTTP_TIMEOUT")
+    AI_HTTP_MAX_CONNECTIONS: int = Field(20, env="AI_HTTP_MAX_CONNECTIONS")
+    AI_HTTP_KEEPALIVE_EXPIRY: float = Field(120.0, env="AI_HTTP_KEEPALIVE_EXPIRY")
+
+    # AI provider rate limiting, retry and circuit breaker settings (0 disables a limit)
+    AI_RATE_LIMIT_PER_MINUTE: float = Field(60.0, env="AI_RATE_LIMIT_PER_MINUTE")
+    AI_KEY_RATE_LIMIT_PER_MINUTE: float = Field(
+        20.0, env="AI_KEY_RATE_LIMIT_PER_MINUTE"
+    )
+    AI_RATE_LIMIT_BURST: int = Field(5, env="AI_RATE_LIMIT_BURST")
+    AI_RETRY_ATTEMPTS: int = Field(3, env="AI_RETRY_ATTEMPTS")
+    AI_RETRY_BASE_DELAY: float = Field(0.5, env="AI_RETRY_BASE_DELAY")
+    AI_RETRY_MAX_DELAY: float = Field(8.0, env="AI_RETRY_MAX_DELAY")
+    AI_BREAKER_FAILURES: int = Field(5, env="AI_BREAKER_FAILURES")
+    AI_BREAKER_RESET: float = Field(30.0, env="AI_BREAKER_RESET")
+
     # API keys
     OPENROUTER_API_KEY: str = Field("", env="OPENROUTER_API_KEY")
     MISTRAL_API_KEY: str = Field("", env="MISTRAL_API_KEY")
@@ -32,7 +92,7 @@ class Settings(BaseSettings):
 
     # Ollama settings
     OLLAMA_HOST: str = Field("127.0.0.1", env="OLLAMA_HOST")
-    OLLAMA_PORT: int = Field(11431, env="OLLAMA_PORT")
+    OLLAMA_PORT: int = Field(11434, env="OLLAMA_PORT")
 
     @property
     def ollama_url(self):